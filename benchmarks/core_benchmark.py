@@ -0,0 +1,282 @@
+# PREDINATOR/benchmarks/core_benchmark.py
+"""
+Microbenchmarks of predinator_core over synthetic datasets of growing size.
+
+For every (rows, questions) pair of the sweep a synthetic dataset is written to a
+temporary directory (generate_sample_data.generate_synthetic_dataset), then each step
+is timed on its own:
+
+    load      - load_celebrity_data() reading the parquet file
+    prepare   - AkinatorTree._prepare_data() on a fresh handler (full matrix build)
+    fit       - AkinatorTree._fit_model() on the prepared matrix
+    compile   - CompiledModel.from_tree_handler() on the fitted model
+    save      - save_model_and_metadata()
+    model_load - load_model_and_metadata() into a fresh handler
+    traversal - GameEngine games, answering as randomly picked characters
+
+Each step runs --warmup untimed and --repeat timed iterations, then once more under
+tracemalloc for its peak of Python and NumPy allocations (scikit-learn's tree internals
+are allocated outside tracemalloc's view; max_rss_bytes of the case covers those).
+Every case runs in a fresh process, so one case's caches and heap never leak into the next.
+
+A classification tree keeps a class distribution per node, which grows with
+rows * characters; fit and everything after it are skipped (and reported as skipped)
+once that estimate exceeds --fit-memory-mb.
+
+    python benchmarks/core_benchmark.py --rows 1000,10000,100000 --questions 32,128 --output core.json
+    python benchmarks/core_benchmark.py --compare core.json     # exits 1 on a regression
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STEPS = ('load', 'prepare', 'fit', 'compile', 'save', 'model_load', 'traversal')
+FIT_STEPS = ('fit', 'compile', 'save', 'model_load', 'traversal')
+NOISE_FLOOR_SECONDS = 0.002 # Slowdowns smaller than this are timer noise, whatever their relative size
+
+
+def measure(step, warmup, repeat):
+    """Runs step() warmup + repeat times, then once under tracemalloc. Returns (timings, peak bytes, last result)."""
+    for _ in range(warmup):
+        step()
+    seconds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = step()
+        seconds.append(time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        step()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return seconds, peak, result
+
+
+def summarize_seconds(seconds):
+    return {
+        'min': min(seconds),
+        'median': statistics.median(seconds),
+        'mean': statistics.fmean(seconds),
+        'stdev': statistics.stdev(seconds) if len(seconds) > 1 else 0.0,
+    }
+
+
+def play_games(engine, names, answers, picks):
+    """Plays one game per picked row. Returns (questions asked, right guesses)."""
+    questions_asked, correct = 0, 0
+    for row in picks:
+        engine.start_new_game()
+        while True:
+            question, is_leaf = engine.get_next_question()
+            if is_leaf:
+                break
+            engine.process_answer(answers[row].get(question.attribute_id, 'dont know'))
+        questions_asked += len(engine.path_taken)
+        if engine.make_guess() == names[row]:
+            correct += 1
+    return questions_asked, correct
+
+
+def run_case(rows, questions, options):
+    """Benchmarks every step for one dataset size. Runs in its own process (see run_case_isolated)."""
+    import numpy as np
+    sys.path.insert(0, PROJECT_ROOT)
+    from generate_sample_data import DEFAULT_ZIPF_EXPONENT, generate_synthetic_dataset, zipf_weights
+    from predinator_core.data_manager import load_celebrity_data, load_questions
+    from predinator_core.game_engine import GameEngine
+    from predinator_core.tree_builder import AkinatorTree
+
+    warmup, repeat = options['warmup'], options['repeat']
+    case = {'rows': rows, 'questions': questions, 'steps': {}}
+
+    def record(name, step, artifact_bytes=None, **extra):
+        seconds, peak, result = measure(step, warmup, repeat)
+        case['steps'][name] = {'seconds': summarize_seconds(seconds), 'peak_traced_bytes': peak,
+                               'artifact_bytes': artifact_bytes, **extra}
+        return result
+
+    with tempfile.TemporaryDirectory(prefix='predinator-core-bench-') as data_dir:
+        started = time.perf_counter()
+        celebrities_file, questions_file = generate_synthetic_dataset(rows, questions, data_dir, seed=options['seed'])
+        case['generate_seconds'] = time.perf_counter() - started
+        questions_list = load_questions(questions_file)
+        model_dir = os.path.join(data_dir, 'model')
+
+        df = record('load', lambda: load_celebrity_data(celebrities_file),
+                    artifact_bytes=os.path.getsize(celebrities_file))
+        X, y, staged = record('prepare', lambda: AkinatorTree(model_dir=model_dir)._prepare_data(df, questions_list))
+
+        # Node count is at most 2 * rows - 1, each with a float64 slot per character.
+        class_distribution_bytes = (2 * rows - 1) * len(staged['label_encoder'].classes_) * 8
+        case['estimated_class_distribution_bytes'] = class_distribution_bytes
+        if class_distribution_bytes > options['fit_memory_mb'] * 1024 * 1024:
+            for name in FIT_STEPS:
+                case['steps'][name] = {'skipped': f"class distribution estimate exceeds --fit-memory-mb ({options['fit_memory_mb']})"}
+            case['max_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+            return case
+
+        tree = AkinatorTree(model_dir=model_dir)
+        tree.model = record('fit', lambda: tree._fit_model(X, y, staged))
+        case['steps']['fit']['node_count'] = int(tree.model.tree_.node_count)
+        case['steps']['fit']['depth'] = int(tree.model.get_depth())
+        tree.label_encoder = staged['label_encoder']
+        tree.feature_columns = staged['feature_columns']
+        tree.questions_map = staged['questions_map']
+        tree.compiled = record('compile', tree._compile)
+
+        record('save', tree.save_model_and_metadata)
+        case['steps']['save']['artifact_bytes'] = os.path.getsize(tree.model_path) + os.path.getsize(tree.metadata_path)
+        record('model_load', lambda: AkinatorTree(model_dir=model_dir).load_model_and_metadata())
+
+        answers = {}
+        # Players think of popular characters more often; rows are in popularity order.
+        picks = np.random.default_rng(options['seed']).choice(rows, size=options['games'], p=zipf_weights(rows, DEFAULT_ZIPF_EXPONENT))
+        for row in set(picks.tolist()):
+            answers[row] = {attr_id: ('dont know' if math.isnan(value) else 'yes' if value > 0.5 else 'no')
+                            for attr_id, value in df.iloc[row, 1:].items()}
+        engine = GameEngine(tree_handler=tree)
+        names = df['CelebrityName'].tolist()
+        questions_asked, correct = record('traversal', lambda: play_games(engine, names, answers, picks))
+        traversal = case['steps']['traversal']
+        traversal['games'] = len(picks)
+        traversal['games_per_second'] = len(picks) / traversal['seconds']['median']
+        traversal['questions_per_game'] = questions_asked / len(picks)
+        traversal['first_guess_accuracy'] = correct / len(picks)
+
+    case['max_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return case
+
+
+def _case_worker(rows, questions, options, results):
+    try:
+        results.put(run_case(rows, questions, options))
+    except Exception as e:
+        results.put({'rows': rows, 'questions': questions, 'error': repr(e)})
+
+
+def run_case_isolated(rows, questions, options):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    worker = context.Process(target=_case_worker, args=(rows, questions, options, results))
+    worker.start()
+    case = results.get()
+    worker.join()
+    return case
+
+
+def scaling_exponents(cases):
+    """Per question count and step, the slope of log(median seconds) over log(rows): ~1 is linear, ~2 quadratic."""
+    exponents = {}
+    for questions in sorted({c['questions'] for c in cases}):
+        by_rows = sorted((c for c in cases if c['questions'] == questions and 'steps' in c), key=lambda c: c['rows'])
+        for step in STEPS:
+            points = [(math.log(c['rows']), math.log(c['steps'][step]['seconds']['median']))
+                      for c in by_rows if 'seconds' in c['steps'].get(step, {}) and c['steps'][step]['seconds']['median'] > 0]
+            if len(points) < 2:
+                continue
+            mean_x = statistics.fmean(x for x, _ in points)
+            mean_y = statistics.fmean(y for _, y in points)
+            spread = sum((x - mean_x) ** 2 for x, _ in points)
+            if spread:
+                slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / spread
+                exponents.setdefault(str(questions), {})[step] = round(slope, 2)
+    return exponents
+
+
+def compare(report, baseline, tolerance):
+    """Lines describing each step's median time and peak memory change against baseline, plus whether any regressed."""
+    previous_cases = {(c['rows'], c['questions']): c for c in baseline.get('cases', [])}
+    lines, regressed = [], False
+    for case in report['cases']:
+        previous = previous_cases.get((case['rows'], case['questions']))
+        label = f"{case['rows']}x{case['questions']}"
+        if not previous or 'steps' not in previous or 'steps' not in case:
+            lines.append(f"{label:14s} no comparable baseline")
+            continue
+        for step in STEPS:
+            current, before = case['steps'].get(step, {}), previous['steps'].get(step, {})
+            if 'seconds' not in current or 'seconds' not in before:
+                continue
+            cells = []
+            for key, now, then, floor in (
+                    ('median', current['seconds']['median'], before['seconds']['median'], NOISE_FLOOR_SECONDS),
+                    ('peak', current['peak_traced_bytes'], before['peak_traced_bytes'], 0)):
+                change = (now - then) / then if then else 0.0
+                flag = ''
+                if change > tolerance and now - then > floor:
+                    regressed, flag = True, ' REGRESSION'
+                cells.append(f"{key} {change:+.0%}{flag}")
+            lines.append(f"{label:14s} {step:10s} " + '; '.join(cells))
+    return lines, regressed
+
+
+def parse_sizes(value):
+    return [int(n) for n in value.split(',') if n.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark predinator_core steps over synthetic dataset sizes.")
+    parser.add_argument('--rows', type=parse_sizes, default=parse_sizes('1000,5000,20000'),
+                        help="Comma-separated character counts to sweep (default 1000,5000,20000).")
+    parser.add_argument('--questions', type=parse_sizes, default=parse_sizes('32,128'),
+                        help="Comma-separated question counts to sweep (default 32,128).")
+    parser.add_argument('--warmup', type=int, default=1, help="Untimed runs per step.")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per step.")
+    parser.add_argument('--games', type=int, default=1000, help="Games per traversal run.")
+    parser.add_argument('--fit-memory-mb', type=int, default=1024,
+                        help="Skip fit and the steps after it when the tree's class distribution would exceed this.")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout.")
+    parser.add_argument('--compare', help="Baseline JSON report to compare against.")
+    parser.add_argument('--tolerance', type=float, default=0.20,
+                        help="Relative slowdown or memory growth counted as a regression (default 0.20).")
+    args = parser.parse_args()
+
+    import numpy
+    import sklearn
+    options = {'warmup': args.warmup, 'repeat': args.repeat, 'games': args.games,
+               'fit_memory_mb': args.fit_memory_mb, 'seed': args.seed}
+    cases = []
+    for questions in args.questions:
+        for rows in args.rows:
+            cases.append(run_case_isolated(rows, questions, options))
+            print(f"{rows}x{questions} done", file=sys.stderr)
+
+    report = {
+        'python': sys.version.split()[0],
+        'numpy': numpy.__version__,
+        'sklearn': sklearn.__version__,
+        'cpu_count': os.cpu_count(),
+        'options': options,
+        'cases': cases,
+        'scaling_exponents': scaling_exponents(cases),
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        lines, regressed = compare(report, baseline, args.tolerance)
+        print('\n'.join(lines), file=sys.stderr)
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# PREDINATOR/benchmarks/startup_benchmark.py
+"""
+Cold-start benchmark for the two ways a worker can come up:
+
+    full  - GameEngine() loading the joblib model through AkinatorTree (pandas, scikit-learn, joblib)
+    lean  - predinator_core.serving.load_serving_engine() attaching to the shared compiled model
+
+Every run happens in a fresh interpreter so import caches do not leak between runs.
+For each path it reports the time to import the entry modules, the time until the
+first question is ready, and which heavy packages ended up in sys.modules.
+
+    python benchmarks/startup_benchmark.py --repeat 5 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('pandas', 'sklearn', 'joblib', 'django')
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+{imports}
+imported = time.perf_counter()
+engine = {make_engine}
+if engine is None or not engine.start_new_game():
+    raise SystemExit('model unavailable')
+question, is_leaf = engine.get_next_question()
+ready = time.perf_counter()
+print(json.dumps({{
+    'import_seconds': imported - start,
+    'first_question_seconds': ready - start,
+    'first_question': getattr(question, 'text', None),
+    'loaded_modules': [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+SCENARIOS = {
+    'full': {
+        'imports': "from predinator_core.game_engine import GameEngine\nfrom predinator_core.tree_builder import AkinatorTree",
+        'make_engine': "GameEngine()",
+    },
+    'lean': {
+        'imports': "from predinator_core.serving import load_serving_engine",
+        'make_engine': "load_serving_engine()",
+    },
+}
+
+
+def run_probe(scenario):
+    code = _PROBE.format(heavy=HEAVY_MODULES, **SCENARIOS[scenario])
+    result = subprocess.run([sys.executable, '-c', code], cwd=PROJECT_ROOT,
+                            capture_output=True, text=True, check=True)
+    # Engine logging goes to stdout too; the probe's JSON is always the last line.
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(runs):
+    return {
+        'runs': len(runs),
+        'import_seconds_median': statistics.median(r['import_seconds'] for r in runs),
+        'first_question_seconds_median': statistics.median(r['first_question_seconds'] for r in runs),
+        'first_question_seconds_min': min(r['first_question_seconds'] for r in runs),
+        'loaded_modules': runs[-1]['loaded_modules'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure worker cold start for the full and lean serving paths.")
+    parser.add_argument('--repeat', type=int, default=3, help="Fresh interpreters per scenario.")
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), action='append',
+                        help="Scenario to run (repeatable). Defaults to all.")
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout.")
+    args = parser.parse_args()
+
+    scenarios = args.scenario or sorted(SCENARIOS)
+    if 'lean' in scenarios:
+        run_probe('lean') # Publishes the shared model if needed, so timed runs only measure attaching
+
+    report = {'python': sys.version.split()[0], 'scenarios': {}}
+    for scenario in scenarios:
+        report['scenarios'][scenario] = summarize([run_probe(scenario) for _ in range(args.repeat)])
+    if 'full' in report['scenarios'] and 'lean' in report['scenarios']:
+        report['lean_speedup'] = round(
+            report['scenarios']['full']['first_question_seconds_median']
+            / report['scenarios']['lean']['first_question_seconds_median'], 2)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+# PREDINATOR/benchmarks/view_benchmark.py
+"""
+End-to-end benchmark of the game views, driven through the Django test client.
+
+Every character in the dataset plays one full game (play_view / answer_view until a
+guess, then learn_feedback_view and process_learning_view), answering as that
+character would. The first --learn-count missed characters are taught back under a
+new name, which covers the learn form and a retrain. Each request records its wall
+time, database queries and the size of the stored session.
+
+A scaling pass then replays the games in 1..N worker processes at once and reports
+the aggregate throughput. Every process has its own in-memory session database, so
+that pass measures how the views scale over CPUs, not database contention.
+
+The run works on a temporary copy of data/ (PREDINATOR_DATA_DIR), so learn events
+never touch the real dataset.
+
+    python benchmarks/view_benchmark.py --output views.json
+    python benchmarks/view_benchmark.py --compare views.json     # exits 1 on a regression
+"""
+import argparse
+import html
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUESTION_PATTERN = re.compile(r'<h2>Question:</h2>\s*<p[^>]*>(.*?)</p>', re.S)
+GUESS_PATTERN = re.compile(r'My guess was: <strong[^>]*>(.*?)</strong>')
+PERCENTILES = (50, 95, 99)
+MAX_REQUESTS_PER_GAME = 200
+
+
+def setup_django(data_dir, async_views):
+    """Points the project at data_dir and an in-memory session database. Must run before any project import."""
+    os.environ['PREDINATOR_DATA_DIR'] = data_dir
+    os.environ['PREDINATOR_ASYNC_VIEWS'] = 'True' if async_views else 'False'
+    os.environ['PREDINATOR_GAME_EVENTS'] = 'False' # The temporary data dir is gone by the time events flush at exit
+    os.environ.setdefault('PREDINATOR_LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('SECRET_KEY', 'view-benchmark')
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'predinator_config.settings')
+    sys.path.insert(0, PROJECT_ROOT)
+    import django
+    django.setup()
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0) # SQLite test databases live in memory
+
+
+def copy_data_dir(target):
+    source = os.path.join(PROJECT_ROOT, 'data')
+    shutil.copytree(source, target, dirs_exist_ok=True,
+                    ignore=shutil.ignore_patterns('metrics', 'profiles', 'export', 'shared', 'datasets'))
+
+
+def character_answers():
+    """[(name, {question text: answer string}), ...] for every character, as a player would answer."""
+    from predinator_core.data_manager import load_celebrity_data, load_questions
+    df_celebs = load_celebrity_data()
+    texts = {q.attribute_id: q.text for q in load_questions()}
+    characters = []
+    for _, row in df_celebs.iterrows():
+        answers = {}
+        for attr_id, text in texts.items():
+            value = row.get(attr_id)
+            if value is None or value != value:
+                answers[text] = 'dont know'
+            else:
+                answers[text] = 'yes' if value > 0.5 else 'no'
+        characters.append((row['CelebrityName'], answers))
+    return characters
+
+
+class Recorder:
+    """Per-view samples of latency, query count and stored session size."""
+    def __init__(self, client):
+        self.client = client
+        self.samples = {}
+
+    def request(self, method, path, data=None):
+        from django.contrib.sessions.models import Session
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(self.client, method)(path, data or {})
+            elapsed = time.perf_counter() - started
+        view = response.resolver_match.url_name if response.resolver_match else path
+        session_cookie = self.client.cookies.get('sessionid')
+        session_bytes = 0
+        if session_cookie:
+            stored = Session.objects.filter(session_key=session_cookie.value).values_list('session_data', flat=True).first()
+            session_bytes = len(stored or '')
+        view_samples = self.samples.setdefault(view, {'seconds': [], 'queries': [], 'session_bytes': []})
+        view_samples['seconds'].append(elapsed)
+        view_samples['queries'].append(len(queries))
+        view_samples['session_bytes'].append(session_bytes)
+        return response
+
+
+def play_game(recorder, name, answers, learn_as=None):
+    """Plays one game as the given character. Returns True when the first guess was right."""
+    recorder.request('get', '/akinator/reset/')
+    for _ in range(MAX_REQUESTS_PER_GAME):
+        response = recorder.request('get', '/akinator/play/')
+        if response.status_code == 302:
+            break
+        match = QUESTION_PATTERN.search(response.content.decode())
+        answer = answers.get(html.unescape(match.group(1)).strip(), 'dont know') if match else 'dont know'
+        recorder.request('post', '/akinator/answer/', {'answer': answer})
+
+    response = recorder.request('get', '/akinator/learn_feedback/')
+    match = GUESS_PATTERN.search(response.content.decode())
+    guess = html.unescape(match.group(1)) if match else None
+    if guess == name:
+        recorder.request('post', '/akinator/process_learning/', {'action': 'correct_guess'})
+        return True
+    if learn_as is None:
+        recorder.request('post', '/akinator/process_learning/', {'action': 'nearest_match', 'matched_name': name})
+        return False
+
+    action = 'incorrect_guess' if guess else 'no_guess_learn'
+    recorder.request('post', '/akinator/process_learning/',
+                     {'action': action, 'actual_celebrity_name': learn_as, 'add_new_question_option': 'no'})
+    form_page = recorder.request('get', '/akinator/learn_attributes/').content.decode()
+    form = {'action': 'submit_new_celebrity_attributes', 'actual_celebrity_name': learn_as, 'game_path_json': '{}'}
+    for attr_name in re.findall(r'name="(attr_\w+)"', form_page):
+        form[attr_name] = 'yes'
+    recorder.request('post', '/akinator/process_learning/', form)
+    return False
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize_view(samples):
+    seconds = sorted(samples['seconds'])
+    summary = {
+        'requests': len(seconds),
+        'requests_per_second': round(len(seconds) / sum(seconds), 1) if sum(seconds) else None,
+        'mean_ms': round(statistics.fmean(seconds) * 1000, 3),
+    }
+    for pct in PERCENTILES:
+        summary[f'p{pct}_ms'] = round(percentile(seconds, pct) * 1000, 3)
+    summary['queries_mean'] = round(statistics.fmean(samples['queries']), 2)
+    summary['queries_max'] = max(samples['queries'])
+    summary['session_bytes_mean'] = round(statistics.fmean(samples['session_bytes']), 1)
+    summary['session_bytes_max'] = max(samples['session_bytes'])
+    return summary
+
+
+def run_single(characters, learn_count):
+    from django.test import Client
+    recorder = Recorder(Client())
+    correct, learned = 0, 0
+    started = time.perf_counter()
+    for index, (name, answers) in enumerate(characters):
+        learn_as = None
+        if learned < learn_count:
+            learn_as = f"Benchmark Character {index}"
+        if play_game(recorder, name, answers, learn_as):
+            correct += 1
+        elif learn_as:
+            learned += 1
+    elapsed = time.perf_counter() - started
+    total_requests = sum(len(s['seconds']) for s in recorder.samples.values())
+    return {
+        'games': len(characters),
+        'first_guess_accuracy': round(correct / len(characters), 4) if characters else None,
+        'learned': learned,
+        'requests': total_requests,
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(total_requests / elapsed, 1) if elapsed else None,
+        'views': {view: summarize_view(samples) for view, samples in sorted(recorder.samples.items())},
+    }
+
+
+def _scaling_worker(data_dir, async_views, worker_index, worker_count, games, barrier, results):
+    setup_django(data_dir, async_views)
+    from django.test import Client
+    characters = character_answers()
+    mine = [characters[i % len(characters)] for i in range(worker_index, games, worker_count)]
+    recorder = Recorder(Client())
+    barrier.wait() # Start together, after every worker has finished its Django setup
+    started = time.perf_counter()
+    for name, answers in mine:
+        play_game(recorder, name, answers)
+    elapsed = time.perf_counter() - started
+    results.put((sum(len(s['seconds']) for s in recorder.samples.values()), started, started + elapsed))
+
+
+def run_scaling(data_dir, async_views, worker_counts, games):
+    context = multiprocessing.get_context('spawn')
+    report = []
+    for worker_count in worker_counts:
+        barrier = context.Barrier(worker_count)
+        results = context.Queue()
+        workers = [context.Process(target=_scaling_worker,
+                                   args=(data_dir, async_views, i, worker_count, games, barrier, results))
+                   for i in range(worker_count)]
+        for worker in workers:
+            worker.start()
+        finished = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+        requests = sum(r[0] for r in finished)
+        wall = max(r[2] for r in finished) - min(r[1] for r in finished)
+        report.append({
+            'workers': worker_count,
+            'games': games,
+            'requests': requests,
+            'seconds': round(wall, 3),
+            'requests_per_second': round(requests / wall, 1) if wall else None,
+        })
+    if report and report[0]['requests_per_second']:
+        for entry in report:
+            entry['speedup'] = round(entry['requests_per_second'] / report[0]['requests_per_second'], 2)
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """Lines describing each view's p50/p95 change against baseline, plus whether any exceeded tolerance."""
+    lines, regressed = [], False
+    for view, current in sorted(report['single']['views'].items()):
+        previous = baseline.get('single', {}).get('views', {}).get(view)
+        if not previous:
+            lines.append(f"{view:20s} new view, no baseline")
+            continue
+        cells = []
+        for key in ('p50_ms', 'p95_ms'):
+            change = (current[key] - previous[key]) / previous[key] if previous[key] else 0.0
+            flag = ''
+            if change > tolerance:
+                regressed, flag = True, ' REGRESSION'
+            cells.append(f"{key} {previous[key]:.2f} -> {current[key]:.2f} ({change:+.0%}){flag}")
+        lines.append(f"{view:20s} " + '; '.join(cells))
+    return lines, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark full games through the Django views.")
+    parser.add_argument('--max-characters', type=int, help="Only play the first N characters.")
+    parser.add_argument('--learn-count', type=int, default=2,
+                        help="Missed characters to teach back (each one retrains the model).")
+    parser.add_argument('--async-views', action='store_true', help="Benchmark the async views (PREDINATOR_ASYNC_VIEWS).")
+    parser.add_argument('--workers', default='1,2,4',
+                        help="Comma-separated worker counts for the scaling pass; empty to skip it.")
+    parser.add_argument('--scaling-games', type=int, default=200, help="Games played per scaling step.")
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout.")
+    parser.add_argument('--compare', help="Baseline JSON report to compare against.")
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help="Relative p50/p95 slowdown counted as a regression (default 0.10).")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='predinator-bench-') as data_dir:
+        copy_data_dir(data_dir)
+        setup_django(data_dir, args.async_views)
+        characters = character_answers()[:args.max_characters]
+
+        report = {
+            'python': sys.version.split()[0],
+            'async_views': args.async_views,
+            'cpu_count': os.cpu_count(),
+            'characters': len(characters),
+            'single': run_single(characters, args.learn_count),
+        }
+        # The scaling pass replays the dataset as it was after the learn events above.
+        worker_counts = [int(n) for n in args.workers.split(',') if n.strip()]
+        if worker_counts:
+            report['scaling'] = run_scaling(data_dir, args.async_views, worker_counts, args.scaling_games)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        lines, regressed = compare(report, baseline, args.tolerance)
+        print('\n'.join(lines), file=sys.stderr)
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,7 @@
 from django.apps import AppConfig
-import time # For logging
+import logging
+
+logger = logging.getLogger(__name__)
 
 class GameAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
@@ -7,6 +9,8 @@ class GameAppConfig(AppConfig):
 
     def ready(self):
         # This method is called once Django starts up.
+        from predinator_core.logging_setup import configure_logging
+        configure_logging()
         # Import your service here to ensure it's initialized.
         try:
             # Check if running manage.py commands that should not initialize heavy services
@@ -14,22 +18,29 @@ class GameAppConfig(AppConfig):
             import sys
             # A simple check, can be made more robust
             # Common commands that don't need the full app initialized
-            avoid_init_commands = ['makemigrations', 'migrate', 'collectstatic', 'createsuperuser', 'check', 'shell']
+            avoid_init_commands = ['makemigrations', 'migrate', 'collectstatic', 'createsuperuser', 'check', 'shell', 'export_game_tree', 'publish_shared_model', 'aggregate_game_events', 'sweep_abandoned_games']
             should_initialize = not any(cmd in sys.argv for cmd in avoid_init_commands)
 
             if should_initialize:
-                print(f"[{time.ctime()}] GameAppConfig.ready(): Attempting to initialize game_services...")
+                from django.conf import settings
+                from predinator_core.metrics import enable_shared_metrics
+                if settings.PREDINATOR_METRICS_SHARED:
+                    enable_shared_metrics()
+                if settings.PREDINATOR_GAME_EVENTS:
+                    from predinator_core.game_events import game_events
+                    game_events.enable()
+                logger.info("Attempting to initialize game_services...")
                 from . import game_services # Import your service module
                 # Accessing the global instance ensures it's created
                 _ = game_services.akinator_service # This triggers the __init__ of AkinatorService
-                print(f"[{time.ctime()}] GameAppConfig.ready(): Akinator game services should be initialized.")
+                # Warmed here rather than in AkinatorService.__init__: rendering reverses URLs, which imports the views.
+                game_services.warm_model_caches(game_services.akinator_service.game_engine)
+                game_services.model_watcher.ensure_started()
+                logger.info("Akinator game services should be initialized.")
             else:
-                print(f"[{time.ctime()}] GameAppConfig.ready(): Skipping full game_services initialization for command: {' '.join(sys.argv)}")
+                logger.info("Skipping full game_services initialization for command: %s", ' '.join(sys.argv))
 
         except ImportError as e:
-            print(f"[{time.ctime()}] GameAppConfig.ready(): CRITICAL - Could not import game_services: {e}")
-            print(f"[{time.ctime()}] Ensure game_services.py exists in game_app and predinator_core is importable.")
+            logger.critical("Could not import game_services: %s. Ensure game_services.py exists in game_app and predinator_core is importable.", e)
         except Exception as e:
-            print(f"[{time.ctime()}] GameAppConfig.ready(): CRITICAL - Error initializing game_services: {e}")
-            import traceback
-            traceback.print_exc()
\ No newline at end of file
+            logger.critical("Error initializing game_services: %s", e, exc_info=True)
\ No newline at end of file
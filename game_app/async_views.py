@@ -0,0 +1,74 @@
+# PREDINATOR/game_app/async_views.py
+"""
+Async counterparts of the gameplay and learning views for ASGI deployments.
+
+Gameplay only needs the session loaded; after that, walking the tree is pure CPU
+work that runs inline on the event loop. The learn flow's parquet I/O and retraining
+are dispatched to the single-thread learning executor, so games keep flowing while a
+retrain is in progress; other blocking reads use the default executor, never queueing
+behind a retrain.
+"""
+from django.shortcuts import redirect
+import asyncio
+import logging
+
+from . import views
+from .game_services import run_in_learning_executor
+from .utils_view_helpers import get_session_dataset_id
+from predinator_core.similarity_index import get_character_index
+from predinator_core.utils import DatasetPaths
+
+logger = logging.getLogger(__name__)
+
+
+async def _aload_session(request):
+    # Loads the session row off the event loop. Once cached, the sync session helpers never touch the DB.
+    await request.session.aget('akinator_current_node_id')
+
+
+# --- Main Game Views ---
+
+async def play_view(request):
+    await _aload_session(request)
+    return views.play_view(request)
+
+
+async def answer_view(request):
+    await _aload_session(request)
+    return views.answer_view(request)
+
+
+# --- Learning and Feedback Views ---
+
+async def learn_feedback_view(request):
+    await _aload_session(request)
+    # Builds (or refreshes) the nearest-character index off the event loop; the view then only queries it.
+    # Not on the learning executor: right after a learn event it would wait for the whole retrain.
+    await asyncio.to_thread(get_character_index, DatasetPaths(get_session_dataset_id(request.session)).celebrities_file)
+    return views.learn_feedback_view(request)
+
+
+async def _arun_learning_steps(steps):
+    # Async driver for views.run_learning_steps: the branching stays in the shared step generator,
+    # only its blocking calls move to the learning executor.
+    try:
+        call = next(steps)
+        while True:
+            func, args, kwargs = call
+            call = steps.send(await run_in_learning_executor(func, *args, **kwargs))
+    except StopIteration as stop:
+        return stop.value
+
+
+async def process_learning_view(request):
+    if request.method != 'POST':
+        return redirect('game_app:learn_feedback')
+    await _aload_session(request)
+    return await _arun_learning_steps(views.process_learning_steps(request))
+
+
+async def submit_new_question_view(request):
+    if request.method != 'POST':
+        return redirect('game_app:add_question_form')
+    await _aload_session(request)
+    return await _arun_learning_steps(views.submit_new_question_steps(request))
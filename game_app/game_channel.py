@@ -0,0 +1,339 @@
+# PREDINATOR/game_app/game_channel.py
+"""
+Persistent game channel: one connection per game.
+
+Answers arrive as tiny text frames ('y', 'n', 'd' or any string answer_to_numeric
+understands) and the next question is pushed straight back as a compact JSON frame:
+
+    {"t": "q", "n": <questions asked>, "text": ..., "answers": [...]}
+    {"t": "guess", "name": ..., "conf": <0-1>, "alts": [<follow-up guesses>], "next": <learn feedback URL>}
+    {"t": "end", "name": null, "next": <learn feedback URL>}
+    {"t": "err", "msg": ...}
+
+Both transports take an optional ?dataset=<id> to play a themed dataset; without it
+the session's current dataset is used.
+
+Game state lives in the connection handler. The Django session is written once,
+when the game ends, with the same keys play_view uses, so the regular learn/feedback
+flow picks up where the channel left off.
+
+WebSocket is served by the raw ASGI handler in websocket_application (routed from
+predinator_config/asgi.py). The SSE fallback streams frames from channel_sse_view
+and takes answers as POSTs to channel_sse_answer_view; the stream registry is
+per-process, so SSE deployments need sticky routing to the worker holding the stream.
+Both transports need ASGI: the SSE routes are only registered with PREDINATOR_ASYNC_VIEWS.
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from importlib import import_module
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs, urlsplit
+
+from django.conf import settings
+from django.http import StreamingHttpResponse, HttpResponse, JsonResponse, Http404
+from django.http.request import split_domain_port, validate_host
+from django.utils.http import http_date, is_same_domain
+from django.urls import reverse
+from django.views.decorators.http import require_GET, require_POST
+
+from predinator_core.game_engine import GameEngine
+from .game_services import get_dataset_game_engine
+from .utils_view_helpers import guess_session_state, game_event, new_game_timing, record_game_event
+from predinator_core.game_events import add_answer_time, game_events
+from predinator_core.utils import DEFAULT_DATASET_ID
+
+logger = logging.getLogger(__name__)
+
+WEBSOCKET_PATH = '/akinator/channel/ws/'
+SSE_IDLE_TIMEOUT_SECONDS = 600
+
+
+class GameConnection:
+    """Per-connection game state. Shares the worker's loaded model through its tree_handler."""
+
+    def __init__(self, shared_engine, dataset_id=DEFAULT_DATASET_ID):
+        self.engine = GameEngine(tree_handler=shared_engine.tree_handler)
+        self.dataset_id = dataset_id
+        self.model_id = None
+        self.questions_asked = 0
+        self.last_guess = None
+        self.finished = False
+        self.timing = {}
+
+    def start(self):
+        self.model_id = self.engine.tree_handler.model_version
+        self.questions_asked = 0
+        self.last_guess = None
+        self.finished = False
+        self.timing = new_game_timing(self.model_id)
+        if not self.engine.start_new_game():
+            return self._error_frame("Akinator model is unavailable.")
+        return self._next_frame()
+
+    def handle_answer(self, answer_str):
+        if self.finished:
+            return self._error_frame("The game is over.")
+        if self.engine.tree_handler.model_version != self.model_id:
+            # Same rule as get_session_game_state: a retrained model invalidates games in progress.
+            self.record_abandoned()
+            return self.start()
+        if not self.engine.process_answer(answer_str):
+            return self._error_frame("Could not process that answer.")
+        now = time.time()
+        self.timing['akinator_answer_ms'] = add_answer_time(
+            self.timing['akinator_answer_ms'], round((now - self.timing['akinator_last_answer_at']) * 1000))
+        self.timing['akinator_last_answer_at'] = now
+        return self._next_frame()
+
+    def record_abandoned(self):
+        """Emits the analytics event of a game left before its guess (finished games are emitted by the web flow)."""
+        if not self.finished:
+            event = game_event(self.session_state())
+            if event is not None:
+                game_events.emit(event)
+
+    def session_state(self):
+        """The session keys play_view would have written for this finished game."""
+        return {
+            'akinator_current_node_id': int(self.engine.current_node_id),
+            'akinator_path_taken': [
+                {'attribute_id': item['attribute_id'],
+                 'answer': None if item['answer'] != item['answer'] else float(item['answer'])}
+                for item in self.engine.path_taken
+            ],
+            'akinator_game_active': bool(self.engine.game_active),
+            'akinator_model_id': self.model_id,
+            'akinator_dataset_id': self.dataset_id,
+            'akinator_feedback_mode': True,
+            'akinator_game_source': 'channel',
+            **self.timing,
+            **guess_session_state(self.engine.guess_candidates if self.last_guess else []),
+        }
+
+    def _next_frame(self):
+        question_obj, is_leaf = self.engine.get_next_question()
+        if is_leaf or not question_obj:
+            self.last_guess = self.engine.make_guess()
+            self.finished = True
+            if not self.last_guess:
+                return {'t': 'end', 'name': None, 'next': reverse('game_app:learn_feedback')}
+            candidates = self.engine.guess_candidates
+            return {
+                't': 'guess',
+                'name': self.last_guess,
+                'conf': round(candidates[0][1], 4),
+                'alts': [name for name, _ in candidates[1:]],
+                'next': reverse('game_app:learn_feedback'),
+            }
+        self.questions_asked += 1
+        return {
+            't': 'q',
+            'n': self.questions_asked,
+            'text': question_obj.text,
+            'answers': question_obj.possible_answers,
+        }
+
+    def _error_frame(self, message):
+        return {'t': 'err', 'msg': message}
+
+
+def _encode_frame(frame):
+    return json.dumps(frame, separators=(',', ':'))
+
+
+async def _store_finished_game(session, connection):
+    # The finished game replaces the session's game keys; a web game still pending there is
+    # emitted first, as starting a new web game does, so it is not lost from the event stream.
+    if await session.ahas_key('akinator_game_started_at'):
+        record_game_event(session)
+    await session.aupdate(connection.session_state())
+
+
+# --- WebSocket (raw ASGI) ---
+
+def _session_store_class():
+    return import_module(settings.SESSION_ENGINE).SessionStore
+
+
+def _dataset_from_scope(scope):
+    values = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('dataset')
+    return values[0] if values else None
+
+
+async def _get_channel_engine(dataset_id):
+    # A themed dataset may need loading on first use; keep that file I/O off the event loop.
+    return await asyncio.to_thread(get_dataset_game_engine, dataset_id)
+
+
+def _scope_header(scope, header_name):
+    for name, value in scope.get('headers', []):
+        if name == header_name:
+            return value.decode('latin-1')
+    return None
+
+
+def _session_key_from_scope(scope):
+    value = _scope_header(scope, b'cookie')
+    if value is None:
+        return None
+    cookie = SimpleCookie()
+    cookie.load(value)
+    morsel = cookie.get(settings.SESSION_COOKIE_NAME)
+    return morsel.value if morsel else None
+
+
+def _origin_allowed(scope):
+    """
+    Same rules as the CSRF middleware, so another site cannot open a game on a visitor's session:
+    the Origin must be the requested host (itself in ALLOWED_HOSTS) or listed in CSRF_TRUSTED_ORIGINS.
+    Clients that send no Origin are not browsers and carry no ambient cookies, so they pass.
+    """
+    origin = _scope_header(scope, b'origin')
+    if origin is None:
+        return True
+    if origin in settings.CSRF_TRUSTED_ORIGINS:
+        return True
+    parsed = urlsplit(origin)
+    if not parsed.scheme or not parsed.netloc:
+        return False
+    for trusted in settings.CSRF_TRUSTED_ORIGINS:
+        trusted_scheme, _, trusted_netloc = trusted.partition('://')
+        if '*' in trusted_netloc and trusted_scheme == parsed.scheme and is_same_domain(parsed.netloc, trusted_netloc.replace('*', '', 1)):
+            return True
+    # The scheme is not compared: behind a TLS-terminating proxy the socket itself is plain ws.
+    host = _scope_header(scope, b'host')
+    if not host or parsed.netloc.lower() != host.lower():
+        return False
+    allowed_hosts = settings.ALLOWED_HOSTS
+    if settings.DEBUG and not allowed_hosts:
+        allowed_hosts = ['.localhost', '127.0.0.1', '[::1]']
+    domain, _ = split_domain_port(host)
+    return bool(domain) and validate_host(domain, allowed_hosts)
+
+
+async def _session_cookie_header(session):
+    # The Set-Cookie SessionMiddleware would send for a new session, honouring every SESSION_COOKIE_* setting.
+    if await session.aget_expire_at_browser_close():
+        max_age = expires = None
+    else:
+        max_age = await session.aget_expiry_age()
+        expires = http_date(time.time() + max_age)
+    response = HttpResponse()
+    response.set_cookie(
+        settings.SESSION_COOKIE_NAME, session.session_key, max_age=max_age, expires=expires,
+        domain=settings.SESSION_COOKIE_DOMAIN, path=settings.SESSION_COOKIE_PATH,
+        secure=settings.SESSION_COOKIE_SECURE or None, httponly=settings.SESSION_COOKIE_HTTPONLY or None,
+        samesite=settings.SESSION_COOKIE_SAMESITE,
+    )
+    return (b'set-cookie', response.cookies[settings.SESSION_COOKIE_NAME].OutputString().encode('latin-1'))
+
+
+async def websocket_application(scope, receive, send):
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    if scope.get('path') != WEBSOCKET_PATH:
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+    if not _origin_allowed(scope):
+        logger.warning("Rejected WebSocket game from origin %s.", _scope_header(scope, b'origin'))
+        await send({'type': 'websocket.close', 'code': 4403})
+        return
+
+    # The session is only loaded/created here and written once at game end, never per answer.
+    session = _session_store_class()(_session_key_from_scope(scope))
+    accept_headers = []
+    if not session.session_key or not await session.aexists(session.session_key):
+        await session.acreate()
+        accept_headers.append(await _session_cookie_header(session))
+
+    dataset_id = _dataset_from_scope(scope) or await session.aget('akinator_dataset_id') or DEFAULT_DATASET_ID
+    shared_engine = await _get_channel_engine(dataset_id)
+    if not shared_engine or not shared_engine.tree_handler.model:
+        await send({'type': 'websocket.close', 'code': 1011})
+        return
+    await send({'type': 'websocket.accept', 'headers': accept_headers})
+
+    connection = GameConnection(shared_engine, dataset_id)
+    logger.debug("WebSocket game opened.")
+    await send({'type': 'websocket.send', 'text': _encode_frame(connection.start())})
+
+    while True:
+        message = await receive()
+        if message['type'] == 'websocket.disconnect':
+            logger.debug("WebSocket closed after %s questions.", connection.questions_asked)
+            connection.record_abandoned()
+            return
+        if message['type'] != 'websocket.receive':
+            continue
+
+        frame = connection.handle_answer(message.get('text') or (message.get('bytes') or b'').decode('utf-8', 'ignore'))
+        if connection.finished:
+            await _store_finished_game(session, connection)
+            await session.asave()
+        await send({'type': 'websocket.send', 'text': _encode_frame(frame)})
+        if connection.finished:
+            await send({'type': 'websocket.close', 'code': 1000})
+            return
+
+
+# --- Server-Sent Events fallback ---
+
+class _SSEChannel:
+    def __init__(self, connection):
+        self.connection = connection
+        self.outbox = asyncio.Queue()
+
+_sse_channels = {}
+
+
+@require_GET
+async def channel_sse_view(request):
+    dataset_id = request.GET.get('dataset') or await request.session.aget('akinator_dataset_id') or DEFAULT_DATASET_ID
+    shared_engine = await _get_channel_engine(dataset_id)
+    if not shared_engine or not shared_engine.tree_handler.model:
+        return HttpResponse("Akinator model is unavailable.", status=503)
+
+    channel_id = uuid.uuid4().hex
+    channel = _SSEChannel(GameConnection(shared_engine, dataset_id))
+    _sse_channels[channel_id] = channel
+    channel.outbox.put_nowait({'t': 'open', 'id': channel_id,
+                               'answer_url': reverse('game_app:channel_sse_answer', args=[channel_id])})
+    channel.outbox.put_nowait(channel.connection.start())
+    logger.debug("SSE game %s opened.", channel_id)
+
+    async def event_stream():
+        try:
+            while True:
+                try:
+                    frame = await asyncio.wait_for(channel.outbox.get(), timeout=SSE_IDLE_TIMEOUT_SECONDS)
+                except asyncio.TimeoutError:
+                    return
+                yield f"data: {_encode_frame(frame)}\n\n"
+                if frame.get('t') in ('guess', 'end'):
+                    return
+        finally:
+            _sse_channels.pop(channel_id, None)
+            channel.connection.record_abandoned()
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@require_POST
+async def channel_sse_answer_view(request, channel_id):
+    channel = _sse_channels.get(channel_id)
+    if channel is None:
+        raise Http404("Unknown or closed game channel.")
+
+    frame = channel.connection.handle_answer(request.POST.get('answer', ''))
+    if channel.connection.finished:
+        # Rides on this request's session, saved by SessionMiddleware as usual.
+        await _store_finished_game(request.session, channel.connection)
+    channel.outbox.put_nowait(frame)
+    return JsonResponse({'ok': frame.get('t') != 'err'}, status=202)
@@ -1,6 +1,15 @@
 from predinator_core.game_engine import GameEngine
-from predinator_core.learning_module import LearningModule
-import time
+from predinator_core.shared_model import SharedTreeHandler
+from predinator_core.model_registry import ModelRegistry
+from predinator_core.utils import DEFAULT_DATASET_ID
+from django.conf import settings
+from .model_watcher import create_model_watcher
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import logging
+
+logger = logging.getLogger(__name__)
 
 class AkinatorService:
     _instance = None
@@ -8,9 +17,9 @@ class AkinatorService:
     def __new__(cls, *args, **kwargs):
         if not cls._instance:
             cls._instance = super(AkinatorService, cls).__new__(cls, *args, **kwargs)
-            print(f"[{time.ctime()}] AkinatorService: Creating new instance.")
+            logger.debug("Creating new AkinatorService instance.")
         else:
-            print(f"[{time.ctime()}] AkinatorService: Returning existing instance.")
+            logger.debug("Returning existing AkinatorService instance.")
         return cls._instance
 
     def __init__(self):
@@ -18,30 +27,47 @@ class AkinatorService:
         if hasattr(self, '_initialized') and self._initialized:
             return
         
-        print(f"[{time.ctime()}] AkinatorService __init__: Initializing GameEngine and LearningModule...")
+        logger.info("Initializing GameEngine and LearningModule...")
         try:
-            self.game_engine = GameEngine() # This will load/train model on init
+            self.game_engine = self._create_game_engine()
             if not self.game_engine.tree_handler.model:
-                 print(f"[{time.ctime()}] AkinatorService __init__: WARNING - Game model failed to load/train in GameEngine.")
+                 logger.warning("Game model failed to load/train in GameEngine.")
             else:
-                 print(f"[{time.ctime()}] AkinatorService __init__: GameEngine model seems loaded/trained.")
+                 logger.info("GameEngine model seems loaded/trained.")
 
-            self.learning_module = LearningModule(self.game_engine.tree_handler) # Pass the engine's tree_handler
-            print(f"[{time.ctime()}] AkinatorService __init__: Initialization complete.")
+            # Created on first use: LearningModule pulls in pandas and scikit-learn, which a
+            # worker that only serves games (shared hosting) never needs to import.
+            self.learning_module = None
+            logger.info("Initialization complete.")
             self._initialized = True
         except Exception as e:
-            print(f"[{time.ctime()}] AkinatorService __init__: CRITICAL ERROR during initialization: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.critical("AkinatorService initialization failed: %s", e, exc_info=True)
             # Set them to None so checks in views can fail gracefully
             self.game_engine = None
             self.learning_module = None
             self._initialized = False # Mark as not successfully initialized
 
 
+    def _create_game_engine(self):
+        if settings.PREDINATOR_MODEL_HOSTING == 'shared':
+            # Attach read-only to the memory-mapped model shared by every worker on this machine.
+            tree_handler = SharedTreeHandler()
+            tree_handler.load_model_and_metadata()
+            return GameEngine(tree_handler=tree_handler)
+        return GameEngine() # This will load/train model on init
+
+    def swap_tree_handler(self, tree_handler):
+        """Points the engine and learner at a freshly loaded model. Each is a single attribute assignment."""
+        if not self.game_engine:
+            return
+        self.game_engine.tree_handler = tree_handler
+        if self.learning_module:
+            self.learning_module.tree_handler = tree_handler
+        warm_model_caches(self.game_engine)
+
     def get_engine(self):
         if not self._initialized or not self.game_engine or not self.game_engine.tree_handler.model:
-            print(f"[{time.ctime()}] AkinatorService.get_engine(): Service or engine/model not properly initialized. Attempting re-init...")
+            logger.warning("Service or engine/model not properly initialized. Attempting re-init...")
             # Potentially re-run __init__ logic here carefully or raise an error
             # For now, just return current state. Views should handle None engine.
             if not self._initialized : self.__init__() # Try to re-init if it never finished
@@ -49,21 +75,63 @@ class AkinatorService:
         return self.game_engine
 
     def get_learner(self):
-        if not self._initialized or not self.learning_module:
-            print(f"[{time.ctime()}] AkinatorService.get_learner(): Service or learner not properly initialized.")
-            if not self._initialized : self.__init__()
+        if not self._initialized:
+            logger.error("Service not properly initialized; no learner available.")
+            self.__init__()
+        if self._initialized and not self.learning_module:
+            from predinator_core.learning_module import LearningModule
+            logger.info("Creating LearningModule on first use.")
+            self.learning_module = LearningModule(self.game_engine.tree_handler) # Pass the engine's tree_handler
         return self.learning_module
 
+def warm_model_caches(game_engine):
+    """Run whenever a model is published to this worker (startup or retrain)."""
+    if not game_engine or not game_engine.tree_handler.model:
+        return
+    from .render_cache import question_fragment_cache # Deferred: needs the template engine, which needs settings
+    question_fragment_cache.warm(game_engine.tree_handler)
+
 akinator_service = AkinatorService() # Global instance
+model_watcher = create_model_watcher(akinator_service)
 
 def get_global_game_engine():
     service_engine = akinator_service.get_engine()
     if service_engine is None:
-        print(f"[{time.ctime()}] get_global_game_engine: CRITICAL - AkinatorService returned a None engine.")
+        logger.critical("AkinatorService returned a None engine.")
     return service_engine
 
+# Themed datasets (see predinator_core.model_registry). The default dataset stays with
+# AkinatorService, which owns learning and hot reload for it.
+model_registry = ModelRegistry(
+    memory_budget_bytes=int(settings.PREDINATOR_MODEL_REGISTRY_MEMORY_MB * 1024 * 1024),
+    hosting=settings.PREDINATOR_MODEL_HOSTING,
+)
+
+def get_dataset_game_engine(dataset_id):
+    """
+    Engine for one request's game. Games on the default dataset use the global engine;
+    other datasets get a fresh engine over the registry's shared tree handler, since all
+    per-game state is restored from the session anyway.
+    """
+    if not dataset_id or dataset_id == DEFAULT_DATASET_ID:
+        return get_global_game_engine()
+    tree_handler = model_registry.get(dataset_id)
+    if tree_handler is None:
+        logger.warning("Dataset '%s' is unavailable.", dataset_id)
+        return None
+    return GameEngine(tree_handler=tree_handler)
+
 def get_global_learning_module():
     service_learner = akinator_service.get_learner()
     if service_learner is None:
-        print(f"[{time.ctime()}] get_global_learning_module: CRITICAL - AkinatorService returned a None learner.")
-    return service_learner
\ No newline at end of file
+        logger.critical("AkinatorService returned a None learner.")
+    return service_learner
+
+# A single worker thread runs every parquet read/write and retrain for the async views.
+# It keeps that blocking work off the event loop, and serializes learn events so two
+# concurrent learns can never interleave writes to celebrities.parquet.
+learning_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='predinator-learning')
+
+async def run_in_learning_executor(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(learning_executor, functools.partial(func, *args, **kwargs))
\ No newline at end of file
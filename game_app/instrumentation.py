@@ -0,0 +1,67 @@
+# PREDINATOR/game_app/instrumentation.py
+"""
+Timed drop-ins for Django components that have no hook of their own:
+
+    SESSION_ENGINE = 'game_app.instrumentation'      (database sessions, load/save timed)
+    TEMPLATES BACKEND 'game_app.instrumentation.TimedDjangoTemplates'
+
+Both record into predinator_core.metrics and otherwise behave exactly like the Django
+classes they extend.
+"""
+import time
+
+from django.contrib.sessions.backends.db import SessionStore as DatabaseSessionStore
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+from predinator_core.metrics import SESSION_LOAD_SECONDS, SESSION_SAVE_SECONDS, TEMPLATE_RENDER_SECONDS
+
+
+class SessionStore(DatabaseSessionStore):
+    def load(self):
+        started = time.perf_counter()
+        try:
+            return super().load()
+        finally:
+            SESSION_LOAD_SECONDS.observe(time.perf_counter() - started)
+
+    async def aload(self):
+        started = time.perf_counter()
+        try:
+            return await super().aload()
+        finally:
+            SESSION_LOAD_SECONDS.observe(time.perf_counter() - started)
+
+    def save(self, must_create=False):
+        started = time.perf_counter()
+        try:
+            return super().save(must_create)
+        finally:
+            SESSION_SAVE_SECONDS.observe(time.perf_counter() - started)
+
+    async def asave(self, must_create=False):
+        started = time.perf_counter()
+        try:
+            return await super().asave(must_create)
+        finally:
+            SESSION_SAVE_SECONDS.observe(time.perf_counter() - started)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            TEMPLATE_RENDER_SECONDS.observe(time.perf_counter() - started)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
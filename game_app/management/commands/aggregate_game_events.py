@@ -0,0 +1,74 @@
+# PREDINATOR/game_app/management/commands/aggregate_game_events.py
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from predinator_core.game_events import aggregate_events, read_events, segment_files
+from predinator_core.tree_builder import create_tree_handler
+from predinator_core.utils import DEFAULT_DATASET_ID, EVENTS_DIR, DatasetPaths
+
+
+class Command(BaseCommand):
+    help = ("Aggregates the per-game analytics events: outcomes, accuracy, abandonment and game length, "
+            "plus per-node abandonment and accuracy on the current model.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events-dir', default=EVENTS_DIR, help="Directory of event segments (defaults to data/events).")
+        parser.add_argument('--dataset', default=DEFAULT_DATASET_ID, help="Only games played on this dataset.")
+        parser.add_argument('--since-minutes', type=float, help="Only games that ended in the last N minutes.")
+        parser.add_argument('--min-visits', type=int, default=5,
+                            help="Nodes visited by fewer games are left out of the node rankings (default 5).")
+        parser.add_argument('--top', type=int, default=10, help="Nodes to list per ranking (default 10).")
+        parser.add_argument('--output', help="Write the full report (every node and character) as JSON here.")
+
+    def handle(self, *args, **options):
+        if not segment_files(options['events_dir']):
+            raise CommandError(f"No game events found in {options['events_dir']}.")
+        since = time.time() - options['since_minutes'] * 60 if options['since_minutes'] else None
+        events = [e for e in read_events(options['events_dir'], since) if e.get('dataset') == options['dataset']]
+        if not events:
+            raise CommandError("No game events matched the filters.")
+
+        tree_handler = create_tree_handler(model_dir=DatasetPaths(options['dataset']).model_dir)
+        compiled = tree_handler.compiled if tree_handler.load_model_and_metadata() else None
+        report = aggregate_events(events, compiled)
+
+        self.stdout.write(f"{report['games']} games: " + ', '.join(f"{k} {v}" for k, v in sorted(report['outcomes'].items())))
+        self.stdout.write(f"Accuracy {report['accuracy']}, abandonment rate {report['abandonment_rate']}")
+        self.stdout.write(f"Questions per finished game: {report['questions_per_finished_game']}")
+        self.stdout.write(f"Answer time (ms): {report['answer_ms']}")
+        if compiled is None:
+            self.stdout.write(self.style.WARNING("No model could be loaded; per-node statistics skipped."))
+        else:
+            self.stdout.write(f"\n{report['replayed']} games replayed on model {compiled.version} "
+                              f"({report['unmatched']} did not follow one path, e.g. beam games resumed after a rejected guess; "
+                              f"games on other versions are not replayed).")
+            self._write_node_rankings(compiled, report['nodes'], options['min_visits'], options['top'])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"\nReport written to {options['output']}"))
+
+    def _write_node_rankings(self, compiled, nodes, min_visits, top):
+        def describe(node):
+            feature = compiled.feature[node]
+            if feature >= 0:
+                return f"node {node} asks {compiled.feature_columns[feature]}"
+            return f"leaf {node} ({compiled.class_names[compiled.node_class[node]]})"
+
+        visited = {node: counts for node, counts in nodes.items() if counts.get('visits', 0) >= min_visits}
+        abandoned = sorted(visited.items(), key=lambda item: -item[1].get('abandoned', 0) / item[1]['visits'])
+        self.stdout.write("\nHighest abandonment (games abandoned at the node / games reaching it):")
+        for node, counts in abandoned[:top]:
+            if counts.get('abandoned'):
+                self.stdout.write(f"  {counts['abandoned'] / counts['visits']:6.1%}  {counts['visits']:6d}  {describe(node)}")
+
+        def ended(counts):
+            return counts.get('correct', 0) + counts.get('wrong', 0) + counts.get('no_guess', 0)
+        judged = {node: counts for node, counts in nodes.items() if ended(counts) >= min_visits}
+        worst = sorted(judged.items(), key=lambda item: item[1].get('correct', 0) / ended(item[1]))
+        self.stdout.write("\nLowest accuracy where games ended (right guesses / games ending at the node):")
+        for node, counts in worst[:top]:
+            self.stdout.write(f"  {counts.get('correct', 0) / ended(counts):6.1%}  {ended(counts):6d}  {describe(node)}")
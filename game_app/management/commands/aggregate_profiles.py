@@ -0,0 +1,73 @@
+# PREDINATOR/game_app/management/commands/aggregate_profiles.py
+import collections
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from predinator_core.sampling_profiler import parse_profile_file_name, profile_file_name, read_collapsed
+from predinator_core.utils import PROFILE_DIR
+
+
+class Command(BaseCommand):
+    help = ("Merges the collapsed-stack files written by ProfilingMiddleware, optionally filtered by view "
+            "and model version, and prints the hottest functions.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile-dir', default=PROFILE_DIR,
+                            help="Directory the profiles were written to (defaults to data/profiles).")
+        parser.add_argument('--view', help="Only profiles of this view name, e.g. game_app:play.")
+        parser.add_argument('--model-version', help="Only profiles taken while this model version was live.")
+        parser.add_argument('--since-minutes', type=float, help="Only profiles written in the last N minutes.")
+        parser.add_argument('--output', help="Write the merged collapsed stacks here (for flamegraph.pl or speedscope).")
+        parser.add_argument('--top', type=int, default=20, help="Number of functions to list (default 20).")
+
+    def handle(self, *args, **options):
+        profile_dir = options['profile_dir']
+        if not os.path.isdir(profile_dir):
+            raise CommandError(f"No profiles found: {profile_dir} does not exist.")
+
+        # The view filter goes through the same escaping as the file names.
+        view_tag = parse_profile_file_name(profile_file_name(options['view'], None))[2] if options['view'] else None
+        since_ms = (time.time() - options['since_minutes'] * 60) * 1000 if options['since_minutes'] else None
+
+        merged = collections.Counter()
+        profiles_per_view = collections.Counter()
+        for file_name in sorted(os.listdir(profile_dir)):
+            tags = parse_profile_file_name(file_name)
+            if tags is None:
+                continue
+            timestamp_ms, _, view, model_version = tags
+            if view_tag and view != view_tag:
+                continue
+            if options['model_version'] and model_version != options['model_version']:
+                continue
+            if since_ms and timestamp_ms < since_ms:
+                continue
+            merged.update(read_collapsed(os.path.join(profile_dir, file_name)))
+            profiles_per_view[view] += 1
+
+        if not merged:
+            raise CommandError("No profiles matched the filters.")
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.writelines(f"{stack} {count}\n" for stack, count in merged.most_common())
+
+        total = sum(merged.values())
+        self_samples, inclusive_samples = collections.Counter(), collections.Counter()
+        for stack, count in merged.items():
+            frames = stack.split(';')
+            self_samples[frames[-1]] += count
+            for frame in set(frames):
+                inclusive_samples[frame] += count
+
+        self.stdout.write(f"{sum(profiles_per_view.values())} profiles, {total} samples")
+        for view, count in profiles_per_view.most_common():
+            self.stdout.write(f"  {view}: {count} profiles")
+        for title, counter in (("Self", self_samples), ("Inclusive", inclusive_samples)):
+            self.stdout.write(f"\n{title} samples:")
+            for frame, count in counter.most_common(options['top']):
+                self.stdout.write(f"  {100 * count / total:5.1f}%  {count:7d}  {frame}")
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(f"\nMerged stacks written to {options['output']}"))
@@ -0,0 +1,26 @@
+# PREDINATOR/game_app/management/commands/export_game_tree.py
+from django.core.management.base import BaseCommand, CommandError
+
+from predinator_core.tree_builder import create_tree_handler
+from predinator_core.utils import GAME_TREE_EXPORT_DIR
+
+
+class Command(BaseCommand):
+    help = "Exports the current model as a content-hashed static game tree for read-only play."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-dir', default=GAME_TREE_EXPORT_DIR,
+                            help="Directory to write the artifact to (defaults to data/model/export).")
+
+    def handle(self, *args, **options):
+        tree_handler = create_tree_handler()
+        if not tree_handler.load_model_and_metadata():
+            raise CommandError("No trained model could be loaded. Run 'python train_model.py' first.")
+
+        artifact_path = tree_handler.export_game_tree(options['output_dir'])
+        if not artifact_path:
+            raise CommandError("Exporting the game tree failed. Check the logs above.")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported game tree version {tree_handler.model_version} to {artifact_path}"
+        ))
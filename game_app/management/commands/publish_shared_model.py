@@ -0,0 +1,18 @@
+# PREDINATOR/game_app/management/commands/publish_shared_model.py
+from django.core.management.base import BaseCommand, CommandError
+
+from predinator_core.shared_model import publish_shared_model
+from predinator_core.tree_builder import create_tree_handler
+from predinator_core.utils import SHARED_MODEL_DIR
+
+
+class Command(BaseCommand):
+    help = "Publishes the trained model as memory-mapped files that workers in shared hosting mode attach to."
+
+    def handle(self, *args, **options):
+        tree_handler = create_tree_handler()
+        if not tree_handler.load_model_and_metadata():
+            raise CommandError("No trained model could be loaded. Run 'python train_model.py' first.")
+
+        version = publish_shared_model(tree_handler.compiled, SHARED_MODEL_DIR)
+        self.stdout.write(self.style.SUCCESS(f"Published shared model version {version} to {SHARED_MODEL_DIR}"))
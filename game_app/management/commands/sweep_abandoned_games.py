@@ -0,0 +1,43 @@
+# PREDINATOR/game_app/management/commands/sweep_abandoned_games.py
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from game_app.utils_view_helpers import record_game_event
+from predinator_core.game_events import game_events
+
+
+class Command(BaseCommand):
+    help = ("Emits the analytics event of every web game left idle, e.g. in a closed tab, and ends it. "
+            "Games whose player never returns are otherwise never recorded. Run it periodically, before aggregating.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--idle-minutes', type=float, default=30,
+                            help="Games with no answer for this long count as left (default 30).")
+
+    def handle(self, *args, **options):
+        if not settings.PREDINATOR_GAME_EVENTS:
+            raise CommandError("Game events are disabled (PREDINATOR_GAME_EVENTS=False).")
+        game_events.enable()
+        store_class = import_module(settings.SESSION_ENGINE).SessionStore
+        cutoff = time.time() - options['idle_minutes'] * 60
+
+        checked = swept = 0
+        for row in store_class.get_model_class().objects.filter(expire_date__gt=timezone.now()).iterator():
+            checked += 1
+            data = store_class().decode(row.session_data)
+            # akinator_game_started_at marks a game whose event has not been emitted yet.
+            last_activity = data.get('akinator_last_answer_at') or data.get('akinator_game_started_at')
+            if 'akinator_game_started_at' not in data or last_activity > cutoff:
+                continue
+            session = store_class(row.session_key)
+            record_game_event(session)
+            # A player coming back starts over; the game was counted as left.
+            session.pop('akinator_current_node_id', None)
+            session.save()
+            swept += 1
+        game_events.close()
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} sessions, recorded {swept} idle games."))
@@ -0,0 +1,149 @@
+# PREDINATOR/game_app/middleware.py
+import hmac
+import logging
+import os
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from predinator_core.sampling_profiler import profiler, write_profile
+
+logger = logging.getLogger(__name__)
+request_logger = logging.getLogger('game_app.requests')
+
+PROFILE_HEADER = 'HTTP_X_PREDINATOR_PROFILE'
+
+
+class ModelReloadMiddleware:
+    """Makes sure this worker is watching for newly published models. Costs a time check per request."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        self._check()
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        self._check()
+        return await self.get_response(request)
+
+    def _check(self):
+        from .game_services import model_watcher # Deferred: the service is created in GameAppConfig.ready()
+        if model_watcher:
+            model_watcher.ensure_started()
+            model_watcher.check()
+
+
+class RequestTimingMiddleware:
+    """
+    Logs method, path, status and duration_ms of every request as fields on the
+    game_app.requests logger, at DEBUG. While that level is off, the clock isn't read either.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not request_logger.isEnabledFor(logging.DEBUG):
+            return self.get_response(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self._log(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        if not request_logger.isEnabledFor(logging.DEBUG):
+            return await self.get_response(request)
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self._log(request, response, started)
+        return response
+
+    def _log(self, request, response, started):
+        request_logger.debug("request", extra={
+            'method': request.method, 'path': request.path, 'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 2)})
+
+
+class ProfilingMiddleware:
+    """
+    Runs PREDINATOR_PROFILE_SAMPLE_RATE of requests, and any request whose X-Predinator-Profile
+    header matches PREDINATOR_PROFILE_TOKEN, under the sampling profiler. Each profile is written
+    as a collapsed-stack file tagged with the view name and model version (see the
+    aggregate_profiles command). Unprofiled requests pay one random() call.
+
+    Under ASGI the event loop thread is sampled: every request profiled while others run on
+    the same loop also counts their stacks, and work handed to executor threads is not seen.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.sample_rate = settings.PREDINATOR_PROFILE_SAMPLE_RATE
+        self.token = settings.PREDINATOR_PROFILE_TOKEN
+        if self.sample_rate <= 0 and not self.token:
+            raise MiddlewareNotUsed()
+        profiler.interval = settings.PREDINATOR_PROFILE_INTERVAL_MS / 1000
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        requested = self._requested(request)
+        if not requested and random.random() >= self.sample_rate:
+            return self.get_response(request)
+        profile = profiler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.stop(profile)
+        return self._finish(request, response, profile, requested)
+
+    async def __acall__(self, request):
+        requested = self._requested(request)
+        if not requested and random.random() >= self.sample_rate:
+            return await self.get_response(request)
+        profile = profiler.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiler.stop(profile)
+        return self._finish(request, response, profile, requested)
+
+    def _requested(self, request):
+        header = request.META.get(PROFILE_HEADER)
+        return bool(self.token and header and hmac.compare_digest(header, self.token))
+
+    def _finish(self, request, response, profile, requested):
+        from .game_services import get_global_game_engine # Deferred: the service is created in GameAppConfig.ready()
+        game_engine = get_global_game_engine()
+        model_version = game_engine.tree_handler.model_version if game_engine else None
+        view_name = request.resolver_match.view_name if request.resolver_match else None
+        path = write_profile(profile, view_name, model_version)
+        logger.info("Profiled request.", extra={
+            'path': request.path, 'view': view_name, 'samples': profile.sample_count,
+            'duration_ms': round(profile.duration * 1000, 1), 'profile_file': path})
+        if requested and path:
+            response['X-Predinator-Profile-File'] = os.path.basename(path)
+        return response
@@ -0,0 +1,102 @@
+# PREDINATOR/game_app/model_watcher.py
+"""
+Cross-worker model hot reload.
+
+Whoever retrains writes the new model version to a small file (data/model/VERSION, or
+the shared model's CURRENT pointer in shared hosting mode). Each worker polls that
+file's mtime with one os.stat, from a timer thread and, throttled, from
+ModelReloadMiddleware. When the version differs from the live one, the new model is
+loaded on a background thread and swapped into the service in one step, so requests
+never wait for a reload and every worker converges shortly after a publish.
+"""
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from predinator_core.shared_model import CURRENT_POINTER, SharedTreeHandler
+from predinator_core.utils import MODEL_VERSION_FILE, SHARED_MODEL_DIR, read_model_version
+
+logger = logging.getLogger(__name__)
+
+
+class ModelWatcher:
+    def __init__(self, service, version_file, interval):
+        self.service = service
+        self.version_file = version_file
+        self.interval = interval
+        self._last_signature = None
+        self._last_check = 0.0
+        self._reload_lock = threading.Lock()
+        self._reloading = False # Guarded by _reload_lock; at most one reload thread runs at a time
+        self._thread_pid = None
+
+    def ensure_started(self):
+        """Starts the polling thread in this process (threads do not survive a pre-fork into workers)."""
+        if self.interval <= 0 or self._thread_pid == os.getpid():
+            return
+        self._thread_pid = os.getpid()
+        threading.Thread(target=self._poll_forever, name='predinator-model-watcher', daemon=True).start()
+
+    def check(self):
+        """Cheap enough for the request path: one stat at most every `interval` seconds."""
+        now = time.monotonic()
+        if now - self._last_check < self.interval:
+            return
+        self._last_check = now
+        try:
+            stat = os.stat(self.version_file)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return
+        if signature == self._last_signature:
+            return
+
+        published_version = read_model_version(self.version_file)
+        engine = self.service.game_engine
+        live_version = engine.tree_handler.model_version if engine else None
+        if not published_version or published_version == live_version:
+            self._last_signature = signature
+            return
+        # The signature is only recorded once the reload has swapped the model in, so a reload
+        # that fails, or a publish that lands while another reload runs, is retried on a later check.
+        with self._reload_lock:
+            if self._reloading:
+                return
+            self._reloading = True
+            threading.Thread(target=self._reload, args=(published_version, signature),
+                             name='predinator-model-reload', daemon=True).start()
+
+    def _poll_forever(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                logger.error("Error while polling %s: %s", self.version_file, e)
+
+    def _reload(self, published_version, signature):
+        try:
+            logger.info("Model version %s published, reloading in the background...", published_version)
+            if settings.PREDINATOR_MODEL_HOSTING == 'shared':
+                tree_handler = SharedTreeHandler()
+            else:
+                from predinator_core.tree_builder import create_tree_handler
+                tree_handler = create_tree_handler()
+            if not tree_handler.load_model_and_metadata():
+                logger.error("Could not load model version %s. Keeping the live model.", published_version)
+                return
+            self.service.swap_tree_handler(tree_handler)
+            self._last_signature = signature
+            logger.info("Now serving model version %s.", tree_handler.model_version)
+        finally:
+            with self._reload_lock:
+                self._reloading = False
+
+
+def create_model_watcher(service):
+    version_file = (os.path.join(SHARED_MODEL_DIR, CURRENT_POINTER)
+                    if settings.PREDINATOR_MODEL_HOSTING == 'shared' else MODEL_VERSION_FILE)
+    return ModelWatcher(service, version_file, settings.PREDINATOR_MODEL_WATCH_INTERVAL)
@@ -0,0 +1,99 @@
+# PREDINATOR/game_app/render_cache.py
+"""
+Pre-rendered question fragments.
+
+For a given model, the question shown at a tree node is identical for every player,
+so its HTML is rendered once per (model version, node id) and reused. Only per-user
+bits (the CSRF input here, messages in base.html) are filled in per response.
+The top levels of the tree are rendered eagerly when a model is published; deeper
+nodes are rendered on first use and kept in an LRU.
+"""
+from collections import OrderedDict
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.template.backends.utils import csrf_input
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from predinator_core.compiled_model import LEAF_FEATURE
+
+logger = logging.getLogger(__name__)
+
+FRAGMENT_TEMPLATE = 'game_app/_question_fragment.html'
+CSRF_SLOT = mark_safe('<!--predinator:csrf-->')
+
+
+class QuestionFragmentCache:
+    def __init__(self, max_entries, warm_depth):
+        self.max_entries = max_entries
+        self.warm_depth = warm_depth
+        self._entries = OrderedDict() # (model_version, node_id) -> rendered fragment
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_fragment(self, request, tree_handler, node_id, question_text, possible_answers):
+        """Returns the question fragment for this node with the request's CSRF input spliced in."""
+        key = (tree_handler.model_version, int(node_id))
+        with self._lock:
+            fragment = self._entries.get(key)
+            if fragment is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if fragment is None:
+            self.misses += 1
+            fragment = self._render(question_text, possible_answers)
+            self._store(key, fragment)
+        return mark_safe(fragment.replace(CSRF_SLOT, csrf_input(request)))
+
+    def warm(self, tree_handler):
+        """Eagerly renders every question node down to warm_depth for the live model, dropping other versions."""
+        compiled = tree_handler.compiled
+        if not compiled:
+            return 0
+        version = tree_handler.model_version
+        start = time.perf_counter()
+        with self._lock:
+            for key in [k for k in self._entries if k[0] != version]:
+                del self._entries[key]
+
+        rendered = 0
+        frontier = [0]
+        for _ in range(self.warm_depth):
+            next_frontier = []
+            for node_id in frontier:
+                feature_idx = compiled.feature[node_id]
+                if feature_idx == LEAF_FEATURE:
+                    continue
+                question = compiled.questions[feature_idx]
+                self._store((version, node_id), self._render(question['text'], question['possible_answers']))
+                rendered += 1
+                next_frontier.extend((int(compiled.children_left[node_id]), int(compiled.children_right[node_id])))
+            frontier = next_frontier
+        logger.info("Warmed question fragments.", extra={
+            'fragments': rendered, 'model_version': version,
+            'duration_ms': round((time.perf_counter() - start) * 1000, 1)})
+        return rendered
+
+    def _render(self, question_text, possible_answers):
+        return render_to_string(FRAGMENT_TEMPLATE, {
+            'question_text': question_text,
+            'possible_answers': possible_answers,
+            'csrf_slot': CSRF_SLOT,
+        })
+
+    def _store(self, key, fragment):
+        with self._lock:
+            self._entries[key] = fragment
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+question_fragment_cache = QuestionFragmentCache(
+    max_entries=settings.PREDINATOR_FRAGMENT_CACHE_SIZE,
+    warm_depth=settings.PREDINATOR_FRAGMENT_WARM_DEPTH,
+)
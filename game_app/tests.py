@@ -1,3 +1,437 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from game_app.game_channel import _origin_allowed, _session_store_class, _store_finished_game
+from game_app.model_watcher import ModelWatcher
+from predinator_core import metrics
+from predinator_core.compiled_model import CompiledModel, LEAF_FEATURE
+from predinator_core.data_manager import load_celebrity_data, load_questions
+from predinator_core.game_events import add_answer_time, aggregate_events
+from predinator_core.game_engine import GameEngine
+from predinator_core.learning_module import LearningModule
+from predinator_core.question_selection import (QUESTION_BUDGET, impute_answers, nearest_rows,
+                                                select_distinguishing_questions)
+from predinator_core.similarity_index import CharacterIndex
+from predinator_core.training_matrix import PreparedTrainingData
+from predinator_core.tree_builder import AkinatorTree
+from predinator_core.utils import answer_to_numeric
+
+
+class CharacterIndexTests(SimpleTestCase):
+    def build_index(self, rows):
+        return CharacterIndex.from_dataframe(pd.DataFrame(rows))
+
+    def test_nearest_orders_by_mismatches_then_compared(self):
+        index = self.build_index([
+            {'CelebrityName': 'Exact', 'a': 1.0, 'b': 1.0, 'c': 1.0},
+            {'CelebrityName': 'OneOff', 'a': 1.0, 'b': 0.0, 'c': 1.0},
+            {'CelebrityName': 'Partial', 'a': 1.0, 'b': np.nan, 'c': np.nan},
+        ])
+        self.assertEqual(index.nearest({'a': 1.0, 'b': 1.0, 'c': 1.0}, k=3),
+                         [('Exact', 0, 3), ('Partial', 0, 1), ('OneOff', 1, 3)])
+
+    def test_nearest_ignores_rows_with_nothing_compared(self):
+        rows = [{'CelebrityName': f'Unknown {i}', 'a': np.nan, 'b': np.nan, 'c': np.nan} for i in range(5)]
+        rows.append({'CelebrityName': 'Real', 'a': 1.0, 'b': 0.0, 'c': 1.0})
+        index = self.build_index(rows)
+        self.assertEqual(index.nearest({'a': 1.0, 'b': 1.0, 'c': 1.0}, k=3), [('Real', 1, 3)])
+
+    def test_nearest_skips_excluded_names(self):
+        index = self.build_index([
+            {'CelebrityName': 'Exact', 'a': 1.0, 'b': 1.0},
+            {'CelebrityName': 'Other', 'a': 1.0, 'b': 0.0},
+        ])
+        self.assertEqual(index.nearest({'a': 1.0, 'b': 1.0}, k=1, exclude=['Exact']), [('Other', 1, 2)])
+
+
+class AnswerTimingTests(SimpleTestCase):
+    def test_running_summary_stays_three_numbers(self):
+        answer_ms = None
+        for ms in (300, 1200, 450):
+            answer_ms = add_answer_time(answer_ms, ms)
+        self.assertEqual(answer_ms, {'count': 3, 'total': 1950, 'max': 1200})
+
+    def test_aggregate_reads_summaries_and_older_sample_lists(self):
+        events = [{'outcome': 'correct', 'path': [], 'answer_ms': {'count': 3, 'total': 1950, 'max': 1200}},
+                  {'outcome': 'abandoned', 'path': [], 'answer_ms': [50]}]
+        self.assertEqual(aggregate_events(events)['answer_ms'], {'mean': 500.0, 'max': 1200})
+
+
+class NearestMatchViewTests(TestCase):
+    def pick(self, name):
+        session = self.client.session
+        session['akinator_nearest_names'] = ['Offered One', 'Offered Two']
+        session.save()
+        with mock.patch('game_app.views.record_guess_feedback') as record_guess_feedback:
+            self.client.post(reverse('game_app:process_learning'), {'action': 'nearest_match', 'matched_name': name})
+        return record_guess_feedback.call_args.kwargs['actual_name']
+
+    def test_offered_name_is_recorded(self):
+        self.assertEqual(self.pick('Offered Two'), 'Offered Two')
+
+    def test_name_outside_the_shortlist_is_ignored(self):
+        self.assertIsNone(self.pick('Somebody Else'))
+
+
+class ChannelOriginTests(SimpleTestCase):
+    def scope(self, origin, host='game.example.com'):
+        headers = [(b'host', host.encode())]
+        if origin is not None:
+            headers.append((b'origin', origin.encode()))
+        return {'headers': headers}
+
+    @override_settings(ALLOWED_HOSTS=['game.example.com'], CSRF_TRUSTED_ORIGINS=[])
+    def test_same_host_origin_is_allowed(self):
+        self.assertTrue(_origin_allowed(self.scope('https://game.example.com')))
+
+    @override_settings(ALLOWED_HOSTS=['game.example.com'], CSRF_TRUSTED_ORIGINS=[])
+    def test_foreign_origin_is_rejected(self):
+        self.assertFalse(_origin_allowed(self.scope('https://evil.example.net')))
+
+    @override_settings(ALLOWED_HOSTS=['other.example.com'], CSRF_TRUSTED_ORIGINS=[])
+    def test_host_outside_allowed_hosts_is_rejected(self):
+        self.assertFalse(_origin_allowed(self.scope('https://game.example.com')))
+
+    @override_settings(ALLOWED_HOSTS=['game.example.com'], CSRF_TRUSTED_ORIGINS=['https://*.example.org'])
+    def test_trusted_origins_are_allowed(self):
+        self.assertTrue(_origin_allowed(self.scope('https://app.example.org')))
+        self.assertFalse(_origin_allowed(self.scope('http://app.example.org')))
+
+    def test_missing_origin_is_allowed(self):
+        self.assertTrue(_origin_allowed(self.scope(None)))
+
+
+class ChannelSessionTests(TestCase):
+    async def test_pending_web_game_is_emitted_before_the_channel_game_replaces_it(self):
+        session = _session_store_class()()
+        await session.aupdate({'akinator_game_started_at': 1.0, 'akinator_answer_ms': {'count': 1, 'total': 500, 'max': 500},
+                               'akinator_path_taken': [{'attribute_id': 'is_male', 'answer': 1.0}]})
+        await session.asave()
+        session = _session_store_class()(session.session_key)
+        connection = SimpleNamespace(session_state=lambda: {'akinator_game_started_at': 2.0, 'akinator_answer_ms': None})
+        with mock.patch('game_app.utils_view_helpers.game_events') as game_events:
+            await _store_finished_game(session, connection)
+        event = game_events.emit.call_args.args[0]
+        self.assertEqual(event['path'], [['is_male', 1.0]])
+        self.assertEqual(event['answer_ms'], {'count': 1, 'total': 500, 'max': 500})
+        self.assertEqual(await session.aget('akinator_game_started_at'), 2.0)
+
+
+class PlayLiveViewTests(TestCase):
+    @override_settings(PREDINATOR_ASYNC_VIEWS=False)
+    def test_live_game_redirects_without_asgi(self):
+        response = self.client.get(reverse('game_app:play_live'))
+        self.assertRedirects(response, reverse('game_app:play'), fetch_redirect_response=False)
+
+
+class PreparedTrainingDataTests(SimpleTestCase):
+    def frame(self, names, columns):
+        rng = np.random.default_rng(len(names) * 31 + len(columns))
+        data = {'CelebrityName': names}
+        for col in columns:
+            data[col] = rng.choice([0.0, 1.0, np.nan], size=len(names))
+        return pd.DataFrame(data)
+
+    def assertMatchesFresh(self, prepared_result, df, columns):
+        X, y, class_names = prepared_result
+        fresh_X, fresh_y, fresh_names = PreparedTrainingData().update(df, columns)
+        np.testing.assert_array_equal(X, fresh_X)
+        np.testing.assert_array_equal(y, fresh_y)
+        np.testing.assert_array_equal(class_names, fresh_names)
+
+    def test_appended_rows_match_a_full_rebuild(self):
+        df = self.frame(['Carol', 'Alice', 'Erin'], ['a', 'b'])
+        prepared = PreparedTrainingData()
+        prepared.update(df, ['a', 'b'])
+        grown = pd.concat([df, self.frame(['Bob', 'Dave', 'Alice'], ['a', 'b'])], ignore_index=True)
+        self.assertMatchesFresh(prepared.update(grown, ['a', 'b']), grown, ['a', 'b'])
+
+    def test_appended_columns_match_a_full_rebuild(self):
+        df = self.frame(['Carol', 'Alice', 'Erin'], ['a', 'b', 'c'])
+        prepared = PreparedTrainingData()
+        prepared.update(df, ['a', 'b'])
+        self.assertMatchesFresh(prepared.update(df, ['a', 'b', 'c']), df, ['a', 'b', 'c'])
+
+    def test_reordered_rows_trigger_a_rebuild(self):
+        df = self.frame(['Carol', 'Alice', 'Erin'], ['a'])
+        prepared = PreparedTrainingData()
+        prepared.update(df, ['a'])
+        reordered = df.iloc[::-1].reset_index(drop=True)
+        self.assertMatchesFresh(prepared.update(reordered, ['a']), reordered, ['a'])
+
+    def test_earlier_snapshot_keeps_its_labels(self):
+        df = self.frame(['Carol', 'Erin'], ['a'])
+        prepared = PreparedTrainingData()
+        _, y, class_names = prepared.update(df, ['a'])
+        y_before, names_before = y.copy(), class_names.copy()
+        # 'Alice' sorts first, so every existing label id moves up by one in the new snapshot.
+        _, y_after, _ = prepared.update(pd.concat([df, self.frame(['Alice'], ['a'])], ignore_index=True), ['a'])
+        np.testing.assert_array_equal(y, y_before)
+        np.testing.assert_array_equal(class_names, names_before)
+        np.testing.assert_array_equal(y_after, [1, 2, 0])
+
+
+class QuestionSelectionTests(SimpleTestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            'CelebrityName': ['A', 'B', 'C', 'D'],
+            'useless': [1.0, 1.0, 1.0, 1.0],
+            'dup': [1.0, 1.0, 0.0, 0.0],
+            's1': [1.0, 1.0, 0.0, 0.0],
+            's2': [1.0, 0.0, 1.0, 0.0],
+        })
+
+    def test_nearest_rows_counts_unknowns_as_half_a_mismatch(self):
+        df = pd.DataFrame({'CelebrityName': ['Match', 'Unknown', 'Miss'], 'q': [1.0, np.nan, 0.0]})
+        self.assertEqual(nearest_rows(df, {'q': 1.0}, 3).tolist(), [0, 1, 2])
+
+    def test_picks_questions_until_neighbors_are_separated(self):
+        chosen = select_distinguishing_questions(self.df, {}, ['useless', 'dup', 's1', 's2', 'missing'])
+        # 's1' splits the neighbors exactly like 'dup' did, so only 's2' adds anything after it.
+        self.assertEqual(chosen, ['dup', 's2'])
+
+    def test_budget_limits_the_questions(self):
+        self.assertEqual(len(select_distinguishing_questions(self.df, {}, ['s1', 's2'], budget=1)), 1)
+
+    def test_impute_keeps_only_agreed_answers(self):
+        df = pd.DataFrame({
+            'CelebrityName': ['A', 'B', 'C', 'D', 'E'],
+            'known': [1.0] * 5,
+            'agreed': [1.0, 1.0, 1.0, 1.0, np.nan],
+            'split': [1.0, 0.0, 1.0, 0.0, 1.0],
+        })
+        self.assertEqual(impute_answers(df, {'known': 1.0}, ['agreed', 'split', 'absent']), {'agreed': 1.0})
+
+    def test_plan_attribute_questions_skips_answered_ones(self):
+        learning_module = LearningModule(tree_handler=None)
+        question_ids = {q.attribute_id for q in learning_module.all_questions_list}
+        answers = {'is_real_person': 1.0, 'is_male': None}
+        ask = learning_module.plan_attribute_questions(answers)
+        self.assertTrue(0 < len(ask) <= QUESTION_BUDGET)
+        self.assertTrue(set(ask) <= question_ids - set(answers))
+
+
+class MetricsLayoutTests(SimpleTestCase):
+    def test_metrics_own_disjoint_slots(self):
+        slots = []
+        for metric in metrics._metrics:
+            if isinstance(metric, metrics.Counter):
+                slots.append(metric.slot)
+            else:
+                slots.extend(range(metric.first_slot, metric.sum_slot + 1))
+        self.assertEqual(sorted(slots), list(range(metrics._slot_count)))
+
+    def test_observe_fills_its_bucket_and_sum(self):
+        histogram = metrics.TREE_TRAVERSAL_SECONDS
+        before = np.array(metrics._storage.values)
+        histogram.observe(0.003)
+        delta = np.array(metrics._storage.values) - before
+        bucket = histogram.first_slot + histogram.buckets.index(0.005)
+        self.assertEqual(delta[bucket], 1.0)
+        self.assertAlmostEqual(delta[histogram.sum_slot], 0.003)
+        self.assertEqual(np.count_nonzero(delta), 2)
+
+    def test_render_prometheus_reports_cumulative_buckets(self):
+        histogram = metrics.QUESTIONS_PER_GAME
+        values = np.zeros(metrics._slot_count)
+        values[histogram.first_slot + histogram.buckets.index(3)] = 2
+        values[histogram.first_slot + len(histogram.buckets)] = 1 # +Inf
+        values[histogram.sum_slot] = 106
+        text = metrics.render_prometheus(values)
+        self.assertIn('predinator_questions_per_game_bucket{le="2"} 0', text)
+        self.assertIn('predinator_questions_per_game_bucket{le="3"} 2', text)
+        self.assertIn('predinator_questions_per_game_bucket{le="+Inf"} 3', text)
+        self.assertIn('predinator_questions_per_game_count 3', text)
+
+    def test_fold_adds_exited_workers_into_the_archive(self):
+        if metrics.fcntl is None:
+            self.skipTest("Folding needs fcntl.")
+        exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+        exited.wait()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        ones = np.ones(metrics._slot_count)
+        exited_file = os.path.join(directory, f"{metrics.FILE_PREFIX}{exited.pid}.db")
+        live_file = os.path.join(directory, f"{metrics.FILE_PREFIX}{os.getppid()}.db")
+        metrics._write_values(exited_file, ones)
+        metrics._write_values(live_file, ones)
+        metrics._write_values(os.path.join(directory, metrics.ARCHIVE_FILE), ones * 2)
+        metrics._fold_exited_workers(directory)
+        np.testing.assert_array_equal(metrics._read_values(os.path.join(directory, metrics.ARCHIVE_FILE)), ones * 3)
+        self.assertFalse(os.path.exists(exited_file))
+        self.assertTrue(os.path.exists(live_file))
+
+
+class TrainedModelTestCase(SimpleTestCase):
+    """Trains the sample dataset into a temporary model directory once per class."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.model_dir = tempfile.mkdtemp()
+        cls.df_celebs = load_celebrity_data()
+        cls.tree_handler = AkinatorTree(model_dir=cls.model_dir)
+        if not cls.tree_handler.train(cls.df_celebs, load_questions()):
+            raise RuntimeError("Training the sample dataset failed.")
+        cls.attribute_cols = [col for col in cls.df_celebs.columns if col != 'CelebrityName']
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.model_dir, ignore_errors=True)
+        super().tearDownClass()
+
+    def character_answers(self, row):
+        return {attr_id: 'dont know' if pd.isna(row[attr_id]) else ('yes' if row[attr_id] > 0.5 else 'no')
+                for attr_id in self.attribute_cols}
+
+    def play(self, engine, answers):
+        for _ in range(200):
+            question, is_leaf = engine.get_next_question()
+            if is_leaf or question is None:
+                break
+            engine.process_answer(answers.get(question.attribute_id, 'dont know'))
+        return engine.make_guess()
+
+
+class PredictBatchTests(TrainedModelTestCase):
+    def test_predict_batch_matches_played_games(self):
+        engine = GameEngine(tree_handler=self.tree_handler, traversal='path')
+        games = [self.character_answers(row) for _, row in self.df_celebs.iterrows()]
+        answers = pd.DataFrame.from_records(
+            [{attr_id: answer_to_numeric(answer) for attr_id, answer in game.items()} for game in games],
+            columns=self.tree_handler.feature_columns).astype(float)
+        predictions = self.tree_handler.predict_batch(answers, early_guess_confidence=engine.early_guess_confidence)
+        for game, guess, questions in zip(games, predictions['guess'], predictions['questions']):
+            engine.start_new_game()
+            self.assertEqual(self.play(engine, game), guess)
+            self.assertEqual(len(engine.path_taken), questions)
+
+
+class BeamTraversalTests(TrainedModelTestCase):
+    def two_leaf_model(self):
+        return CompiledModel(
+            feature=[0, LEAF_FEATURE, LEAF_FEATURE], threshold=[0.5, -2.0, -2.0],
+            children_left=[1, -1, -1], children_right=[2, -1, -1], node_class=[0, 0, 1],
+            class_names=['No', 'Yes'], feature_columns=['q'],
+            questions=[{'text': 'Q?', 'possible_answers': ['yes', 'no', 'dontknow']}],
+            candidates=[[0, 1], [0, -1], [1, -1]], candidate_confidence=[[0.5, 0.5], [1.0, 0.0], [1.0, 0.0]],
+        )
+
+    def test_beam_search_docks_the_branch_against_the_answer(self):
+        nodes, scores = self.two_leaf_model().beam_search(np.array([1.0], dtype=np.float32), np.array([True]), 8, 2.0)
+        self.assertEqual(nodes.tolist(), [2, 1])
+        self.assertEqual(scores.tolist(), [0.0, -2.0])
+
+    def test_prune_beam_drops_rejected_leaves_and_keeps_width(self):
+        model = self.two_leaf_model()
+        answers, answered = np.array([1.0], dtype=np.float32), np.array([True])
+        nodes, _ = model.beam_search(answers, answered, 8, 2.0, rejected_classes=[1])
+        self.assertEqual(nodes.tolist(), [1])
+        nodes, _ = model.beam_search(answers, answered, 1, 2.0)
+        self.assertEqual(nodes.tolist(), [2])
+
+    def test_beam_asks_the_same_questions_as_path(self):
+        path_engine = GameEngine(tree_handler=self.tree_handler, traversal='path')
+        beam_engine = GameEngine(tree_handler=self.tree_handler, traversal='beam')
+        for _, row in self.df_celebs.iterrows():
+            answers = self.character_answers(row)
+            path_engine.start_new_game()
+            beam_engine.start_new_game()
+            self.assertEqual(self.play(beam_engine, answers), self.play(path_engine, answers))
+            self.assertEqual(beam_engine.path_taken, path_engine.path_taken)
+
+    def test_rejected_guess_leaves_the_beam(self):
+        engine = GameEngine(tree_handler=self.tree_handler, traversal='beam')
+        tree = self.tree_handler.compiled
+        checked = 0
+        for _, row in self.df_celebs.iterrows():
+            engine.start_new_game()
+            guess = self.play(engine, self.character_answers(row))
+            leaf = engine.current_node_id
+            if guess is None or tree.candidate_confidence[leaf, 0] < 1.0:
+                continue
+            engine.rejected_guesses.append(guess)
+            if engine.resume_after_rejection():
+                self.assertNotIn(leaf, engine.beam()[0].tolist())
+                self.assertNotEqual(self.play(engine, self.character_answers(row)), guess)
+            checked += 1
+        self.assertGreater(checked, 0)
+
+
+@override_settings(PREDINATOR_PREDICT_TOKEN='predict-secret')
+class PredictViewTests(TestCase):
+    def post(self, payload, token='predict-secret'):
+        headers = {'HTTP_X_PREDINATOR_PREDICT_TOKEN': token} if token else {}
+        body = payload if isinstance(payload, str) else json.dumps(payload)
+        return self.client.post(reverse('game_app:predict'), body, content_type='application/json', **headers)
+
+    def test_missing_or_wrong_token_is_forbidden(self):
+        self.assertEqual(self.post({'rows': []}, token=None).status_code, 403)
+        self.assertEqual(self.post({'rows': []}, token='wrong').status_code, 403)
+
+    @override_settings(PREDINATOR_PREDICT_TOKEN='')
+    def test_endpoint_is_off_without_a_configured_token(self):
+        self.assertEqual(self.post({'rows': []}, token='anything').status_code, 403)
+
+    def test_malformed_payloads_are_rejected(self):
+        for payload in ('not json', [], {'rows': 'abc'}, {'rows': [], 'dataset': 5},
+                        {'rows': [], 'dataset': '../etc'}, {'rows': [], 'columns': [1]}):
+            with self.subTest(payload=payload):
+                self.assertEqual(self.post(payload).status_code, 400)
+
+    def test_unknown_dataset_is_not_found(self):
+        self.assertEqual(self.post({'rows': [], 'dataset': 'no-such-dataset'}).status_code, 404)
+
+
+class ModelWatcherTests(SimpleTestCase):
+    class FakeHandler:
+        def __init__(self, version, loads=True):
+            self.model_version = version
+            self.loads = loads
+
+        def load_model_and_metadata(self):
+            return self.loads
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.version_file = os.path.join(directory, 'VERSION')
+        with open(self.version_file, 'w', encoding='utf-8') as f:
+            f.write('v2')
+        self.service = SimpleNamespace(game_engine=SimpleNamespace(tree_handler=self.FakeHandler('v1')))
+        self.service.swap_tree_handler = lambda handler: setattr(self.service.game_engine, 'tree_handler', handler)
+        self.watcher = ModelWatcher(self.service, self.version_file, interval=0)
+
+    def check_and_wait(self, handler):
+        with mock.patch('predinator_core.tree_builder.create_tree_handler', return_value=handler):
+            self.watcher.check()
+            deadline = time.monotonic() + 5
+            while self.watcher._reloading and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+    @override_settings(PREDINATOR_MODEL_HOSTING='private')
+    def test_failed_reload_is_retried_on_the_next_check(self):
+        self.check_and_wait(self.FakeHandler('v2', loads=False))
+        self.assertEqual(self.service.game_engine.tree_handler.model_version, 'v1')
+        self.check_and_wait(self.FakeHandler('v2'))
+        self.assertEqual(self.service.game_engine.tree_handler.model_version, 'v2')
+
+    @override_settings(PREDINATOR_MODEL_HOSTING='private')
+    def test_publish_during_a_reload_is_picked_up_afterwards(self):
+        self.watcher._reloading = True # A reload of an older publish is still running
+        self.watcher.check()
+        self.assertEqual(self.service.game_engine.tree_handler.model_version, 'v1')
+        self.watcher._reloading = False
+        self.check_and_wait(self.FakeHandler('v2'))
+        self.assertEqual(self.service.game_engine.tree_handler.model_version, 'v2')
@@ -1,23 +1,51 @@
 # predinator/game_app/urls.py
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views, game_channel
+
+# Under ASGI, the gameplay and learning views can be served by their async versions,
+# which keep parquet I/O and retraining off the event loop.
+flow_views = async_views if settings.PREDINATOR_ASYNC_VIEWS else views
 
 app_name = 'game_app'
 urlpatterns = [
-    path('play/', views.play_view, name='play'),
-    path('answer/', views.answer_view, name='answer'),
-    path('learn_feedback/', views.learn_feedback_view, name='learn_feedback'),
-    path('process_learning/', views.process_learning_view, name='process_learning'),
+    path('play/', flow_views.play_view, name='play'),
+    path('answer/', flow_views.answer_view, name='answer'),
+    path('learn_feedback/', flow_views.learn_feedback_view, name='learn_feedback'),
+    path('process_learning/', flow_views.process_learning_view, name='process_learning'),
     
     # URL for the form where a user adds a new distinguishing question
     path('add_question_form/', views.add_question_form_view, name='add_question_form'),
     
     # URL to handle the submission of that new question form
-    path('submit_new_question/', views.submit_new_question_view, name='submit_new_question'),
+    path('submit_new_question/', flow_views.submit_new_question_view, name='submit_new_question'),
     
     # ADDED: URL for the form that collects all attributes for a new character
     path('learn_attributes/', views.learn_attributes_view, name='learn_attributes'),
     
     # URL to reset the game
     path('reset/', views.reset_game_view, name='reset_game'),
-]
\ No newline at end of file
+
+    # Persistent game channel: one connection per game (the WebSocket endpoint is routed in asgi.py).
+    # Without ASGI, live/ redirects to the regular game; the SSE routes are added below.
+    path('live/', views.play_live_view, name='play_live'),
+
+    # Themed datasets: pick one for this session's games, or list what is available
+    path('d/<slug:dataset_id>/', views.select_dataset_view, name='select_dataset'),
+    path('datasets/', views.datasets_view, name='datasets'),
+
+    # Vectorized scoring of many answer vectors at once (offline evaluation, replays, bot traffic)
+    path('predict/', views.predict_view, name='predict'),
+
+    # Static, content-hashed export of the whole game tree for client/CDN-side play
+    path('tree/', views.game_tree_current_view, name='game_tree_current'),
+    path('tree/<slug:version>.json', views.game_tree_view, name='game_tree'),
+]
+
+if settings.PREDINATOR_ASYNC_VIEWS:
+    # SSE streams hold their game in the worker's memory: a sync worker would be tied up for the
+    # whole game, and the answer POSTs would land on other processes.
+    urlpatterns += [
+        path('channel/sse/', game_channel.channel_sse_view, name='channel_sse'),
+        path('channel/sse/<slug:channel_id>/answer/', game_channel.channel_sse_answer_view, name='channel_sse_answer'),
+    ]
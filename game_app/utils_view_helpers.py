@@ -1,24 +1,39 @@
 # PREDINATOR/game_app/utils_view_helpers.py
+import json
 import numpy as np
-import pandas as pd
+import logging
 import time
+from predinator_core.game_events import add_answer_time, answer_time_summary, game_events
+from predinator_core.metrics import SESSION_GAME_STATE_SECONDS, GUESSES_RIGHT, GUESSES_WRONG
+from predinator_core.similarity_index import get_character_index, NEAREST_COUNT
+from predinator_core.utils import is_dont_know, DatasetPaths, DEFAULT_DATASET_ID
 
+logger = logging.getLogger(__name__)
+
+def get_session_dataset_id(request_session):
+    """Dataset the session's games are played on; chosen via select_dataset_view."""
+    return request_session.get('akinator_dataset_id') or DEFAULT_DATASET_ID
+
+
+@SESSION_GAME_STATE_SECONDS.timed
 def get_session_game_state(request_session, game_engine_instance):
     """
     Loads game state from the Django session into the provided game_engine_instance.
     This function is now refined to ONLY reset the game if the model has changed
     or if it's a brand new session, NOT just because a game ended.
     """
-    print(f"[{time.ctime()}] HELPER: get_session_game_state - START.")
+    logger.debug("get_session_game_state - START.")
 
     if not game_engine_instance or not game_engine_instance.tree_handler.model:
-        print(f"[{time.ctime()}] HELPER Error: Game engine or model not available.")
+        logger.error("Game engine or model not available.")
         # Set session state to force an error/feedback page gracefully.
         request_session['akinator_game_active'] = False
         request_session['akinator_feedback_mode'] = True
         return
 
-    current_model_id = id(game_engine_instance.tree_handler.model)
+    # The content-hash version is identical in every worker, unlike id(model), so games survive
+    # being served by different workers and reset only when a new model is actually published.
+    current_model_id = game_engine_instance.tree_handler.model_version
     session_model_id = request_session.get('akinator_model_id')
     
     reset_needed = False
@@ -33,11 +48,12 @@ def get_session_game_state(request_session, game_engine_instance):
         reset_reason = f"model has been retrained (session: {session_model_id}, current: {current_model_id})"
 
     if reset_needed:
-        print(f"[{time.ctime()}] HELPER Session: Resetting game state because: {reset_reason}.")
+        logger.debug("Resetting game state because: %s.", reset_reason)
+        record_game_event(request_session) # A game cut short by a retrain counts as abandoned
         
         # Start a new game within the engine instance
         if not game_engine_instance.start_new_game():
-            print(f"[{time.ctime()}] HELPER Error: game_engine.start_new_game() FAILED.")
+            logger.error("game_engine.start_new_game() FAILED.")
             request_session['akinator_game_active'] = False
             request_session['akinator_feedback_mode'] = True
             return
@@ -48,18 +64,23 @@ def get_session_game_state(request_session, game_engine_instance):
         request_session['akinator_game_active'] = True
         request_session['akinator_model_id'] = current_model_id
         request_session['akinator_last_guess'] = None
+        request_session['akinator_guess_candidates'] = []
+        request_session['akinator_rejected_guesses'] = []
+        request_session.pop('akinator_nearest_names', None)
         request_session['akinator_feedback_mode'] = False
-        print(f"[{time.ctime()}] HELPER Session: New game state initialized in session.")
+        request_session.update(new_game_timing(current_model_id))
+        logger.debug("New game state initialized in session.")
     else:
         # If no reset is needed, simply load the existing state from session into the engine.
         # This will correctly load the state of a finished game (game_active=False) when needed.
         game_engine_instance.current_node_id = request_session.get('akinator_current_node_id', 0)
         game_engine_instance.path_taken = request_session.get('akinator_path_taken', [])
         game_engine_instance.game_active = request_session.get('akinator_game_active', True)
-        print(f"[{time.ctime()}] HELPER Session: Loaded existing state into engine. Active: {game_engine_instance.game_active}")
+        game_engine_instance.rejected_guesses = request_session.get('akinator_rejected_guesses') or []
+        logger.debug("Loaded existing state into engine. Active: %s", game_engine_instance.game_active)
 
     request_session.modified = True
-    print(f"[{time.ctime()}] HELPER: get_session_game_state - END.")
+    logger.debug("get_session_game_state - END.")
     return
 
 
@@ -69,7 +90,7 @@ def update_session_game_state(request_session, game_engine_instance):
     (No changes needed here, but kept for completeness).
     """
     if not game_engine_instance:
-        print(f"[{time.ctime()}] HELPER Error: Game engine not available in update_session_game_state.")
+        logger.error("Game engine not available in update_session_game_state.")
         return
 
     request_session['akinator_current_node_id'] = int(game_engine_instance.current_node_id)
@@ -81,7 +102,7 @@ def update_session_game_state(request_session, game_engine_instance):
             if isinstance(item, dict):
                 serializable_item = {
                     key: int(value) if isinstance(value, np.integer) else
-                         (None if pd.isna(value) else float(value)) if isinstance(value, np.floating) else
+                         (None if is_dont_know(value) else float(value)) if isinstance(value, np.floating) else
                          value
                     for key, value in item.items()
                 }
@@ -91,4 +112,226 @@ def update_session_game_state(request_session, game_engine_instance):
     request_session['akinator_game_active'] = bool(game_engine_instance.game_active)
     
     request_session.modified = True
-    print(f"[{time.ctime()}] HELPER Session: Updated state saved. Node: {request_session['akinator_current_node_id']}, Active: {request_session['akinator_game_active']}")
\ No newline at end of file
+    logger.debug("Updated state saved. Node: %s, Active: %s", request_session['akinator_current_node_id'], request_session['akinator_game_active'])
+
+
+def path_answers(path_taken):
+    """{attr_id: 1.0/0.0/None} for the questions answered during the game."""
+    return {item['attribute_id']: _session_answer(item['answer']) for item in path_taken}
+
+
+def guess_session_state(guess_candidates, rejected_guesses=()):
+    """
+    Session keys for a guess just made: the guess, its confidence and the ranked follow-ups
+    (GameEngine.guess_candidates after the first) offered if the player says it was wrong.
+    rejected_guesses carries over the guesses already turned down in a game resumed after them.
+    """
+    guess, confidence = guess_candidates[0] if guess_candidates else (None, None)
+    return {
+        'akinator_last_guess': guess,
+        'akinator_last_guess_confidence': None if confidence is None else round(float(confidence), 4),
+        'akinator_guess_candidates': [[name, round(float(p), 4)] for name, p in guess_candidates[1:]],
+        'akinator_rejected_guesses': list(rejected_guesses),
+    }
+
+
+def nearest_known_characters(request_session, k=NEAREST_COUNT):
+    """
+    Known characters closest to the session's answered path (see similarity_index), leaving out
+    the guesses already made or still queued. Offered when a game ends without the right guess:
+    often the player is thinking of one of them and gave a single wrong answer.
+    The names offered are kept in the session for nearest_match_response to check against.
+    """
+    paths = DatasetPaths(get_session_dataset_id(request_session))
+    index = get_character_index(paths.celebrities_file)
+    if index is None:
+        return []
+    exclude = [request_session.get('akinator_last_guess')]
+    exclude += [name for name, _ in request_session.get('akinator_guess_candidates') or []]
+    exclude += request_session.get('akinator_rejected_guesses') or []
+    answers = path_answers(request_session.get('akinator_path_taken', []))
+    nearest = index.nearest(answers, k, exclude=[n for n in exclude if n])
+    # The shortlist shown is the only set of names a nearest_match answer may pick from.
+    request_session['akinator_nearest_names'] = [name for name, _, _ in nearest]
+    return [{'name': name, 'matched': compared - mismatches, 'compared': compared} for name, mismatches, compared in nearest]
+
+
+def record_guess_feedback(request_session, correct, actual_name=None):
+    """
+    Counts the player's verdict on the current guess (once per guess); a wrong one joins the rejected guesses.
+    The verdict, and the character the player named if any, become the outcome of the game's analytics event.
+    """
+    guess = request_session.get('akinator_last_guess')
+    if actual_name or correct:
+        request_session['akinator_game_actual'] = actual_name or guess
+    rejected = request_session.get('akinator_rejected_guesses') or []
+    if not guess or guess in rejected:
+        return
+    if correct:
+        GUESSES_RIGHT.inc()
+        request_session['akinator_game_outcome'] = 'correct'
+        return
+    GUESSES_WRONG.inc()
+    request_session['akinator_rejected_guesses'] = rejected + [guess]
+    request_session.setdefault('akinator_game_outcome', 'wrong')
+
+
+def take_next_guess(request_session):
+    """Promotes the next ranked follow-up to the current guess. Returns its name, or None when none are left."""
+    record_guess_feedback(request_session, correct=False)
+    pending = request_session.get('akinator_guess_candidates') or []
+    if not pending:
+        return None
+    name, confidence = pending[0]
+    request_session['akinator_last_guess'] = name
+    request_session['akinator_last_guess_confidence'] = confidence
+    request_session['akinator_guess_candidates'] = pending[1:]
+    return name
+
+
+def resume_game_after_rejection(request_session, game_engine_instance):
+    """
+    Beam traversal: instead of the next queued follow-up, plays on from the likeliest branch the
+    rejected guesses leave (GameEngine.resume_after_rejection), asking its remaining questions.
+    Returns False when the engine cannot resume; the caller then falls back to take_next_guess.
+    """
+    if not game_engine_instance or game_engine_instance.traversal != 'beam':
+        return False
+    get_session_game_state(request_session, game_engine_instance)
+    guess = request_session.get('akinator_last_guess')
+    rejected = request_session.get('akinator_rejected_guesses') or []
+    game_engine_instance.rejected_guesses = rejected + [guess] if guess and guess not in rejected else rejected
+    if not game_engine_instance.resume_after_rejection():
+        return False
+    record_guess_feedback(request_session, correct=False)
+    request_session['akinator_last_guess'] = None
+    request_session['akinator_guess_candidates'] = []
+    request_session['akinator_feedback_mode'] = False
+    update_session_game_state(request_session, game_engine_instance)
+    return True
+
+
+def build_attribute_form_context(celebrity_name, path_taken, question_set_version, ask=None):
+    """
+    Builds the session-side context for the attribute form. Only the question-set
+    version, the player's sparse answers and the ids of the extra questions to ask
+    (see LearningModule.plan_attribute_questions) are stored; the question list itself
+    is rebuilt from the shared question catalog by expand_attribute_form_context.
+    """
+    context = {
+        'celebrity_name': celebrity_name,
+        'question_set_version': question_set_version,
+        'answers': path_answers(path_taken),
+        'form_action': 'submit_new_celebrity_attributes',
+    }
+    if ask is not None:
+        context['ask'] = list(ask)
+    return context
+
+
+def expand_attribute_form_context(form_context, catalog_snapshot):
+    """
+    Turns the sparse session context into the learn_new_celebrity_attributes.html
+    context, pre-filling each question with the player's answer (if any). With an 'ask'
+    list only the answered and listed questions are shown, the learner imputes the rest;
+    without one (older sessions) every catalog question is. A newer catalog version than
+    the one recorded is fine: the stored answers are keyed by attribute id and stay valid.
+    """
+    answers = form_context.get('answers', {})
+    ask = form_context.get('ask')
+    shown = None if ask is None else set(answers) | set(ask)
+    if form_context.get('question_set_version') != catalog_snapshot.version:
+        logger.info("Question set changed since the form was prepared (%s -> %s).",
+                    form_context.get('question_set_version'), catalog_snapshot.version)
+
+    questions_to_ask = []
+    for q_obj in catalog_snapshot.questions:
+        if shown is not None and q_obj.attribute_id not in shown:
+            continue
+        answer = answers.get(q_obj.attribute_id)
+        questions_to_ask.append({
+            'attribute_id': q_obj.attribute_id,
+            'text': q_obj.text,
+            'current_answer': answer,
+            'current_answer_is_nan': answer is None
+        })
+
+    context = {
+        'celebrity_name': form_context['celebrity_name'],
+        'questions_to_ask': questions_to_ask,
+        'imputed_question_count': len(catalog_snapshot.questions) - len(questions_to_ask),
+        'game_path_json': json.dumps(answers),
+        'form_action': form_context.get('form_action', 'submit_new_celebrity_attributes'),
+    }
+    if form_context.get('new_question_info'):
+        context['new_question_info_json'] = json.dumps(form_context['new_question_info'])
+    return context
+
+
+def _session_answer(value):
+    # Session answers are 1.0, 0.0 or None ("don't know"); NaN is not valid JSON.
+    return None if is_dont_know(value) else float(value)
+
+
+# --- Game analytics (see predinator_core.game_events) ---
+
+def new_game_timing(model_version):
+    """Session keys that time a game from its start, and the model it is played on."""
+    now = time.time()
+    return {'akinator_game_model_version': model_version, 'akinator_game_started_at': now,
+            'akinator_last_answer_at': now, 'akinator_answer_ms': None}
+
+
+def record_answer_timing(request_session):
+    """
+    Adds the time the player took since the previous answer (or the game start) to the game's
+    running answer count, total and slowest time, so the session does not grow with every answer.
+    """
+    now = time.time()
+    last = request_session.get('akinator_last_answer_at') or now
+    request_session['akinator_answer_ms'] = add_answer_time(request_session.get('akinator_answer_ms'),
+                                                            round((now - last) * 1000))
+    request_session['akinator_last_answer_at'] = now
+
+
+def game_event(game_state):
+    """
+    The analytics event for a game, from session-shaped state; None if nothing was played.
+    A game with no verdict is "no_guess" if it ran out of questions, "abandoned" otherwise.
+    """
+    path = game_state.get('akinator_path_taken') or []
+    guess = game_state.get('akinator_last_guess')
+    if not path and not guess:
+        return None
+    outcome = game_state.get('akinator_game_outcome')
+    if outcome is None:
+        ended = game_state.get('akinator_feedback_mode') and not game_state.get('akinator_game_active')
+        outcome = 'no_guess' if ended and not guess else 'abandoned'
+    now = time.time()
+    started = game_state.get('akinator_game_started_at')
+    return {
+        'ts': now,
+        'dataset': game_state.get('akinator_dataset_id') or DEFAULT_DATASET_ID,
+        'model_version': game_state.get('akinator_game_model_version') or game_state.get('akinator_model_id'),
+        'source': game_state.get('akinator_game_source') or 'web',
+        'outcome': outcome,
+        'path': [[item['attribute_id'], _session_answer(item['answer'])] for item in path],
+        'answer_ms': answer_time_summary(game_state.get('akinator_answer_ms')),
+        'duration_ms': round((now - started) * 1000) if started else None,
+        'guess': guess,
+        'guesses': len(game_state.get('akinator_rejected_guesses') or []) + (1 if guess else 0),
+        'actual': game_state.get('akinator_game_actual'),
+    }
+
+
+def record_game_event(request_session):
+    """
+    Emits the event for the session's current game, if it has one, and clears the keys that describe it.
+    A game is emitted once: akinator_game_started_at is set when it starts and popped here.
+    """
+    event = game_event(request_session) if 'akinator_game_started_at' in request_session else None
+    for key in ('akinator_game_outcome', 'akinator_game_actual', 'akinator_game_model_version', 'akinator_game_source',
+                'akinator_game_started_at', 'akinator_last_answer_at', 'akinator_answer_ms'):
+        request_session.pop(key, None)
+    if event is not None:
+        game_events.emit(event)
@@ -1,19 +1,40 @@
 # PREDINATOR/game_app/views.py
 from django.shortcuts import render, redirect
 from django.contrib import messages
+from django.http import HttpResponse, Http404, JsonResponse
+from django.conf import settings
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import etag, require_GET, require_POST
+import hmac
 import json
-import pandas as pd
-import time
-
-from .game_services import get_global_game_engine, get_global_learning_module
-from .utils_view_helpers import get_session_game_state, update_session_game_state
+import logging
+import os
+
+import numpy as np
+
+from .game_services import (get_global_game_engine, get_global_learning_module, warm_model_caches,
+                            get_dataset_game_engine, model_registry)
+from .render_cache import question_fragment_cache
+from .game_channel import WEBSOCKET_PATH
+from .utils_view_helpers import (get_session_game_state, update_session_game_state, get_session_dataset_id,
+                                 build_attribute_form_context, expand_attribute_form_context, path_answers,
+                                 guess_session_state, take_next_guess, record_guess_feedback, resume_game_after_rejection,
+                                 nearest_known_characters, record_answer_timing, record_game_event)
 from predinator_core.data_manager import load_celebrity_data
+from predinator_core.question_catalog import question_catalog
+from predinator_core.compiled_model import export_file_name, read_current_export_version
+from predinator_core.model_registry import is_valid_dataset_id, list_datasets
+from predinator_core.metrics import render_prometheus
+from predinator_core.utils import (GAME_TREE_EXPORT_DIR, DEFAULT_DATASET_ID, EARLY_GUESS_CONFIDENCE,
+                                  answer_to_numeric, is_dont_know)
+
+logger = logging.getLogger(__name__)
 
 # --- Main Game Views ---
 
 def play_view(request):
-    print(f"[{time.ctime()}] VIEWS: play_view - Top.")
-    game_engine = get_global_game_engine()
+    logger.debug("play_view - Top.")
+    game_engine = get_dataset_game_engine(get_session_dataset_id(request.session))
     if not game_engine or not game_engine.tree_handler.model:
         messages.error(request, "Akinator model is not available. Please run train_model.py")
         return render(request, 'game_app/error.html', {'message': 'Akinator model is unavailable.'})
@@ -27,9 +48,9 @@ def play_view(request):
 
     if is_leaf or not question_obj:
         guessed_celebrity = game_engine.make_guess()
-        print(f"[{time.ctime()}] VIEWS: play_view - Guess made: '{guessed_celebrity}'")
+        logger.debug("play_view - Guess made: '%s'", guessed_celebrity)
         
-        request.session['akinator_last_guess'] = guessed_celebrity
+        request.session.update(guess_session_state(game_engine.guess_candidates, game_engine.rejected_guesses))
         request.session['akinator_game_active'] = game_engine.game_active
         request.session['akinator_feedback_mode'] = True
         update_session_game_state(request.session, game_engine)
@@ -37,8 +58,10 @@ def play_view(request):
         return redirect('game_app:learn_feedback')
 
     context = {
-        'question_text': question_obj.text,
-        'possible_answers': question_obj.possible_answers,
+        'question_fragment': question_fragment_cache.get_fragment(
+            request, game_engine.tree_handler, game_engine.current_node_id,
+            question_obj.text, question_obj.possible_answers
+        ),
     }
     return render(request, 'game_app/play.html', context)
 
@@ -47,7 +70,7 @@ def answer_view(request):
     if request.method != 'POST':
         return redirect('game_app:play')
 
-    game_engine = get_global_game_engine()
+    game_engine = get_dataset_game_engine(get_session_dataset_id(request.session))
     if not game_engine:
         messages.error(request, "Game engine is not available.")
         return redirect('game_app:play')
@@ -57,31 +80,71 @@ def answer_view(request):
     user_answer_str = request.POST.get('answer')
     if user_answer_str and game_engine.process_answer(user_answer_str):
         update_session_game_state(request.session, game_engine)
+        record_answer_timing(request.session)
     else:
         messages.warning(request, "Could not process that answer.")
 
     return redirect('game_app:play')
 
 
+def play_live_view(request):
+    """Single-page game over the persistent channel (WebSocket, falling back to SSE)."""
+    if not settings.PREDINATOR_ASYNC_VIEWS: # The channel needs ASGI; WSGI deployments play the regular game
+        return redirect('game_app:play')
+    return render(request, 'game_app/play_live.html', {'websocket_path': WEBSOCKET_PATH})
+
+
 # --- Learning and Feedback Views ---
 
 def learn_feedback_view(request):
-    print(f"[{time.ctime()}] VIEWS: learn_feedback_view - Top.")
-    get_session_game_state(request.session, get_global_game_engine())
+    logger.debug("learn_feedback_view - Top.")
+    get_session_game_state(request.session, get_dataset_game_engine(get_session_dataset_id(request.session)))
 
     last_guess = request.session.get('akinator_last_guess')
     game_active = request.session.get('akinator_game_active', False)
 
+    confidence = request.session.get('akinator_last_guess_confidence')
     context = {
         'last_guess': last_guess,
+        'last_guess_confidence_pct': None if confidence is None else round(confidence * 100),
+        'more_guesses': len(request.session.get('akinator_guess_candidates') or []),
         'game_ended_no_guess': not game_active and not last_guess,
     }
+    if last_guess or context['game_ended_no_guess']:
+        context['nearest_characters'] = nearest_known_characters(request.session)
     return render(request, 'game_app/learn_feedback.html', context)
 
 
+def run_learning_steps(steps):
+    """
+    Drives one of the learning step generators below synchronously: every blocking call it
+    yields as (func, args, kwargs) runs inline and its result is sent back in. The async views
+    drive the same generators, dispatching those calls to the learning executor instead.
+    """
+    try:
+        call = next(steps)
+        while True:
+            func, args, kwargs = call
+            call = steps.send(func(*args, **kwargs))
+    except StopIteration as stop:
+        return stop.value
+
+
 def process_learning_view(request):
     if request.method != 'POST':
         return redirect('game_app:learn_feedback')
+    return run_learning_steps(process_learning_steps(request))
+
+
+def process_learning_steps(request):
+    # Generator: yields each dataset read or retrain as (func, args, kwargs); see run_learning_steps.
+    if request.POST.get('action') == 'next_guess':
+        return next_guess_response(request)
+    if request.POST.get('action') == 'nearest_match':
+        return nearest_match_response(request)
+    if get_session_dataset_id(request.session) != DEFAULT_DATASET_ID and request.POST.get('action') != 'correct_guess':
+        messages.info(request, "Teaching me new characters is only available for the main dataset.")
+        return redirect('game_app:reset_game')
 
     learning_module = get_global_learning_module()
     game_engine = get_global_game_engine()
@@ -97,12 +160,14 @@ def process_learning_view(request):
     actual_celebrity_name = request.POST.get('actual_celebrity_name', '').strip()
 
     if action == 'correct_guess':
+        record_guess_feedback(request.session, correct=True)
         messages.success(request, "Great! I knew it!")
         return redirect('game_app:reset_game')
 
     elif action in ('incorrect_guess', 'no_guess_learn') and actual_celebrity_name:
-        df_celebs = load_celebrity_data()
-        if actual_celebrity_name in df_celebs['CelebrityName'].values:
+        record_guess_feedback(request.session, correct=False, actual_name=actual_celebrity_name)
+        df_celebs = yield (load_celebrity_data, (), {})
+        if not df_celebs.empty and actual_celebrity_name in df_celebs['CelebrityName'].values:
             messages.info(request, f"'{actual_celebrity_name}' is already in my database. My apologies for the wrong guess!")
             return redirect('game_app:reset_game')
 
@@ -114,42 +179,31 @@ def process_learning_view(request):
             }
             return redirect('game_app:add_question_form')
         else:
-            game_path_answers = {item['attribute_id']: item['answer'] for item in path_taken}
-            all_system_questions = learning_module.all_questions_list
-            if not all_system_questions:
+            catalog_snapshot = question_catalog.snapshot()
+            if not catalog_snapshot.questions:
                 messages.error(request, "No questions available in the system to learn attributes.")
                 return redirect('game_app:learn_feedback')
-            
-            questions_to_ask = []
-            for q_obj in all_system_questions:
-                answer = game_path_answers.get(q_obj.attribute_id)
-                questions_to_ask.append({
-                    'attribute_id': q_obj.attribute_id,
-                    'text': q_obj.text,
-                    'current_answer': answer,
-                    'current_answer_is_nan': pd.isna(answer) if answer is not None else True
-                })
-            
-            request.session['context_for_attribute_form'] = {
-                'celebrity_name': actual_celebrity_name,
-                'questions_to_ask': questions_to_ask,
-                'game_path_json': json.dumps(game_path_answers),
-                'form_action': 'submit_new_celebrity_attributes'
-            }
+
+            ask = yield (learning_module.plan_attribute_questions,
+                         (path_answers(path_taken), last_guess if action == 'incorrect_guess' else None, df_celebs), {})
+            request.session['context_for_attribute_form'] = build_attribute_form_context(
+                actual_celebrity_name, path_taken, catalog_snapshot.version, ask
+            )
             return redirect('game_app:learn_attributes')
 
     elif action == 'submit_new_celebrity_attributes':
         all_submitted_attrs = {k.replace('attr_', ''): v for k, v in request.POST.items() if k.startswith('attr_')}
         
-        success = learning_module.learn_new_celebrity_fully_web(
+        success = yield (learning_module.learn_new_celebrity_fully_web, (), dict(
             actual_celebrity_name=actual_celebrity_name,
             game_path_answers=json.loads(request.POST.get('game_path_json', '{}')),
             all_submitted_attributes=all_submitted_attrs
-        )
+        ))
         
         # --- CRITICAL CHANGE FOR GRACEFUL FAILURE ---
         if success:
             messages.success(request, f"Successfully learned about '{actual_celebrity_name}' and retrained the model!")
+            warm_model_caches(game_engine)
             request.session['akinator_model_id'] = None # Invalidate model ID to force a fresh game state
         else:
             messages.error(request, f"Failed to learn about '{actual_celebrity_name}'. The existing model is still active. Please check server logs for details.")
@@ -164,12 +218,38 @@ def process_learning_view(request):
     return redirect('game_app:reset_game')
 
 
+def next_guess_response(request):
+    # The player rejected the guess: with beam traversal play on along another branch, otherwise
+    # offer the next ranked candidate, before falling back to learning.
+    if resume_game_after_rejection(request.session, get_dataset_game_engine(get_session_dataset_id(request.session))):
+        messages.info(request, "Let me think again.")
+        return redirect('game_app:play')
+    if take_next_guess(request.session):
+        messages.info(request, "Let me try again.")
+    else:
+        messages.info(request, "I'm out of guesses. Tell me who it was!")
+    return redirect('game_app:learn_feedback')
+
+
+def nearest_match_response(request):
+    # The player picked one of the suggested known characters: nothing to learn or retrain.
+    # Only a name from the shortlist the feedback page offered counts; anything else is ignored.
+    name = request.POST.get('matched_name', '').strip()
+    if name not in (request.session.pop('akinator_nearest_names', None) or []):
+        name = ''
+    record_guess_feedback(request.session, correct=False, actual_name=name or None)
+    if name:
+        messages.success(request, f"So it was {name}! I do know them, I just took a wrong turn.")
+    return redirect('game_app:reset_game')
+
+
 def learn_attributes_view(request):
-    context = request.session.get('context_for_attribute_form')
-    if not context:
+    form_context = request.session.get('context_for_attribute_form')
+    if not form_context or 'answers' not in form_context:
         messages.error(request, "Cannot collect attributes: information missing from session. Please start over.")
         return redirect('game_app:learn_feedback')
-    
+
+    context = expand_attribute_form_context(form_context, question_catalog.snapshot())
     return render(request, 'game_app/learn_new_celebrity_attributes.html', context)
 
 
@@ -188,7 +268,11 @@ def add_question_form_view(request):
 def submit_new_question_view(request):
     if request.method != 'POST':
         return redirect('game_app:add_question_form')
+    return run_learning_steps(submit_new_question_steps(request))
+
 
+def submit_new_question_steps(request):
+    # Generator like process_learning_steps: the question and dataset rewrite is its one blocking call.
     learning_module = get_global_learning_module()
     if not learning_module:
         messages.error(request, "Learning service is unavailable.")
@@ -210,7 +294,7 @@ def submit_new_question_view(request):
         request.session['form_error'] = "All fields are required."
         return redirect('game_app:add_question_form')
 
-    context_for_next_step = learning_module.web_add_question_and_learn_redirect(
+    context_for_next_step = yield (learning_module.web_add_question_and_learn_redirect, (), dict(
          guessed_celebrity_name=guessed_celebrity,
          actual_celebrity_name=learn_info['actual_celebrity'],
          game_path=learn_info['game_path'],
@@ -218,7 +302,7 @@ def submit_new_question_view(request):
          new_q_attr_id=new_q_attr_id,
          ans_for_actual_new_q_str=ans_for_actual,
          ans_for_guessed_new_q_str=ans_for_guessed or "dontknow"
-    )
+    ))
 
     if context_for_next_step:
         request.session['context_for_attribute_form'] = context_for_next_step
@@ -233,13 +317,18 @@ def submit_new_question_view(request):
 # --- Utility View ---
 
 def reset_game_view(request):
-    print(f"[{time.ctime()}] VIEWS: reset_game_view - Clearing all game-related session keys.")
+    logger.debug("reset_game_view - Clearing all game-related session keys.")
+    record_game_event(request.session)
     
     keys_to_clear = [
         'akinator_current_node_id', 
         'akinator_path_taken', 
         'akinator_game_active',
         'akinator_last_guess', 
+        'akinator_last_guess_confidence',
+        'akinator_guess_candidates',
+        'akinator_rejected_guesses',
+        'akinator_nearest_names',
         'akinator_feedback_mode', 
         'learn_info_for_new_question',
         'context_for_attribute_form',
@@ -254,4 +343,170 @@ def reset_game_view(request):
     request.session['akinator_feedback_mode'] = False
 
     messages.info(request, "Game has been reset. Let's play!")
-    return redirect('game_app:play')
\ No newline at end of file
+    return redirect('game_app:play')
+
+
+# --- Themed Datasets ---
+
+def select_dataset_view(request, dataset_id):
+    """Switches this session's games to another dataset and starts a fresh game on it."""
+    if dataset_id != DEFAULT_DATASET_ID and model_registry.get(dataset_id) is None:
+        raise Http404(f"Dataset '{dataset_id}' is not available.")
+    request.session['akinator_dataset_id'] = dataset_id
+    request.session['akinator_model_id'] = None # Forces get_session_game_state to start a new game on this dataset
+    return reset_game_view(request)
+
+
+@require_GET
+def datasets_view(request):
+    return JsonResponse({
+        'default': DEFAULT_DATASET_ID,
+        'current': get_session_dataset_id(request.session),
+        'datasets': [DEFAULT_DATASET_ID] + list_datasets(),
+        'registry': model_registry.stats(),
+    })
+
+
+# --- Batch Prediction ---
+
+def _answer_value(value):
+    if value is None:
+        return float('nan')
+    if isinstance(value, str):
+        numeric = answer_to_numeric(value)
+        if numeric is None:
+            raise ValueError(f"Unrecognized answer '{value}'.")
+        return float('nan') if is_dont_know(numeric) else numeric
+    return float(value)
+
+
+def _answer_matrix(rows, columns, feature_columns):
+    """
+    float32 matrix in feature_columns order from JSON rows: lists ordered like columns, or
+    {attribute_id: answer} objects. Answers are yes/no/don't know strings, numbers or null.
+    Attributes the model does not use are ignored; ones a row leaves out are "don't know".
+    """
+    position = {attr_id: i for i, attr_id in enumerate(feature_columns)}
+    matrix = np.full((len(rows), len(feature_columns)), np.nan, dtype=np.float32)
+    column_positions = [position.get(attr_id) for attr_id in columns]
+    for r, row in enumerate(rows):
+        if isinstance(row, dict):
+            items = ((position.get(attr_id), value) for attr_id, value in row.items())
+        elif isinstance(row, list) and len(row) == len(columns):
+            items = zip(column_positions, row)
+        else:
+            raise ValueError(f"Row {r} must be an object or a list of {len(columns)} answers.")
+        for c, value in items:
+            if c is not None:
+                matrix[r, c] = _answer_value(value)
+    return matrix
+
+
+PREDICT_TOKEN_HEADER = 'HTTP_X_PREDINATOR_PREDICT_TOKEN'
+
+@csrf_exempt
+@require_POST
+def predict_view(request):
+    """
+    Scores many answer vectors in one vectorized pass, for replaying recorded games or bot traffic.
+
+    POST JSON: {"rows": [...], "columns": [...], "dataset": "<id>", "early_guess": true, "stop_at_unanswered": false}
+    "columns" orders list rows and defaults to the model's feature columns (returned as "feature_columns").
+    The response has one entry per row in each of guess, confidence, leaf, questions, unanswered and stopped.
+    Requests must send the PREDINATOR_PREDICT_TOKEN header; the endpoint is off while no token is set.
+    """
+    token = settings.PREDINATOR_PREDICT_TOKEN
+    header = request.META.get(PREDICT_TOKEN_HEADER)
+    if not (token and header and hmac.compare_digest(header, token)):
+        return JsonResponse({'error': 'A valid X-Predinator-Predict-Token header is required.'}, status=403)
+    try:
+        payload = json.loads(request.body)
+        if not isinstance(payload, dict):
+            raise ValueError("the body must be a JSON object.")
+        rows = payload['rows']
+        if not isinstance(rows, list):
+            raise ValueError("'rows' must be a list.")
+        dataset_id = payload.get('dataset') or DEFAULT_DATASET_ID
+        if not isinstance(dataset_id, str) or not is_valid_dataset_id(dataset_id):
+            raise ValueError("'dataset' must be a dataset id.")
+        columns = payload.get('columns')
+        if columns is not None and not (isinstance(columns, list) and all(isinstance(c, str) for c in columns)):
+            raise ValueError("'columns' must be a list of attribute ids.")
+    except (ValueError, KeyError, TypeError) as e:
+        return JsonResponse({'error': f"Invalid request: {e}"}, status=400)
+    if len(rows) > settings.PREDINATOR_PREDICT_MAX_ROWS:
+        return JsonResponse({'error': f"At most {settings.PREDINATOR_PREDICT_MAX_ROWS} rows per request."}, status=413)
+    if dataset_id != DEFAULT_DATASET_ID and dataset_id not in list_datasets():
+        return JsonResponse({'error': f"Dataset '{dataset_id}' is not available."}, status=404)
+
+    game_engine = get_dataset_game_engine(dataset_id)
+    compiled = game_engine.tree_handler.compiled if game_engine else None
+    if compiled is None:
+        return JsonResponse({'error': 'Akinator model is unavailable.'}, status=503)
+
+    try:
+        answers = _answer_matrix(rows, columns or compiled.feature_columns, compiled.feature_columns)
+    except (ValueError, TypeError) as e:
+        return JsonResponse({'error': f"Invalid request: {e}"}, status=400)
+    result = compiled.predict_batch(
+        answers,
+        early_guess_confidence=EARLY_GUESS_CONFIDENCE if payload.get('early_guess', True) else None,
+        stop_at_unanswered=bool(payload.get('stop_at_unanswered', False)),
+    )
+    return JsonResponse({
+        'model_version': compiled.version,
+        'feature_columns': compiled.feature_columns,
+        'guess': compiled.class_names_for(result['class_index']).tolist(),
+        'confidence': [round(float(c), 4) for c in result['confidence']],
+        'leaf': result['node'].tolist(),
+        'questions': result['questions'].tolist(),
+        'unanswered': result['unanswered'].tolist(),
+        'stopped': result['stopped'].tolist(),
+    })
+
+
+# --- Static Game Tree Export ---
+
+GAME_TREE_IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+GAME_TREE_POINTER_CACHE_CONTROL = 'public, max-age=30'
+
+@require_GET
+def game_tree_current_view(request):
+    """Redirects to the content-addressed artifact of the live model. Kept short-lived so CDNs pick up retrains."""
+    version = read_current_export_version(GAME_TREE_EXPORT_DIR)
+    game_engine = get_global_game_engine()
+    if game_engine and game_engine.tree_handler.model_version and version != game_engine.tree_handler.model_version:
+        # The live model has never been exported (e.g. trained before exports existed).
+        if game_engine.tree_handler.export_game_tree():
+            version = game_engine.tree_handler.model_version
+    if not version:
+        raise Http404("No game tree has been exported yet.")
+
+    response = redirect('game_app:game_tree', version=version)
+    response['Cache-Control'] = GAME_TREE_POINTER_CACHE_CONTROL
+    return response
+
+
+@require_GET
+@etag(lambda request, version: version)
+def game_tree_view(request, version):
+    """Serves an exported game tree. The version is its content hash, so it never changes and can be cached forever."""
+    artifact_path = os.path.join(GAME_TREE_EXPORT_DIR, export_file_name(version))
+    try:
+        with open(artifact_path, 'rb') as f:
+            payload = f.read()
+    except FileNotFoundError:
+        raise Http404(f"Game tree version '{version}' not found.")
+
+    response = HttpResponse(payload, content_type='application/json; charset=utf-8')
+    response['Cache-Control'] = GAME_TREE_IMMUTABLE_CACHE_CONTROL
+    return response
+
+# --- Metrics ---
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+@require_GET
+def metrics_view(request):
+    """Prometheus scrape target: counters and latency histograms summed over every worker on this host."""
+    return HttpResponse(render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
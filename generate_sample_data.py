@@ -6,14 +6,9 @@ DATA_DIR = 'data'
 QUESTIONS_FILE_PATH = os.path.join(DATA_DIR, 'questions.txt')
 CELEBRITIES_FILE_PATH = os.path.join(DATA_DIR, 'celebrities.parquet')
 
-def generate_questions_file():
-    """
-    Generates the questions.txt file which serves as the master list of all
-    possible questions the game can ask.
-    """
-    # The 'DontKnow' option is kept in the text file for the user interface,
-    # but our dataset will not contain 'Don't Know' values for training.
-    questions_content = """attribute_id::question_text::possible_answers
+# The 'DontKnow' option is kept in the text file for the user interface,
+# but our dataset will not contain 'Don't Know' values for training.
+QUESTIONS_CONTENT = """attribute_id::question_text::possible_answers
 is_male::Is your character male?::Yes,No,DontKnow
 is_female::Is your character female?::Yes,No,DontKnow
 is_real_person::Is your character a real person (not fictional)?::Yes,No,DontKnow
@@ -47,9 +42,15 @@ has_superpowers::Does your character have superpowers (if fictional)?::Yes,No,Do
 is_humanoid::Is your character humanoid (if fictional)?::Yes,No,DontKnow
 is_animal::Is your character an animal (or animal-like)?::Yes,No,DontKnow
 """
+
+def generate_questions_file():
+    """
+    Generates the questions.txt file which serves as the master list of all
+    possible questions the game can ask.
+    """
     os.makedirs(DATA_DIR, exist_ok=True)
     with open(QUESTIONS_FILE_PATH, 'w') as f:
-        f.write(questions_content.strip())
+        f.write(QUESTIONS_CONTENT.strip())
     print(f"Generated {QUESTIONS_FILE_PATH}")
 
 def generate_celebrities_parquet():
@@ -281,10 +282,225 @@ def generate_celebrities_parquet():
     print(f"Generated {CELEBRITIES_FILE_PATH} with {len(df)} celebrities.")
     print("Dataset is now complete: every character has a 'Yes' (1.0) or 'No' (0.0) for all questions.")
 
+# --- Synthetic datasets for capacity planning, benchmarks and load tests ---
+# Characters are drawn from category clusters. Each cluster starts from an archetype's
+# answer probabilities for the named questions. Extra "trait" questions beyond those
+# are shared latent factors, so they correlate with each other as real questions do.
+
+# Probability of "Yes" per archetype; named questions not listed use DEFAULT_YES_RATES, else DEFAULT_YES_RATE.
+ARCHETYPES = {
+    'Actor': {'is_real_person': 0.97, 'is_actor': 0.95, 'is_american': 0.5, 'is_european': 0.25, 'is_alive': 0.8,
+              'from_usa_movie': 0.7, 'won_oscar': 0.1, 'starred_in_marvel_movie': 0.15, 'known_for_comedy': 0.3},
+    'Comedian': {'is_real_person': 0.97, 'is_actor': 0.6, 'known_for_comedy': 0.95, 'is_american': 0.7,
+                 'from_tv_show': 0.6, 'is_alive': 0.75},
+    'Singer': {'is_real_person': 0.98, 'is_singer': 0.95, 'is_musician': 0.4, 'won_grammy': 0.3, 'is_american': 0.5,
+               'born_after_1980': 0.45, 'is_alive': 0.85},
+    'Musician': {'is_real_person': 0.98, 'is_musician': 0.95, 'is_singer': 0.3, 'won_grammy': 0.2, 'is_european': 0.35,
+                 'died_before_2000': 0.25, 'has_facial_hair': 0.4},
+    'Athlete': {'is_real_person': 0.99, 'is_athlete': 0.97, 'born_after_1980': 0.6, 'is_alive': 0.95, 'is_male': 0.7, 'is_female': 0.3},
+    'Politician': {'is_real_person': 0.99, 'is_politician': 0.97, 'is_male': 0.75, 'is_female': 0.25, 'wears_glasses': 0.3,
+                   'died_before_2000': 0.35, 'is_american': 0.45},
+    'Scientist': {'is_real_person': 0.99, 'is_scientist': 0.97, 'is_male': 0.75, 'is_female': 0.25, 'wears_glasses': 0.45,
+                  'died_before_2000': 0.55, 'is_european': 0.55, 'has_facial_hair': 0.4},
+    'Writer': {'is_real_person': 0.98, 'is_writer': 0.97, 'died_before_2000': 0.5, 'is_european': 0.5, 'wears_glasses': 0.35},
+    'Superhero': {'is_fictional': 0.98, 'has_superpowers': 0.9, 'is_humanoid': 0.9, 'starred_in_marvel_movie': 0.55,
+                  'starred_in_dc_movie': 0.4, 'from_usa_movie': 0.8, 'is_male': 0.7, 'is_female': 0.3},
+    'Cartoon Animal': {'is_fictional': 0.99, 'is_animal': 0.95, 'from_tv_show': 0.6, 'known_for_comedy': 0.6,
+                       'is_male': 0.6, 'is_female': 0.25},
+    'TV Character': {'is_fictional': 0.95, 'is_humanoid': 0.95, 'from_tv_show': 0.95, 'known_for_comedy': 0.4,
+                     'is_american': 0.6},
+}
+DEFAULT_YES_RATE = 0.1
+DEFAULT_YES_RATES = {'is_male': 0.55, 'is_female': 0.45, 'is_alive': 0.6}
+# At most one of each group is "Yes"; a group whose probabilities sum to 1 always has exactly one.
+EXCLUSIVE_GROUPS = (
+    ('is_male', 'is_female'),
+    ('is_real_person', 'is_fictional'),
+    ('is_american', 'is_european', 'is_asian'),
+    ('has_dark_hair', 'has_blonde_hair', 'has_red_hair'),
+    ('is_humanoid', 'is_animal'),
+)
+# (attribute, required): the attribute is forced to "No" unless the required one is "Yes".
+REQUIRES = (
+    ('has_facial_hair', 'is_male'),
+    ('has_superpowers', 'is_fictional'),
+    ('is_humanoid', 'is_fictional'),
+    ('is_animal', 'is_fictional'),
+)
+# (attribute, excluded): when the attribute is "Yes" the excluded one is "No".
+EXCLUDES = (
+    ('died_before_2000', 'is_alive'),
+    ('died_before_2000', 'born_after_1980'),
+)
+DEFAULT_ZIPF_EXPONENT = 1.1
+TRAITS_PER_FACTOR = 8
+FACTOR_LOADING = 1.5 # How strongly traits sharing a latent factor move together
+
+
+def zipf_cumulative_share(ranks, count, exponent):
+    """
+    Share of all Zipf popularity held by the characters at or above each 0-based rank, from the
+    integral approximation of the generalized harmonic numbers, so no per-row array is needed.
+    """
+    def harmonic(n):
+        if abs(exponent - 1.0) < 1e-9:
+            return np.log((n + 0.5) / 0.5)
+        return ((n + 0.5) ** (1.0 - exponent) - 0.5 ** (1.0 - exponent)) / (1.0 - exponent)
+    return harmonic(np.asarray(ranks, dtype=np.float64) + 1.0) / harmonic(float(count))
+
+
+def zipf_weights(count, exponent):
+    """Normalized Zipf weights for ranks 1..count: rank r is picked with probability proportional to 1 / r**exponent."""
+    weights = 1.0 / np.arange(1, count + 1, dtype=np.float64) ** exponent
+    return weights / weights.sum()
+
+
+def synthetic_questions(question_count):
+    """(attribute_id, question_text) for the first question_count named questions, then numbered traits."""
+    named = [line.split('::')[:2] for line in QUESTIONS_CONTENT.strip().splitlines()[1:]]
+    questions = [tuple(q) for q in named[:question_count]]
+    for i in range(question_count - len(questions)):
+        questions.append((f"trait_{i:04d}", f"Is your character associated with trait {i}?"))
+    return questions
+
+
+class SyntheticDatasetGenerator:
+    """
+    Deterministic (by seed and row group size) generator of character rows, one row group at a time.
+    Row 0 is the most popular character: rows are in Zipfian popularity rank order. A row's
+    share of "don't know" answers follows the popularity share of the rows above it, so with a
+    steep zipf_exponent only the head is well known; the average stays unknown_rate.
+    """
+    def __init__(self, characters, questions, categories=40, unknown_rate=0.05, zipf_exponent=DEFAULT_ZIPF_EXPONENT,
+                 seed=42):
+        self.characters = characters
+        self.questions = synthetic_questions(questions)
+        self.attribute_ids = [attr_id for attr_id, _ in self.questions]
+        self.unknown_rate = unknown_rate
+        self.zipf_exponent = zipf_exponent
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        # Mean of the cumulative share over every rank, estimated on an even grid of ranks.
+        grid = np.linspace(0, characters - 1, min(characters, 100000))
+        self.mean_cumulative_share = float(zipf_cumulative_share(grid, characters, zipf_exponent).mean())
+
+        archetype_names = sorted(ARCHETYPES)
+        self.category_archetype = [archetype_names[k % len(archetype_names)] for k in range(categories)]
+        # Category sizes are Zipfian too, in a seeded order: a few categories hold most characters.
+        self.category_weights = rng.permutation(zipf_weights(categories, 1.0))
+
+        named = set(dict(named_line.split('::')[:2] for named_line in QUESTIONS_CONTENT.strip().splitlines()[1:]))
+        self.trait_columns = np.array([i for i, attr_id in enumerate(self.attribute_ids) if attr_id not in named], dtype=np.int64)
+        probabilities = np.empty((categories, len(self.attribute_ids)), dtype=np.float64)
+        for k, archetype in enumerate(self.category_archetype):
+            for i, attr_id in enumerate(self.attribute_ids):
+                if attr_id in named:
+                    # Categories of one archetype differ a little from each other.
+                    base = ARCHETYPES[archetype].get(attr_id, DEFAULT_YES_RATES.get(attr_id, DEFAULT_YES_RATE))
+                    probabilities[k, i] = np.clip(base + rng.normal(0.0, 0.05), 0.005, 0.995)
+            probabilities[k, self.trait_columns] = rng.beta(0.5, 0.5, size=len(self.trait_columns)).clip(0.01, 0.99)
+        self.logits = np.log(probabilities / (1.0 - probabilities))
+        self.trait_factor = np.arange(len(self.trait_columns)) // TRAITS_PER_FACTOR
+        self.factor_count = int(self.trait_factor.max()) + 1 if len(self.trait_columns) else 0
+
+        column = {attr_id: i for i, attr_id in enumerate(self.attribute_ids)}
+        self.exclusive_groups = [[column[a] for a in group if a in column] for group in EXCLUSIVE_GROUPS]
+        self.exclusive_groups = [group for group in self.exclusive_groups if len(group) > 1]
+        self.requires = [(column[a], column[b]) for a, b in REQUIRES if a in column and b in column]
+        self.excludes = [(column[a], column[b]) for a, b in EXCLUDES if a in column and b in column]
+
+    def row_groups(self, row_group_size):
+        """Yields (names, values) per row group; values is a float64 (rows, questions) array with NaN for unknown."""
+        for group_index, start in enumerate(range(0, self.characters, row_group_size)):
+            rng = np.random.default_rng([self.seed, group_index])
+            rows = np.arange(start, min(start + row_group_size, self.characters))
+            categories = rng.choice(len(self.category_weights), size=len(rows), p=self.category_weights)
+            names = [f"{self.category_archetype[k]} {row:07d}" for k, row in zip(categories, rows)]
+            yield names, self._values(rows, categories, rng)
+
+    def _values(self, rows, categories, rng):
+        logits = self.logits[categories]
+        if self.factor_count:
+            factors = rng.standard_normal((len(rows), self.factor_count))
+            logits[:, self.trait_columns] += FACTOR_LOADING * factors[:, self.trait_factor]
+        probabilities = 1.0 / (1.0 + np.exp(-logits))
+        values = (rng.random(probabilities.shape) < probabilities).astype(np.float64)
+
+        for group in self.exclusive_groups:
+            # One categorical draw per row: member j with its probability (scaled down if they sum past 1), else none.
+            group_probabilities = probabilities[:, group]
+            total = group_probabilities.sum(axis=1, keepdims=True)
+            group_probabilities = group_probabilities / np.maximum(total, 1.0)
+            chosen = (rng.random((len(rows), 1)) < np.cumsum(group_probabilities, axis=1)).argmax(axis=1)
+            chosen[rng.random(len(rows)) >= group_probabilities.sum(axis=1)] = -1
+            values[:, group] = (chosen[:, None] == np.arange(len(group))).astype(np.float64)
+        for attribute, required in self.requires:
+            values[values[:, required] == 0.0, attribute] = 0.0
+        for attribute, excluded in self.excludes:
+            values[values[:, attribute] == 1.0, excluded] = 0.0
+
+        # Obscurity is the popularity share of the characters ranked above: near 0 for the head, near 1
+        # in the tail. An exponent of 0 gives a linear rise to twice the average.
+        obscurity = zipf_cumulative_share(rows, self.characters, self.zipf_exponent)
+        row_unknown_rate = np.minimum(self.unknown_rate * obscurity / self.mean_cumulative_share, 1.0)
+        values[rng.random(values.shape) < row_unknown_rate[:, None]] = np.nan
+        return values
+
+    def write(self, celebrities_file, questions_file, row_group_size=65536):
+        """Streams the dataset to parquet one row group at a time, so memory stays bounded by row_group_size."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        os.makedirs(os.path.dirname(celebrities_file) or '.', exist_ok=True)
+        with open(questions_file, 'w', encoding='utf-8') as f:
+            f.write("attribute_id::question_text::possible_answers\n")
+            for attr_id, text in self.questions:
+                f.write(f"{attr_id}::{text}::Yes,No,DontKnow\n")
+
+        schema = pa.schema([('CelebrityName', pa.string())] + [(attr_id, pa.float64()) for attr_id in self.attribute_ids])
+        schema = schema.with_metadata({'predinator.synthetic.seed': str(self.seed),
+                                       'predinator.synthetic.zipf_exponent': str(self.zipf_exponent)})
+        with pq.ParquetWriter(celebrities_file, schema) as writer:
+            for names, values in self.row_groups(row_group_size):
+                columns = [pa.array(names, pa.string())] + [pa.array(values[:, i]) for i in range(values.shape[1])]
+                writer.write_table(pa.Table.from_arrays(columns, schema=schema), row_group_size=row_group_size)
+
+
+def generate_synthetic_dataset(characters, questions, output_dir=DATA_DIR, row_group_size=65536, **options):
+    """Writes a synthetic questions.txt and celebrities.parquet to output_dir. Returns their paths."""
+    generator = SyntheticDatasetGenerator(characters, questions, **options)
+    celebrities_file = os.path.join(output_dir, 'celebrities.parquet')
+    questions_file = os.path.join(output_dir, 'questions.txt')
+    generator.write(celebrities_file, questions_file, row_group_size)
+    return celebrities_file, questions_file
+
 if __name__ == "__main__":
-    generate_questions_file()
-    generate_celebrities_parquet()
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description="Generate the sample dataset, or a synthetic one of any size.")
+    parser.add_argument('--characters', type=int,
+                        help="Generate this many synthetic characters instead of the hand-written sample.")
+    parser.add_argument('--questions', type=int, default=32,
+                        help="Synthetic question count: the named questions first, then numbered traits (default 32).")
+    parser.add_argument('--categories', type=int, default=40, help="Synthetic category clusters (default 40).")
+    parser.add_argument('--unknown-rate', type=float, default=0.05, help="Average share of unknown answers (default 0.05).")
+    parser.add_argument('--zipf-exponent', type=float, default=DEFAULT_ZIPF_EXPONENT,
+                        help="Popularity skew of the rows; steeper leaves more of them poorly known (default 1.1).")
+    parser.add_argument('--row-group-size', type=int, default=65536, help="Rows generated and written at a time.")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output-dir', default=DATA_DIR, help="Where to write questions.txt and celebrities.parquet.")
+    args = parser.parse_args()
+
+    if args.characters:
+        started = time.perf_counter()
+        celebrities_file, _ = generate_synthetic_dataset(
+            args.characters, args.questions, args.output_dir, args.row_group_size,
+            categories=args.categories, unknown_rate=args.unknown_rate,
+            zipf_exponent=args.zipf_exponent, seed=args.seed)
+        print(f"Generated {celebrities_file} with {args.characters} synthetic characters "
+              f"and {args.questions} questions in {time.perf_counter() - started:.1f}s.")
+    else:
+        generate_questions_file()
+        generate_celebrities_parquet()
     print("\n--------------------------------------------------")
     print("Sample data generation complete.")
     print("Next Step: Run 'python train_model.py' to build the decision tree model from this new data.")
-    print("--------------------------------------------------")
\ No newline at end of file
@@ -1,8 +1,21 @@
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from predinator_core.compiled_model import TOP_CANDIDATES
 from predinator_core.game_engine import GameEngine
 from predinator_core.learning_module import LearningModule
 from predinator_core.data_manager import load_celebrity_data # For checking if celeb exists
 import pandas as pd
-from predinator_core.utils import CELEBRITIES_FILE, QUESTIONS_FILE              
+from predinator_core.logging_setup import configure_logging
+from predinator_core.utils import CELEBRITIES_FILE, QUESTIONS_FILE, MODEL_DIR, TREE_MODE, TRAVERSAL_MODE, answer_to_numeric
 
 
 def play_game():
@@ -44,6 +57,12 @@ def play_game():
         # --- After guess or if game ended prematurely ---
         if guessed_celebrity:
             correct_ans = input("Was my guess correct? (yes/no): ").strip().lower()
+            # Before learning, try the runner-up candidates the tree ranked for this node.
+            for next_guess, confidence in engine.guess_candidates[1:]:
+                if correct_ans.startswith('y'):
+                    break
+                guessed_celebrity = next_guess
+                correct_ans = input(f"Is it {next_guess} then? ({confidence:.0%}) (yes/no): ").strip().lower()
             if correct_ans.startswith('y'):
                 print("Awesome! I win! 🎉")
             else:
@@ -100,7 +119,247 @@ def handle_incorrect_guess(learner: LearningModule, guessed_celebrity: str, game
             print(f"Okay, I'll just try to learn about '{actual_celebrity_name}' using the current set of questions.")
             learner.learn_new_celebrity(actual_celebrity_name, game_path)
 
+# --- Batch mode: scripted players, no prompts ---
+MAX_QUESTIONS_PER_GAME = 200 # Guards against a model whose traversal never reaches a leaf
+
+def scripted_answer(value):
+    """Answer string for a scripted value: an answer string as typed, or a stored number (1.0, 0.0, null/NaN)."""
+    if isinstance(value, str):
+        return value
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "dont know"
+    return 'yes' if value > 0.5 else 'no'
+
+
+def celebrities_file_for_model_dir(model_dir):
+    """The dataset a model was trained on: celebrities.parquet next to its model directory."""
+    if os.path.normpath(model_dir) == os.path.normpath(MODEL_DIR):
+        return CELEBRITIES_FILE
+    return os.path.join(os.path.dirname(os.path.normpath(model_dir)), 'celebrities.parquet')
+
+
+def character_answer_table(celebrities_file=CELEBRITIES_FILE):
+    """
+    ({name: row index}, attribute ids, answer string matrix) for a dataset, encoded in one
+    vectorized pass the way scripted_answer() reads stored numbers.
+    """
+    df_celebs = load_celebrity_data(celebrities_file)
+    if df_celebs.empty:
+        return {}, [], np.empty((0, 0), dtype=object)
+    attribute_cols = [col for col in df_celebs.columns if col != 'CelebrityName']
+    values = df_celebs[attribute_cols].to_numpy(dtype=float)
+    answers = np.where(np.isnan(values), 'dont know', np.where(values > 0.5, 'yes', 'no'))
+    rows = {name: i for i, name in enumerate(df_celebs['CelebrityName'])}
+    return rows, attribute_cols, answers
+
+
+def load_batch_games(batch_file, all_characters=False, celebrities_file=CELEBRITIES_FILE):
+    """
+    Reads scripted games, one JSON value per line:
+        "Tom Hanks" or {"character": "Tom Hanks"}            answers as that dataset character would
+        {"answers": {"is_male": "yes", "is_actor": 1.0}}       answer vector by attribute_id (missing: don't know)
+        {"path": [{"attribute_id": "is_male", "answer": 1.0}]} a captured game path (the session's path_taken)
+    Objects may also carry "id" and "expected" (the character the player had in mind).
+    Characters are looked up in celebrities_file, which is only read if a game needs it.
+    Returns [{'id', 'expected', 'answers'}, ...] with answers as {attribute_id: answer string}.
+    """
+    table = None
+
+    def character_table():
+        nonlocal table
+        if table is None:
+            table = character_answer_table(celebrities_file)
+        return table
+
+    def character_answers(name):
+        rows, attribute_cols, answers = character_table()
+        row = rows.get(name)
+        if row is None:
+            raise ValueError(f"Unknown character '{name}'.")
+        return dict(zip(attribute_cols, answers[row].tolist()))
+
+    games = []
+    if all_characters:
+        games.extend({'id': name, 'expected': name, 'answers': character_answers(name)} for name in character_table()[0])
+    if batch_file:
+        with open(batch_file, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                if isinstance(entry, str):
+                    entry = {'character': entry}
+                game = {'id': entry.get('id', line_number), 'expected': entry.get('expected', entry.get('character'))}
+                if 'character' in entry:
+                    game['answers'] = character_answers(entry['character'])
+                elif 'answers' in entry:
+                    game['answers'] = {attr_id: scripted_answer(v) for attr_id, v in entry['answers'].items()}
+                elif 'path' in entry:
+                    game['answers'] = {step['attribute_id']: scripted_answer(step['answer']) for step in entry['path']}
+                else:
+                    raise ValueError(f"Line {line_number}: expected a character, answers or path.")
+                games.append(game)
+    return games
+
+
+_batch_engine = None
+
+def _init_batch_engine(model_dir, tree_mode, traversal=TRAVERSAL_MODE):
+    global _batch_engine
+    from predinator_core.tree_builder import create_tree_handler
+    tree_handler = create_tree_handler(model_dir=model_dir, tree_mode=tree_mode)
+    if not tree_handler.load_model_and_metadata():
+        raise RuntimeError(f"No model could be loaded from {model_dir}.")
+    _batch_engine = GameEngine(tree_handler=tree_handler, traversal=traversal)
+
+
+def _play_until_guess(engine, answers):
+    for _ in range(MAX_QUESTIONS_PER_GAME):
+        question_obj, is_leaf = engine.get_next_question()
+        if is_leaf or question_obj is None:
+            break
+        engine.process_answer(answers.get(question_obj.attribute_id, "dont know"))
+    return engine.make_guess()
+
+
+def play_scripted_games(games):
+    """
+    Plays games on this process's batch engine. Returns one result dict per game.
+    With beam traversal a wrong guess is rejected and the game resumes, as the web flow does,
+    for up to TOP_CANDIDATES guesses; 'in_candidates' then means one of them was right.
+    """
+    engine = _batch_engine
+    results = []
+    for game in games:
+        started = time.perf_counter()
+        engine.start_new_game()
+        answers = game['answers']
+        expected = game['expected']
+        guess = _play_until_guess(engine, answers)
+        confidence = engine.guess_candidates[0][1] if engine.guess_candidates else None
+        candidates = [name for name, _ in engine.guess_candidates]
+        if engine.traversal == 'beam':
+            candidates = [guess]
+            while expected and candidates[-1] and candidates[-1] != expected and len(candidates) < TOP_CANDIDATES:
+                engine.rejected_guesses.append(candidates[-1])
+                if not engine.resume_after_rejection():
+                    break
+                candidates.append(_play_until_guess(engine, answers))
+        results.append({
+            'id': game['id'],
+            'expected': expected,
+            'guess': guess,
+            'confidence': confidence,
+            'correct': guess == expected if expected else None,
+            'in_candidates': expected in candidates if expected else None,
+            'guesses': len(candidates) if engine.traversal == 'beam' else None,
+            'questions': len(engine.path_taken),
+            'seconds': time.perf_counter() - started,
+        })
+    return results
+
+
+def predict_scripted_games(games):
+    """Same results as play_scripted_games (but 'seconds' is None), from one vectorized predict_batch pass."""
+    tree_handler = _batch_engine.tree_handler
+    answers = pd.DataFrame.from_records(
+        [{attr_id: answer_to_numeric(answer) for attr_id, answer in game['answers'].items()} for game in games],
+        columns=tree_handler.feature_columns).astype(float)
+    predictions = tree_handler.predict_batch(answers, early_guess_confidence=_batch_engine.early_guess_confidence)
+    results = []
+    for game, guess, confidence, questions in zip(games, predictions['guess'], predictions['confidence'],
+                                                   predictions['questions']):
+        expected = game['expected']
+        results.append({
+            'id': game['id'],
+            'expected': expected,
+            'guess': guess,
+            'confidence': float(confidence) if guess is not None else None,
+            'correct': guess == expected if expected else None,
+            'in_candidates': None,
+            'guesses': None,
+            'questions': int(questions),
+            'seconds': None,
+        })
+    return results
+
+
+def run_batch(games, model_dir=MODEL_DIR, tree_mode=TREE_MODE, workers=1, vectorized=False, traversal=TRAVERSAL_MODE):
+    """
+    Plays every game, across a process pool when workers > 1. Returns (results in input order, wall seconds).
+    The wall time includes loading the model (once per worker), as a replay run would see it.
+    """
+    started = time.perf_counter()
+    if vectorized:
+        _init_batch_engine(model_dir, tree_mode)
+        results = predict_scripted_games(games)
+    elif workers <= 1:
+        _init_batch_engine(model_dir, tree_mode, traversal)
+        results = play_scripted_games(games)
+    else:
+        chunk_size = max(1, math.ceil(len(games) / (workers * 4))) # A few chunks per worker evens out slow games
+        chunks = [games[i:i + chunk_size] for i in range(0, len(games), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_engine,
+                                 initargs=(model_dir, tree_mode, traversal)) as executor:
+            results = [result for chunk_results in executor.map(play_scripted_games, chunks) for result in chunk_results]
+    return results, time.perf_counter() - started
+
+
+def summarize_batch(results, seconds, workers):
+    questions = sorted(r['questions'] for r in results)
+    scored = [r for r in results if r['correct'] is not None]
+    summary = {
+        'games': len(results),
+        'workers': workers,
+        'seconds': round(seconds, 3),
+        'games_per_second': round(len(results) / seconds, 1) if seconds else None,
+        'no_guess': sum(1 for r in results if r['guess'] is None),
+    }
+    if questions:
+        summary['questions_per_game'] = {
+            'mean': round(statistics.fmean(questions), 2),
+            'median': statistics.median(questions),
+            'p95': questions[min(len(questions) - 1, int(len(questions) * 0.95))],
+            'max': questions[-1],
+        }
+    if scored:
+        summary['accuracy'] = round(sum(1 for r in scored if r['correct']) / len(scored), 4)
+        if scored[0]['in_candidates'] is not None:
+            summary['candidate_accuracy'] = round(sum(1 for r in scored if r['in_candidates']) / len(scored), 4)
+    return summary
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play Predinator in the terminal, or replay scripted games in batch.")
+    parser.add_argument('--batch', metavar='JSONL', help="Replay the scripted games in this file without prompts.")
+    parser.add_argument('--all-characters', action='store_true',
+                        help="Batch mode: also play one game as every character in the dataset.")
+    parser.add_argument('--workers', type=int, default=1, help="Batch mode: worker processes (default 1).")
+    parser.add_argument('--vectorized', action='store_true',
+                        help="Batch mode: score every game in one AkinatorTree.predict_batch pass instead of playing them.")
+    parser.add_argument('--model-dir', default=MODEL_DIR, help="Batch mode: model to replay against.")
+    parser.add_argument('--tree-mode', default=TREE_MODE, choices=('flat', 'hierarchical'))
+    parser.add_argument('--traversal', default=TRAVERSAL_MODE, choices=('path', 'beam'),
+                        help="Batch mode: 'beam' replays rejected guesses the way the web game resumes after them.")
+    parser.add_argument('--output', help="Batch mode: write per-game results as JSONL here (default stdout).")
+    args = parser.parse_args()
+    if args.vectorized and args.traversal == 'beam':
+        parser.error("--vectorized only scores path traversal.")
+    configure_logging()
+
+    if args.batch or args.all_characters:
+        games = load_batch_games(args.batch, args.all_characters, celebrities_file_for_model_dir(args.model_dir))
+        results, seconds = run_batch(games, args.model_dir, args.tree_mode, args.workers, args.vectorized, args.traversal)
+        lines = ''.join(json.dumps(result) + '\n' for result in results)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(lines)
+        else:
+            sys.stdout.write(lines)
+        print(json.dumps(summarize_batch(results, seconds, args.workers), indent=2), file=sys.stderr)
+        sys.exit(0)
+
     print("Welcome to CLI Akinator - Advanced Edition!")
     print("=" * 40)
     print("Initializing...")
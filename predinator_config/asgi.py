@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'predinator_config.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up: the game channel needs the app registry and settings.
+from game_app.game_channel import websocket_application
+
+
+async def application(scope, receive, send):
+    # WebSocket game channels bypass Django's HTTP stack; everything else goes to Django.
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -42,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'game_app.middleware.RequestTimingMiddleware',
+    'game_app.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -49,13 +51,14 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'game_app.middleware.ModelReloadMiddleware',
 ]
 
 ROOT_URLCONF = 'predinator_config.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'game_app.instrumentation.TimedDjangoTemplates', # DjangoTemplates with render timing
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -71,6 +74,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'predinator_config.wsgi.application'
 
+# Database-backed sessions with load/save timing (see game_app/instrumentation.py).
+SESSION_ENGINE = 'game_app.instrumentation'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
@@ -124,6 +130,45 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Predinator: serve the gameplay and learning views with their async versions (ASGI deployments only).
+PREDINATOR_ASYNC_VIEWS = os.environ.get('PREDINATOR_ASYNC_VIEWS', 'False') == 'True'
+
+# Predinator: 'private' loads the joblib model into every worker; 'shared' attaches every worker
+# read-only to one memory-mapped copy published under data/model/shared.
+PREDINATOR_MODEL_HOSTING = os.environ.get('PREDINATOR_MODEL_HOSTING', 'private')
+
+# Predinator: how often (seconds) each worker checks for a newly published model. 0 disables hot reload.
+PREDINATOR_MODEL_WATCH_INTERVAL = float(os.environ.get('PREDINATOR_MODEL_WATCH_INTERVAL', '0.5'))
+
+# Predinator: pre-rendered question fragments (LRU size, and tree depth rendered eagerly on model publish).
+PREDINATOR_FRAGMENT_CACHE_SIZE = int(os.environ.get('PREDINATOR_FRAGMENT_CACHE_SIZE', '4096'))
+PREDINATOR_FRAGMENT_WARM_DEPTH = int(os.environ.get('PREDINATOR_FRAGMENT_WARM_DEPTH', '6'))
+
+# Predinator: themed datasets under data/datasets/ are loaded on first use and evicted LRU once
+# the resident models exceed this budget (MB, per worker). The default dataset is always resident.
+PREDINATOR_MODEL_REGISTRY_MEMORY_MB = float(os.environ.get('PREDINATOR_MODEL_REGISTRY_MEMORY_MB', '256'))
+
+# Predinator: keep each worker's metrics in a file under PREDINATOR_METRICS_DIR so /metrics sums
+# every worker on the host. When False, /metrics only reports the worker that answers the scrape.
+PREDINATOR_METRICS_SHARED = os.environ.get('PREDINATOR_METRICS_SHARED', 'True') == 'True'
+
+# Predinator: profile this fraction of requests with the sampling profiler, plus any request sending
+# the header X-Predinator-Profile: <PREDINATOR_PROFILE_TOKEN>. Profiling is off while both are unset.
+PREDINATOR_PROFILE_SAMPLE_RATE = float(os.environ.get('PREDINATOR_PROFILE_SAMPLE_RATE', '0'))
+PREDINATOR_PROFILE_TOKEN = os.environ.get('PREDINATOR_PROFILE_TOKEN', '')
+PREDINATOR_PROFILE_INTERVAL_MS = float(os.environ.get('PREDINATOR_PROFILE_INTERVAL_MS', '5'))
+
+# Predinator: record one analytics event per game (see predinator_core.game_events), written in
+# batches under PREDINATOR_EVENTS_DIR as PREDINATOR_EVENTS_FORMAT ('jsonl' or 'parquet') segments.
+PREDINATOR_GAME_EVENTS = os.environ.get('PREDINATOR_GAME_EVENTS', 'True') == 'True'
+
+# Predinator: /akinator/predict/ only answers requests sending the header
+# X-Predinator-Predict-Token: <PREDINATOR_PREDICT_TOKEN>; it is off while the token is unset.
+# PREDICT_MAX_ROWS caps the answer vectors one POST may score. Bodies are also bounded by
+# DATA_UPLOAD_MAX_MEMORY_SIZE.
+PREDINATOR_PREDICT_TOKEN = os.environ.get('PREDINATOR_PREDICT_TOKEN', '')
+PREDINATOR_PREDICT_MAX_ROWS = int(os.environ.get('PREDINATOR_PREDICT_MAX_ROWS', '100000'))
+
 # predinator/predinator_config/settings.py
 # from pathlib import Path
 # import os
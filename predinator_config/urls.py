@@ -1,9 +1,11 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.shortcuts import redirect
+from game_app.views import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('akinator/', include('game_app.urls')),
+    path('metrics', metrics_view, name='metrics'),
     path('', lambda request: redirect('akinator/play/', permanent=False)),
 ]
\ No newline at end of file
@@ -0,0 +1,473 @@
+# PREDINATOR/predinator_core/compiled_model.py
+import hashlib
+import heapq
+import json
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+LEAF_FEATURE = -2 # Same marker scikit-learn uses for leaf nodes in tree_.feature
+EXPORT_FORMAT_VERSION = 2 # 2 added the ranked per-node candidates
+EXPORT_FILE_PREFIX = 'game_tree.'
+EXPORT_FILE_SUFFIX = '.json'
+EXPORT_CURRENT_POINTER = 'game_tree.current'
+EXPORT_KEEP_VERSIONS = 5 # Older artifacts are kept so clients mid-game can finish on them
+NODE_ARRAYS = ('feature', 'threshold', 'children_left', 'children_right', 'node_class')
+CANDIDATE_ARRAYS = ('candidates', 'candidate_confidence')
+TOP_CANDIDATES = 3 # Ranked guesses kept per node: the best one plus follow-ups if the player says no
+# Beam ties between the two children of a "don't know" are broken towards the right one, the child a
+# path traversal takes, by docking the left one this much; far below any mismatch penalty.
+DONT_KNOW_LEFT_PENALTY = 1e-6
+SHARED_META_FILE = 'meta.json'
+SHARED_NAMES_BLOB = 'names_blob.npy'
+SHARED_NAMES_OFFSETS = 'names_offsets.npy'
+
+
+class PackedStrings:
+    """
+    Read-only sequence of strings stored as one UTF-8 blob plus offsets.
+    Backed by memory-mapped arrays, it lets every worker share a single copy of the names.
+    """
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings):
+        encoded = [s.encode('utf-8') for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return cls(blob, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.blob[start:end].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class CompiledModel:
+    """
+    A flat, array-based snapshot of a trained AkinatorTree.
+
+    It holds everything needed to play a game (node arrays, question texts and
+    leaf names) and nothing else, so it can be exported, hashed and walked
+    without scikit-learn.
+
+    candidates / candidate_confidence (n_nodes x k, see rank_node_candidates) rank the
+    guesses worth making at each node. Models published before they existed get a
+    single column holding node_class at full confidence.
+    """
+    def __init__(self, feature, threshold, children_left, children_right, node_class,
+                 class_names, feature_columns, questions, candidates=None, candidate_confidence=None):
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float32)
+        self.children_left = np.asarray(children_left, dtype=np.int32)
+        self.children_right = np.asarray(children_right, dtype=np.int32)
+        self.node_class = np.asarray(node_class, dtype=np.int32)
+        if candidates is None:
+            candidates = self.node_class[:, None]
+            candidate_confidence = np.ones(candidates.shape, dtype=np.float32)
+        self.candidates = np.asarray(candidates, dtype=np.int32)
+        self.candidate_confidence = np.asarray(candidate_confidence, dtype=np.float32)
+        self.class_names = class_names if isinstance(class_names, PackedStrings) else list(class_names)
+        self.feature_columns = list(feature_columns)
+        # One {'text', 'possible_answers'} dict per entry of feature_columns.
+        self.questions = list(questions)
+        self._export_bytes = None
+        self._version = None
+        self._feature_index = None
+        self._class_index = None
+        self._beam_stops_cache = None
+
+    @classmethod
+    def from_tree_handler(cls, tree_handler):
+        tree = tree_handler.model.tree_
+        leaf_classes, leaf_counts = top_classes_from_tree(tree)
+        candidates, candidate_confidence = rank_node_candidates(
+            tree.children_left, tree.children_right, tree.weighted_n_node_samples, leaf_classes, leaf_counts)
+        return cls(
+            feature=tree.feature,
+            threshold=tree.threshold,
+            children_left=tree.children_left,
+            children_right=tree.children_right,
+            node_class=np.argmax(tree.value[:, 0, :], axis=1),
+            class_names=[str(name) for name in tree_handler.label_encoder.classes_],
+            feature_columns=tree_handler.feature_columns,
+            questions=cls.questions_from_tree_handler(tree_handler),
+            candidates=candidates,
+            candidate_confidence=candidate_confidence,
+        )
+
+    @staticmethod
+    def questions_from_tree_handler(tree_handler):
+        questions = []
+        for attr_id in tree_handler.feature_columns:
+            q_obj = tree_handler.get_question_by_attribute_id(attr_id)
+            questions.append({
+                'text': q_obj.text if q_obj else attr_id,
+                'possible_answers': list(q_obj.possible_answers) if q_obj else ['yes', 'no', 'dontknow'],
+            })
+        return questions
+
+    @property
+    def node_count(self):
+        return int(self.feature.shape[0])
+
+    def ranked_candidates(self, node_id):
+        """[(class_index, confidence), ...] for the node, best first."""
+        return [(int(c), float(p)) for c, p in zip(self.candidates[node_id], self.candidate_confidence[node_id]) if c >= 0]
+
+    def predict_batch(self, answers, early_guess_confidence=None, stop_at_unanswered=False):
+        """
+        Plays every row of answers (n_rows x len(feature_columns), NaN for "don't know") in one
+        vectorized pass: each step moves all unfinished rows one level down the tree.
+
+        Rows follow GameEngine: "don't know" goes right, and with early_guess_confidence a row
+        stops at the first node whose top candidate is that confident. With stop_at_unanswered
+        a row instead stops at the first question it has no answer for (stopped=True) and is
+        guessed from that node's candidates.
+
+        Returns a dict of arrays: node (where each row ended), class_index and confidence of
+        the guess (-1 / 0.0 if the node has none), questions (asked on the path, the
+        unanswered one included), unanswered (how many of them had no answer) and stopped.
+        """
+        answers = np.asarray(answers, dtype=np.float32)
+        if answers.ndim != 2 or answers.shape[1] != len(self.feature_columns):
+            raise ValueError(f"Expected an answer matrix with {len(self.feature_columns)} columns, got shape {answers.shape}.")
+        n_rows = answers.shape[0]
+        node = np.zeros(n_rows, dtype=np.int32)
+        questions = np.zeros(n_rows, dtype=np.int32)
+        unanswered = np.zeros(n_rows, dtype=np.int32)
+        stopped = np.zeros(n_rows, dtype=bool)
+
+        active = np.arange(n_rows)
+        while active.size:
+            current = node[active]
+            feature = self.feature[current]
+            playing = feature != LEAF_FEATURE
+            if early_guess_confidence is not None:
+                playing &= ~((self.candidates[current, 0] >= 0)
+                             & (self.candidate_confidence[current, 0] >= early_guess_confidence))
+            active, current, feature = active[playing], current[playing], feature[playing]
+            values = answers[active, feature]
+            missing = np.isnan(values)
+            questions[active] += 1
+            unanswered[active[missing]] += 1
+            if stop_at_unanswered and missing.any():
+                stopped[active[missing]] = True
+                answered = ~missing
+                active, current, values = active[answered], current[answered], values[answered]
+            # NaN compares False, so "don't know" takes the right child.
+            node[active] = np.where(values <= self.threshold[current],
+                                    self.children_left[current], self.children_right[current])
+
+        class_index = self.candidates[node, 0]
+        confidence = np.where(class_index >= 0, self.candidate_confidence[node, 0], 0.0).astype(np.float32)
+        return {'node': node, 'class_index': class_index, 'confidence': confidence,
+                'questions': questions, 'unanswered': unanswered, 'stopped': stopped}
+
+    def beam_search(self, answers, answered, width, mismatch_penalty, early_guess_confidence=None, rejected_classes=()):
+        """
+        Every branch the answers so far could lead to, not only the one predict_batch follows:
+        each answered question splits a node into both children, the one the answer points
+        away from docked mismatch_penalty (log-odds that an answer is right). A "don't know"
+        docks neither. Expansion stops at leaves, early-guess nodes (as in GameEngine) and
+        questions not answered yet, and after every level only the best width entries are kept.
+
+        answers holds one value per feature_columns entry (NaN for "don't know"), answered marks
+        the questions asked. Entries lose the share of their candidates in rejected_classes
+        (guesses the player said no to); those left with none are dropped.
+
+        Returns (nodes, scores), best first. Scores are log-weights before the rejection share.
+        """
+        stops = self._beam_stops(early_guess_confidence)
+        nodes = np.zeros(1, dtype=np.int32)
+        scores = np.zeros(1, dtype=np.float64)
+        rejected = np.asarray(rejected_classes, dtype=np.int32)
+        while True:
+            feature = self.feature[nodes]
+            expand = ~stops[nodes]
+            expand[expand] = answered[feature[expand]]
+            if not expand.any():
+                break
+            parents, parent_scores = nodes[expand], scores[expand]
+            values = answers[feature[expand]]
+            known = ~np.isnan(values)
+            goes_left = values <= self.threshold[parents]
+            left_scores = parent_scores - np.where(known, mismatch_penalty * ~goes_left, DONT_KNOW_LEFT_PENALTY)
+            right_scores = parent_scores - mismatch_penalty * (known & goes_left)
+            nodes = np.concatenate([nodes[~expand], self.children_right[parents], self.children_left[parents]])
+            scores = np.concatenate([scores[~expand], right_scores, left_scores])
+            if nodes.size > width:
+                nodes, scores = self._prune_beam(nodes, scores, rejected, width)
+        return self._prune_beam(nodes, scores, rejected, width)
+
+    def _beam_stops(self, early_guess_confidence):
+        # Nodes a game guesses at instead of asking: leaves, and early-guess nodes (see GameEngine).
+        if self._beam_stops_cache is None or self._beam_stops_cache[0] != early_guess_confidence:
+            stops = self.feature == LEAF_FEATURE
+            if early_guess_confidence is not None:
+                stops |= (self.candidates[:, 0] >= 0) & (self.candidate_confidence[:, 0] >= early_guess_confidence)
+            self._beam_stops_cache = (early_guess_confidence, stops)
+        return self._beam_stops_cache[1]
+
+    def _prune_beam(self, nodes, scores, rejected, width):
+        ranked = scores
+        if rejected.size:
+            remaining = 1.0 - np.where(np.isin(self.candidates[nodes], rejected), self.candidate_confidence[nodes], 0.0).sum(axis=1)
+            with np.errstate(divide='ignore'):
+                ranked = scores + np.log(np.clip(remaining, 0.0, 1.0))
+            ranked[remaining <= 1e-6] = -np.inf
+        order = np.argsort(-ranked, kind='stable')[:width]
+        order = order[np.isfinite(ranked[order])]
+        return nodes[order], scores[order]
+
+    def beam_candidates(self, nodes, scores, rejected_classes=(), k=TOP_CANDIDATES):
+        """
+        [(class_index, confidence), ...] best first, pooling the candidates of every beam entry
+        (see beam_search) by its weight. Rejected classes are left out and the rest renormalized.
+        """
+        if not len(nodes):
+            return []
+        weights = np.exp(scores - scores.max())
+        candidates = self.candidates[nodes]
+        mass = self.candidate_confidence[nodes] * weights[:, None]
+        keep = (candidates >= 0) & ~np.isin(candidates, np.asarray(rejected_classes, dtype=np.int32))
+        if not keep.any():
+            return []
+        classes, inverse = np.unique(candidates[keep], return_inverse=True)
+        pooled = np.bincount(inverse, weights=mass[keep])
+        pooled /= mass[keep].sum()
+        best = np.argsort(-pooled, kind='stable')[:k]
+        return [(int(classes[i]), float(pooled[i])) for i in best]
+
+    def feature_index(self, attribute_id):
+        """Position of attribute_id in feature_columns, or None if this model does not ask it."""
+        if self._feature_index is None:
+            self._feature_index = {attr_id: i for i, attr_id in enumerate(self.feature_columns)}
+        return self._feature_index.get(attribute_id)
+
+    def class_indices(self, names):
+        """Class indices of the names this model knows, in order; others are skipped."""
+        if self._class_index is None:
+            self._class_index = {name: i for i, name in enumerate(self.class_names)}
+        return [self._class_index[name] for name in names if name in self._class_index]
+
+    def class_names_for(self, class_indices):
+        """Object array of names for class indices (None for -1), decoding each distinct class once."""
+        unique, inverse = np.unique(class_indices, return_inverse=True)
+        names = np.array([self.class_names[i] if i >= 0 else None for i in unique], dtype=object)
+        return names[inverse]
+
+    def to_export_dict(self):
+        return {
+            'format': EXPORT_FORMAT_VERSION,
+            # "Don't know" answers (null) follow the right child, same as GameEngine.process_answer.
+            'unknown_answer_child': 'right',
+            'questions': [
+                [attr_id, q['text'], q['possible_answers']]
+                for attr_id, q in zip(self.feature_columns, self.questions)
+            ],
+            'names': list(self.class_names),
+            'nodes': {
+                'feature': self.feature.tolist(),
+                'threshold': [round(float(t), 6) for t in self.threshold],
+                'left': self.children_left.tolist(),
+                'right': self.children_right.tolist(),
+                'class': self.node_class.tolist(),
+                # Ranked guesses per node as [[class, confidence], ...], best first.
+                'candidates': [
+                    [[int(c), round(float(p), 4)] for c, p in zip(row, confidence) if c >= 0]
+                    for row, confidence in zip(self.candidates, self.candidate_confidence)
+                ],
+            },
+        }
+
+    def export_bytes(self):
+        if self._export_bytes is None:
+            self._export_bytes = json.dumps(
+                self.to_export_dict(), separators=(',', ':'), ensure_ascii=False, sort_keys=True
+            ).encode('utf-8')
+        return self._export_bytes
+
+    @property
+    def version(self):
+        """Content hash of the exported tree; identical models always share a version."""
+        if self._version is None:
+            self._version = hashlib.sha256(self.export_bytes()).hexdigest()[:16]
+        return self._version
+
+
+def top_classes_from_tree(tree, k=TOP_CANDIDATES, chunk_rows=4096):
+    """
+    (classes, counts), both n_nodes x k: the k most frequent training classes of every
+    leaf of a fitted scikit-learn tree_ and their row counts (-1 / 0 padded; internal
+    nodes are left empty). Leaves are read in chunks, so the dense value array is never copied whole.
+    """
+    n_nodes = tree.node_count
+    classes = np.full((n_nodes, k), -1, dtype=np.int32)
+    counts = np.zeros((n_nodes, k), dtype=np.float64)
+    leaves = np.flatnonzero(tree.children_left < 0)
+    width = min(k, tree.value.shape[2])
+    for start in range(0, len(leaves), chunk_rows):
+        rows = leaves[start:start + chunk_rows]
+        values = tree.value[rows, 0, :]
+        # value holds class fractions in recent scikit-learn and raw counts in older releases; normalise both.
+        values = values / values.sum(axis=1, keepdims=True) * tree.weighted_n_node_samples[rows][:, None]
+        # Stable sort on -count keeps the lowest class index first on ties, matching argmax (node_class).
+        top = np.argsort(-values, axis=1, kind='stable')[:, :width]
+        top_counts = np.take_along_axis(values, top, axis=1)
+        classes[rows, :width] = np.where(top_counts > 0, top, -1)
+        counts[rows, :width] = top_counts
+    return classes, counts
+
+
+def rank_node_candidates(children_left, children_right, node_samples, leaf_classes, leaf_counts, k=TOP_CANDIDATES):
+    """
+    Ranked guesses for every node as (candidates, confidence), both n_nodes x k.
+
+    A node's own candidates are its most frequent training classes, with confidence
+    equal to their share of the node's rows; internal nodes merge their children's top k,
+    so lower ranks are approximate. A node with fewer than k classes of its own (every pure
+    leaf) is topped up from its nearest ancestors at the share the class has there, so the
+    follow-up guesses are the characters the tree separated it from last.
+    Children must have larger ids than their parent, as in scikit-learn trees.
+    """
+    n_nodes = len(children_left)
+    own = [None] * n_nodes
+    parent = np.full(n_nodes, -1, dtype=np.int64)
+    for node in range(n_nodes - 1, -1, -1):
+        left, right = children_left[node], children_right[node]
+        if left < 0:
+            own[node] = {int(c): float(n) for c, n in zip(leaf_classes[node], leaf_counts[node]) if c >= 0 and n > 0}
+            continue
+        parent[left] = parent[right] = node
+        merged = dict(own[left])
+        for class_index, count in own[right].items():
+            merged[class_index] = merged.get(class_index, 0.0) + count
+        own[node] = dict(heapq.nsmallest(k, merged.items(), key=lambda item: (-item[1], item[0])))
+
+    candidates = np.full((n_nodes, k), -1, dtype=np.int32)
+    confidence = np.zeros((n_nodes, k), dtype=np.float32)
+    for node in range(n_nodes):
+        total = float(node_samples[node]) or 1.0
+        ranked = [(c, n / total) for c, n in sorted(own[node].items(), key=lambda item: (-item[1], item[0]))]
+        if len(ranked) < k and parent[node] >= 0:
+            seen = {c for c, _ in ranked}
+            for c, p in zip(candidates[parent[node]], confidence[parent[node]]):
+                if len(ranked) == k:
+                    break
+                if c >= 0 and c not in seen:
+                    ranked.append((int(c), float(p)))
+        for rank, (c, p) in enumerate(ranked[:k]):
+            candidates[node, rank] = c
+            confidence[node, rank] = p
+    return candidates, confidence
+
+
+def save_compiled_model(compiled, target_dir):
+    """
+    Writes the compiled model as raw .npy arrays plus a small meta.json, a layout that
+    load_compiled_model can memory-map so every process shares the same physical pages.
+    """
+    os.makedirs(target_dir, exist_ok=True)
+    for name in NODE_ARRAYS + CANDIDATE_ARRAYS:
+        np.save(os.path.join(target_dir, f"{name}.npy"), getattr(compiled, name))
+    names = compiled.class_names
+    if not isinstance(names, PackedStrings):
+        names = PackedStrings.from_strings(names)
+    np.save(os.path.join(target_dir, SHARED_NAMES_BLOB), names.blob)
+    np.save(os.path.join(target_dir, SHARED_NAMES_OFFSETS), names.offsets)
+    with open(os.path.join(target_dir, SHARED_META_FILE), 'w', encoding='utf-8') as f:
+        json.dump({
+            'format': EXPORT_FORMAT_VERSION,
+            'version': compiled.version,
+            'feature_columns': compiled.feature_columns,
+            'questions': compiled.questions,
+        }, f, ensure_ascii=False)
+
+
+def load_compiled_model(source_dir, mmap=True):
+    """Attaches to a model written by save_compiled_model. Arrays are mapped read-only, not copied."""
+    mmap_mode = 'r' if mmap else None
+    with open(os.path.join(source_dir, SHARED_META_FILE), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    arrays = {name: np.load(os.path.join(source_dir, f"{name}.npy"), mmap_mode=mmap_mode) for name in NODE_ARRAYS}
+    for name in CANDIDATE_ARRAYS:
+        path = os.path.join(source_dir, f"{name}.npy")
+        if os.path.exists(path): # Absent in versions published before candidates were ranked
+            arrays[name] = np.load(path, mmap_mode=mmap_mode)
+    names = PackedStrings(
+        np.load(os.path.join(source_dir, SHARED_NAMES_BLOB), mmap_mode=mmap_mode),
+        np.load(os.path.join(source_dir, SHARED_NAMES_OFFSETS), mmap_mode=mmap_mode),
+    )
+    compiled = CompiledModel(class_names=names, feature_columns=meta['feature_columns'],
+                             questions=meta['questions'], **arrays)
+    compiled._version = meta['version'] # Already content-hashed when it was published
+    return compiled
+
+
+def export_file_name(version):
+    return f"{EXPORT_FILE_PREFIX}{version}{EXPORT_FILE_SUFFIX}"
+
+
+def export_game_tree(compiled, export_dir):
+    """
+    Writes the compiled tree as a content-addressed JSON artifact and points
+    'game_tree.current' at it. Returns the artifact path, or None on failure.
+    """
+    try:
+        os.makedirs(export_dir, exist_ok=True)
+        version = compiled.version
+        artifact_path = os.path.join(export_dir, export_file_name(version))
+        if not os.path.exists(artifact_path):
+            tmp_path = f"{artifact_path}.tmp{os.getpid()}"
+            with open(tmp_path, 'wb') as f:
+                f.write(compiled.export_bytes())
+            os.replace(tmp_path, artifact_path)
+
+        pointer_path = os.path.join(export_dir, EXPORT_CURRENT_POINTER)
+        tmp_pointer = f"{pointer_path}.tmp{os.getpid()}"
+        with open(tmp_pointer, 'w', encoding='utf-8') as f:
+            f.write(version)
+        os.replace(tmp_pointer, pointer_path)
+
+        _prune_old_exports(export_dir, keep_version=version)
+        logger.info("Game tree exported as version %s (%s bytes).", version, os.path.getsize(artifact_path))
+        return artifact_path
+    except Exception as e:
+        logger.error("Error exporting game tree to %s: %s", export_dir, e)
+        return None
+
+
+def read_current_export_version(export_dir):
+    try:
+        with open(os.path.join(export_dir, EXPORT_CURRENT_POINTER), 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _prune_old_exports(export_dir, keep_version):
+    artifacts = []
+    for name in os.listdir(export_dir):
+        if name.startswith(EXPORT_FILE_PREFIX) and name.endswith(EXPORT_FILE_SUFFIX):
+            path = os.path.join(export_dir, name)
+            artifacts.append((os.path.getmtime(path), path))
+    artifacts.sort(reverse=True)
+    keep_path = os.path.join(export_dir, export_file_name(keep_version))
+    for _, path in artifacts[EXPORT_KEEP_VERSIONS:]:
+        if path != keep_path:
+            os.remove(path)
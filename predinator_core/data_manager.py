@@ -1,8 +1,11 @@
-import pandas as pd
+import logging
 import numpy as np
+from .metrics import LOAD_CELEBRITY_DATA_SECONDS, PARQUET_WRITE_SECONDS
 from .utils import (QUESTIONS_FILE, CELEBRITIES_FILE,
                     YES_NUMERIC, NO_NUMERIC, DONT_KNOW_NUMERIC)
 
+logger = logging.getLogger(__name__)
+
 class Question:
     def __init__(self, attribute_id, text, possible_answers):
         self.attribute_id = attribute_id
@@ -12,13 +15,13 @@ class Question:
     def __repr__(self):
         return f"Question(id='{self.attribute_id}', text='{self.text}')"
 
-def load_questions():
+def load_questions(questions_file=QUESTIONS_FILE):
     questions = []
     try:
-        with open(QUESTIONS_FILE, 'r', encoding='utf-8') as f: # Added encoding
+        with open(questions_file, 'r', encoding='utf-8') as f: # Added encoding
             header = next(f).strip()
             if header != "attribute_id::question_text::possible_answers":
-                print("Warning: Questions file header mismatch or missing.")
+                logger.warning("Questions file header mismatch or missing.")
             for line in f:
                 line = line.strip()
                 if not line or line.startswith('#'):
@@ -28,17 +31,19 @@ def load_questions():
                     possible_answers = [ans.strip() for ans in answers_str.split(',')]
                     questions.append(Question(attr_id.strip(), text.strip(), possible_answers))
                 except ValueError:
-                    print(f"Warning: Skipping malformed line in questions.txt: {line}")
+                    logger.warning("Skipping malformed line in questions.txt: %s", line)
     except FileNotFoundError:
-        print(f"Error: {QUESTIONS_FILE} not found. Please run generate_sample_data.py")
+        logger.error("%s not found. Please run generate_sample_data.py", questions_file)
         return []
     return questions
 
-def load_celebrity_data():
+@LOAD_CELEBRITY_DATA_SECONDS.timed
+def load_celebrity_data(celebrities_file=CELEBRITIES_FILE):
+    import pandas as pd # Deferred: only the learning/training paths read the dataset
     try:
-        df = pd.read_parquet(CELEBRITIES_FILE, engine='pyarrow')
+        df = pd.read_parquet(celebrities_file, engine='pyarrow')
         if 'CelebrityName' not in df.columns:
-            print("Error: 'CelebrityName' column missing in celebrities.parquet.")
+            logger.error("'CelebrityName' column missing in celebrities.parquet.")
             return pd.DataFrame()
         loaded_attribute_cols = [col for col in df.columns if col != 'CelebrityName']
         for col in loaded_attribute_cols:
@@ -46,22 +51,24 @@ def load_celebrity_data():
                 df[col] = pd.to_numeric(df[col], errors='coerce')
         return df
     except FileNotFoundError:
-        print(f"Error: {CELEBRITIES_FILE} not found. Please run generate_sample_data.py")
+        logger.error("%s not found. Please run generate_sample_data.py", celebrities_file)
         return pd.DataFrame()
     except Exception as e:
-        print(f"Error loading {CELEBRITIES_FILE}: {e}")
+        logger.error("Error loading %s: %s", celebrities_file, e)
         return pd.DataFrame()
 
+@PARQUET_WRITE_SECONDS.timed
 def save_celebrity_data(df):
+    import pandas as pd
     try:
         for col in df.columns:
             if col != 'CelebrityName':
                 if df[col].dtype != float and df[col].dtype != np.float64:
                     df[col] = pd.to_numeric(df[col], errors='coerce')
         df.to_parquet(CELEBRITIES_FILE, index=False, engine='pyarrow')
-        print(f"Celebrity data saved to {CELEBRITIES_FILE}")
+        logger.info("Celebrity data saved to %s", CELEBRITIES_FILE)
     except Exception as e:
-        print(f"Error saving celebrity data to Parquet: {e}")
+        logger.error("Error saving celebrity data to Parquet: %s", e)
 
 def save_questions(questions_list):
     try:
@@ -71,6 +78,6 @@ def save_questions(questions_list):
                 # Ensure original case for 'DontKnow' if desired, or keep all lower
                 answers_str = ",".join(pa.capitalize() if pa == "dontknow" else pa.capitalize() for pa in q_obj.possible_answers)
                 f.write(f"{q_obj.attribute_id}::{q_obj.text}::{answers_str}\n")
-        print(f"Questions saved to {QUESTIONS_FILE}")
+        logger.info("Questions saved to %s", QUESTIONS_FILE)
     except Exception as e:
-        print(f"Error saving questions: {e}")
\ No newline at end of file
+        logger.error("Error saving questions: %s", e)
\ No newline at end of file
@@ -0,0 +1,174 @@
+# PREDINATOR/predinator_core/dataset_analysis.py
+"""
+Training-data analyzer: finds characters the tree can never tell apart and questions
+that add no information.
+
+Both checks run on the prepared training matrix, i.e. what the tree actually sees,
+where every answer is yes (1) or not-yes (0). Work is done in row chunks so memory
+stays bounded on large datasets:
+
+  - Duplicate profiles: each row is bit-packed and hashed with a vectorized
+    multiply-add over 64-bit words; rows sharing a hash are then compared exactly.
+  - Redundant questions: pairwise co-occurrence counts come from one batched matrix
+    product (over a row sample on very large datasets), from which the phi
+    correlation and normalized mutual information of every pair are derived at once.
+"""
+import time
+
+import numpy as np
+
+from .training_matrix import PreparedTrainingData
+
+ROW_CHUNK = 65536
+PAIR_SAMPLE_ROWS = 20000 # Pairwise statistics are estimated from a row sample this size; plenty for a 0.98 threshold
+REDUNDANCY_THRESHOLD = 0.98 # |phi| or normalized MI at or above this marks a pair as redundant
+_HASH_MULTIPLIERS = np.random.default_rng(0x5eed).integers(1, 2**63, size=4096, dtype=np.uint64) | np.uint64(1)
+
+
+def _packed_rows(X, start, stop):
+    packed = np.packbits(X[start:stop] > 0.5, axis=1)
+    pad = (-packed.shape[1]) % 8
+    if pad:
+        packed = np.pad(packed, ((0, 0), (0, pad)))
+    return np.ascontiguousarray(packed).view(np.uint64)
+
+
+def _row_hashes(X):
+    hashes = np.empty(X.shape[0], dtype=np.uint64)
+    for start in range(0, X.shape[0], ROW_CHUNK):
+        words = _packed_rows(X, start, start + ROW_CHUNK)
+        multipliers = np.resize(_HASH_MULTIPLIERS, words.shape[1])
+        with np.errstate(over='ignore'):
+            hashes[start:start + len(words)] = (words * multipliers).sum(axis=1, dtype=np.uint64)
+    return hashes
+
+
+def find_duplicate_profiles(X, row_names):
+    """Groups of row names whose answer vectors are identical, largest groups first."""
+    hashes = _row_hashes(X)
+    order = np.argsort(hashes, kind='stable')
+    sorted_hashes = hashes[order]
+    boundaries = np.flatnonzero(np.diff(sorted_hashes)) + 1
+    groups = []
+    for candidate in np.split(order, boundaries):
+        if len(candidate) < 2:
+            continue
+        # Confirm the hash collision group row by row; it may hold several distinct profiles.
+        packed = _packed_rows(X[candidate], 0, len(candidate))
+        _, profile_ids = np.unique(packed, axis=0, return_inverse=True)
+        for profile_id in np.unique(profile_ids):
+            members = candidate[profile_ids.ravel() == profile_id]
+            if len(members) > 1:
+                groups.append([str(row_names[i]) for i in sorted(members)])
+    groups.sort(key=len, reverse=True)
+    return groups
+
+
+def pairwise_question_stats(X, sample_rows=PAIR_SAMPLE_ROWS, seed=0):
+    """
+    Returns (phi, normalized_mi, yes_rate, rows_used) for every pair of feature columns.
+    normalized_mi is I(a; b) / min(H(a), H(b)), so 1.0 means one answer fully determines the other.
+    """
+    n_rows = X.shape[0]
+    rows = np.arange(n_rows)
+    if n_rows > sample_rows:
+        rows = np.sort(np.random.default_rng(seed).choice(n_rows, size=sample_rows, replace=False))
+
+    n_features = X.shape[1]
+    both_yes = np.zeros((n_features, n_features), dtype=np.float64)
+    yes = np.zeros(n_features, dtype=np.float64)
+    for start in range(0, len(rows), ROW_CHUNK):
+        chunk = (X[rows[start:start + ROW_CHUNK]] > 0.5).astype(np.float32)
+        both_yes += chunk.T @ chunk
+        yes += chunk.sum(axis=0)
+
+    n = float(len(rows))
+    yes_i, yes_j = yes[:, None], yes[None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        phi = (n * both_yes - yes_i * yes_j) / np.sqrt(yes_i * (n - yes_i) * yes_j * (n - yes_j))
+
+        # Mutual information from the four cells of each pair's 2x2 contingency table.
+        cells = (
+            (both_yes, yes_i, yes_j),
+            (yes_i - both_yes, yes_i, n - yes_j),
+            (yes_j - both_yes, n - yes_i, yes_j),
+            (n - yes_i - yes_j + both_yes, n - yes_i, n - yes_j),
+        )
+        mi = np.zeros_like(both_yes)
+        for count, margin_i, margin_j in cells:
+            term = (count / n) * np.log(count * n / (margin_i * margin_j))
+            mi += np.where(count > 0, term, 0.0)
+        p = yes / n
+        entropy = -(np.where(p > 0, p * np.log(p), 0.0) + np.where(p < 1, (1 - p) * np.log(1 - p), 0.0))
+        normalized_mi = mi / np.minimum(entropy[:, None], entropy[None, :])
+    return np.nan_to_num(phi), np.nan_to_num(normalized_mi), p, len(rows)
+
+
+def select_features(feature_columns, phi, normalized_mi, yes_rate, threshold=REDUNDANCY_THRESHOLD):
+    """
+    Greedy pruning in question order: a question is kept unless every row answers it the same
+    way, or it is redundant with a question already kept. Returns (kept, dropped_with_reason).
+    """
+    kept_indices, dropped = [], {}
+    for index, attr_id in enumerate(feature_columns):
+        if yes_rate[index] <= 0.0 or yes_rate[index] >= 1.0:
+            dropped[attr_id] = 'constant'
+            continue
+        redundant_with = None
+        if kept_indices:
+            kept = np.array(kept_indices)
+            scores = np.maximum(np.abs(phi[index, kept]), normalized_mi[index, kept])
+            best = int(np.argmax(scores))
+            if scores[best] >= threshold:
+                redundant_with = feature_columns[kept[best]]
+        if redundant_with:
+            dropped[attr_id] = f"redundant with {redundant_with}"
+        else:
+            kept_indices.append(index)
+    return [feature_columns[i] for i in kept_indices], dropped
+
+
+def analyze_training_data(df_celebs, questions_list, threshold=REDUNDANCY_THRESHOLD,
+                          sample_rows=PAIR_SAMPLE_ROWS, max_pairs=50):
+    """Builds the analysis report (a JSON-serializable dict) for one dataset."""
+    started = time.perf_counter()
+    feature_columns = [q.attribute_id for q in questions_list if q.attribute_id in df_celebs.columns]
+    X, _, _ = PreparedTrainingData().update(df_celebs, feature_columns)
+    row_names = df_celebs['CelebrityName'].to_numpy(dtype=object)
+    prepared_at = time.perf_counter()
+
+    duplicate_groups = find_duplicate_profiles(X, row_names)
+    hashed_at = time.perf_counter()
+
+    phi, normalized_mi, yes_rate, rows_used = pairwise_question_stats(X, sample_rows=sample_rows)
+    upper_i, upper_j = np.triu_indices(len(feature_columns), k=1)
+    scores = np.maximum(np.abs(phi[upper_i, upper_j]), normalized_mi[upper_i, upper_j])
+    flagged = np.flatnonzero(scores >= threshold)
+    flagged = flagged[np.argsort(-scores[flagged], kind='stable')][:max_pairs]
+    redundant_pairs = [{
+        'a': feature_columns[upper_i[k]],
+        'b': feature_columns[upper_j[k]],
+        'phi': round(float(phi[upper_i[k], upper_j[k]]), 4),
+        'normalized_mi': round(float(normalized_mi[upper_i[k], upper_j[k]]), 4),
+    } for k in flagged]
+    kept, dropped = select_features(feature_columns, phi, normalized_mi, yes_rate, threshold)
+    paired_at = time.perf_counter()
+
+    return {
+        'rows': int(X.shape[0]),
+        'features': len(feature_columns),
+        'duplicate_profiles': {
+            'groups': len(duplicate_groups),
+            'rows_affected': sum(len(group) for group in duplicate_groups),
+            'largest': duplicate_groups[:max_pairs],
+        },
+        'redundant_pairs': redundant_pairs,
+        'pair_stats_rows': rows_used,
+        'kept_features': kept,
+        'dropped_features': dropped,
+        'timings_seconds': {
+            'prepare': round(prepared_at - started, 3),
+            'duplicates': round(hashed_at - prepared_at, 3),
+            'pairs': round(paired_at - hashed_at, 3),
+        },
+    }
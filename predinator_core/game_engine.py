@@ -1,73 +1,117 @@
 # PREDINATOR/predinator_core/game_engine.py
-import numpy as np
-import pandas as pd
-from .tree_builder import AkinatorTree
-from .utils import answer_to_numeric
+from .compiled_model import LEAF_FEATURE
+from .metrics import GAMES_STARTED, GAMES_FINISHED, QUESTIONS_PER_GAME, TREE_TRAVERSAL_SECONDS
+from .utils import (answer_to_numeric, is_dont_know, clamp_answer_error_rate, EARLY_GUESS_CONFIDENCE, TRAVERSAL_MODE,
+                    TRAVERSAL_MODES, BEAM_WIDTH, ANSWER_ERROR_RATE)
+import logging
+import math
 import time
 
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
 class GameEngine:
-    def __init__(self):
-        print(f"[{time.ctime()}] GAME_ENGINE: Initializing GameEngine instance...")
-        self.tree_handler = AkinatorTree()
+    def __init__(self, tree_handler=None, early_guess_confidence=EARLY_GUESS_CONFIDENCE, traversal=TRAVERSAL_MODE,
+                 beam_width=BEAM_WIDTH, answer_error_rate=ANSWER_ERROR_RATE):
+        logger.debug("Initializing GameEngine instance...")
         self.game_active = False
         self.current_node_id = 0
         self.path_taken = []
+        self.early_guess_confidence = early_guess_confidence
+        # Set by make_guess: [(name, confidence), ...] best first; the first entry is the guess
+        # made, the rest are follow-ups to offer if the player says it was wrong.
+        self.guess_candidates = []
+        # 'beam' keeps every branch within a few wrong answers of the path (see CompiledModel.beam_search);
+        # the node is then always re-derived from path_taken and rejected_guesses, never advanced in place.
+        if traversal not in TRAVERSAL_MODES:
+            raise ValueError(f"Unknown traversal '{traversal}'; use one of {TRAVERSAL_MODES}.")
+        self.traversal = traversal
+        self.beam_width = beam_width
+        self.mismatch_penalty = None
+        if traversal == 'beam':
+            answer_error_rate = clamp_answer_error_rate(answer_error_rate)
+            self.mismatch_penalty = math.log((1 - answer_error_rate) / answer_error_rate)
+        self.rejected_guesses = [] # Names the player said no to this game; beam traversal plays on past them
+        self._beam_cache = None # (compiled model, answers key, beam): asking and answering share one search
+
+        if tree_handler is not None:
+            # Share an already loaded model (e.g. one lightweight engine per live game connection).
+            self.tree_handler = tree_handler
+            return
+
+        from .tree_builder import create_tree_handler # Deferred: pulls in scikit-learn, pandas and joblib
+        self.tree_handler = create_tree_handler()
         
         # On initialization, the engine MUST load a pre-trained model.
         if not self.tree_handler.load_model_and_metadata():
             # This is a critical failure. The application cannot run without a model.
-            print(f"[{time.ctime()}] GAME_ENGINE CRITICAL ERROR: No pre-trained model found or failed to load.")
-            print(f"[{time.ctime()}] Please run 'python train_model.py' to create the model files before starting the server.")
+            logger.critical("No pre-trained model found or failed to load. Please run 'python train_model.py' to create the model files before starting the server.")
             # We don't raise an exception here to allow Django to start,
             # but the views will check and render an error page.
             self.tree_handler.model = None # Ensure model is None
         else:
-            print(f"[{time.ctime()}] GAME_ENGINE: Pre-trained model loaded successfully.")
+            logger.info("Pre-trained model loaded successfully.")
 
     def start_new_game(self):
-        print(f"[{time.ctime()}] GAME_ENGINE: start_new_game called.")
+        logger.debug("start_new_game called.")
         
         # Check if the model is valid before starting.
         if not self.tree_handler.model:
-            print(f"[{time.ctime()}] GAME_ENGINE Error: Cannot start new game, model is not loaded.")
+            logger.error("Cannot start new game, model is not loaded.")
             self.game_active = False
             return False
 
         self.current_node_id = 0
         self.path_taken = [] 
+        self.guess_candidates = []
+        self.rejected_guesses = []
         self.game_active = True
-        print(f"[{time.ctime()}] GAME_ENGINE: New game state initialized. Active: {self.game_active}")
+        GAMES_STARTED.inc()
+        logger.debug("New game state initialized. Active: %s", self.game_active)
         return True
 
     def get_next_question(self):
         if not self.game_active or not self.tree_handler.model:
             return None, True 
 
-        tree = self.tree_handler.model.tree_
+        tree_handler = self.tree_handler
+        tree = tree_handler.compiled
+        if self.traversal == 'beam':
+            beam_nodes, _ = self.beam()
+            if not len(beam_nodes): # Every branch left ended in a rejected guess
+                return None, True
+            self.current_node_id = int(beam_nodes[0])
         node_id = self.current_node_id
 
-        if tree.feature[node_id] == -2: # Leaf node
+        if tree.feature[node_id] == LEAF_FEATURE or self._confident_enough(tree, node_id):
             return None, True
 
         feature_idx = tree.feature[node_id]
-        attribute_id = self.tree_handler.feature_columns[feature_idx]
-        question_obj = self.tree_handler.get_question_by_attribute_id(attribute_id)
+        attribute_id = tree.feature_columns[feature_idx]
+        question_obj = tree_handler.get_question_by_attribute_id(attribute_id)
 
         if question_obj:
             return question_obj, False
         else:
-            print(f"[{time.ctime()}] GAME_ENGINE Error: No question object found for attr_id '{attribute_id}'.")
+            logger.error("No question object found for attr_id '%s'.", attribute_id)
             self.game_active = False
             return None, True
 
     def process_answer(self, answer_str):
         if not self.game_active or not self.tree_handler.model:
             return False
+        started = time.perf_counter()
         
-        tree = self.tree_handler.model.tree_
+        tree = self.tree_handler.compiled
+        if self.traversal == 'beam':
+            # The question pending is the one get_next_question asked: the best beam entry's.
+            _, is_leaf = self.get_next_question()
+            if is_leaf:
+                return False
         node_id = self.current_node_id
 
-        if tree.feature[node_id] == -2: # Already at a leaf
+        if tree.feature[node_id] == LEAF_FEATURE: # Already at a leaf
             return False
 
         numeric_ans = answer_to_numeric(answer_str)
@@ -75,12 +119,18 @@ class GameEngine:
             return False
 
         feature_idx = tree.feature[node_id]
-        attribute_id = self.tree_handler.feature_columns[feature_idx]
+        attribute_id = tree.feature_columns[feature_idx]
         self.path_taken.append({'attribute_id': attribute_id, 'answer': numeric_ans})
         
+        if self.traversal == 'beam':
+            beam_nodes, _ = self.beam()
+            self.current_node_id = int(beam_nodes[0]) if len(beam_nodes) else node_id
+            TREE_TRAVERSAL_SECONDS.observe(time.perf_counter() - started)
+            return True
+
         threshold = tree.threshold[node_id]
 
-        if pd.isna(numeric_ans):
+        if is_dont_know(numeric_ans):
             # scikit-learn decision trees do not natively handle NaNs during prediction.
             # The convention is that they might go left or right. A common practice is to send them to the larger node.
             # However, for simplicity and consistency with how they might be handled in training, we'll send them right.
@@ -90,28 +140,90 @@ class GameEngine:
         else: 
             self.current_node_id = tree.children_right[node_id]
         
+        TREE_TRAVERSAL_SECONDS.observe(time.perf_counter() - started)
         return True
 
     def make_guess(self):
         if not self.game_active or not self.tree_handler.model:
             return None
         
-        tree = self.tree_handler.model.tree_
+        tree = self.tree_handler.compiled
+        beam_nodes = beam_scores = None
+        if self.traversal == 'beam':
+            beam_nodes, beam_scores = self.beam()
+            if not len(beam_nodes):
+                self.guess_candidates = []
+                self.game_active = False
+                return None
+            self.current_node_id = int(beam_nodes[0])
         node_id = self.current_node_id
 
-        if tree.feature[node_id] != -2: # Must be a leaf
-            print(f"[{time.ctime()}] GAME_ENGINE Error: Not at a leaf node ({node_id}) to make a guess.")
+        if tree.feature[node_id] != LEAF_FEATURE and not self._confident_enough(tree, node_id):
+            logger.error("Not at a leaf node (%s) to make a guess.", node_id)
             self.game_active = False
             return None
 
-        class_counts = tree.value[node_id][0]
-        predicted_class_index = np.argmax(class_counts)
-        
+        if not self.rejected_guesses: # A game resumed after a rejected guess was already counted
+            GAMES_FINISHED.inc()
+            QUESTIONS_PER_GAME.observe(len(self.path_taken))
         try:
-            guessed_celebrity = self.tree_handler.label_encoder.inverse_transform([predicted_class_index])[0]
+            if beam_nodes is not None:
+                # Pooled over the beam, so the follow-ups come from the likeliest other branches.
+                rejected = tree.class_indices(self.rejected_guesses)
+                self.guess_candidates = [(tree.class_names[class_index], confidence) for class_index, confidence
+                                         in tree.beam_candidates(beam_nodes, beam_scores, rejected)]
+            else:
+                # Ranked at compile time; at a leaf the first candidate is node_class, the argmax of its class distribution.
+                self.guess_candidates = self.ranked_guesses(node_id)
             self.game_active = False
-            return guessed_celebrity
+            return self.guess_candidates[0][0] if self.guess_candidates else None
         except Exception as e:
-            print(f"[{time.ctime()}] GAME_ENGINE Error during guess decoding: {e}")
+            logger.error("Error during guess decoding: %s", e)
             self.game_active = False
-            return None
\ No newline at end of file
+            return None
+
+    def ranked_guesses(self, node_id=None):
+        """[(name, confidence), ...] for a node (default: the current one), best first."""
+        tree = self.tree_handler.compiled
+        node_id = self.current_node_id if node_id is None else node_id
+        return [(tree.class_names[class_index], confidence)
+                for class_index, confidence in tree.ranked_candidates(node_id)]
+
+    def beam(self):
+        """(nodes, scores) of the beam for path_taken and rejected_guesses, best first; see CompiledModel.beam_search."""
+        tree = self.tree_handler.compiled
+        answers = np.full(len(tree.feature_columns), np.nan, dtype=np.float32)
+        answered = np.zeros(len(tree.feature_columns), dtype=bool)
+        key = [tuple(self.rejected_guesses)]
+        for item in self.path_taken:
+            value = None if is_dont_know(item['answer']) else float(item['answer'])
+            key.append((item['attribute_id'], value))
+            feature_idx = tree.feature_index(item['attribute_id'])
+            if feature_idx is not None:
+                answered[feature_idx] = True
+                answers[feature_idx] = np.nan if value is None else value
+        cached = self._beam_cache
+        if cached is not None and cached[0] is tree and cached[1] == key:
+            return cached[2]
+        beam = tree.beam_search(answers, answered, self.beam_width, self.mismatch_penalty,
+                                self.early_guess_confidence, tree.class_indices(self.rejected_guesses))
+        self._beam_cache = (tree, key, beam)
+        return beam
+
+    def resume_after_rejection(self):
+        """
+        Beam traversal only: plays on after the player rejected every guess in rejected_guesses,
+        from the likeliest branch left. Returns False when no branch is left (or in path mode).
+        """
+        if self.traversal != 'beam' or not self.tree_handler.model:
+            return False
+        beam_nodes, _ = self.beam()
+        if not len(beam_nodes):
+            return False
+        self.current_node_id = int(beam_nodes[0])
+        self.game_active = True
+        return True
+
+    def _confident_enough(self, tree, node_id):
+        # Early stop: the questions left below this node would only confirm its dominant character.
+        return tree.candidates[node_id, 0] >= 0 and tree.candidate_confidence[node_id, 0] >= self.early_guess_confidence
@@ -0,0 +1,325 @@
+# PREDINATOR/predinator_core/game_events.py
+"""
+Per-game analytics events, buffered in memory and written in batches to append-only segments.
+
+One event is emitted per game that was played, when it ends (or is abandoned):
+
+    {"ts": <epoch seconds at the end>, "dataset": ..., "model_version": ..., "source": "web" | "channel",
+     "outcome": "correct" | "wrong" | "no_guess" | "abandoned",
+     "path": [[attribute_id, 1.0 | 0.0 | null], ...], "answer_ms": {"count": ..., "total": ..., "max": ...},
+     "duration_ms": ..., "guess": <first guess>, "guesses": <guesses shown>, "actual": <character, if known>}
+
+emit() only appends to a bounded list under a lock, so requests never wait on I/O. A daemon
+thread writes the buffer out once it holds batch_size events or every flush_interval seconds.
+Events that arrive while the buffer is full are dropped and counted, never queued.
+
+Segments are named events-<pid>-<ms>.<format> and never rewritten once complete. JSONL segments
+are appended to until they reach SEGMENT_MAX_BYTES. A parquet segment gets one row group per
+flush and is written as <name>.open (parquet is only readable once its footer is written). It
+is renamed into place when it reaches SEGMENT_MAX_BYTES or SEGMENT_MAX_SECONDS, or at exit.
+"""
+import atexit
+import collections
+import json
+import logging
+import os
+import statistics
+import threading
+import time
+
+from .compiled_model import LEAF_FEATURE
+from .metrics import GAME_EVENTS_DROPPED, GAME_EVENTS_WRITTEN
+from .utils import EVENTS_DIR, EVENTS_FORMAT
+
+logger = logging.getLogger(__name__)
+
+OUTCOMES = ('correct', 'wrong', 'no_guess', 'abandoned')
+SEGMENT_PREFIX = 'events-'
+SEGMENT_FORMATS = ('jsonl', 'parquet')
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+SEGMENT_MAX_SECONDS = 300 # An open parquet segment is closed (and becomes readable) at least this often
+OPEN_SEGMENT_SUFFIX = '.open'
+DEFAULT_CAPACITY = 10000
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL = 2.0 # Seconds
+
+
+class GameEventBuffer:
+    def __init__(self, capacity=DEFAULT_CAPACITY, batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.directory = None # Set by enable(); emit() is a no-op until then
+        self.segment_format = 'jsonl'
+        self._events = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._segment_path = None
+        self._parquet_writer = None
+        self._segment_opened_at = None
+        if hasattr(os, 'register_at_fork'): # Not available on Windows
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    @property
+    def enabled(self):
+        return self.directory is not None
+
+    def enable(self, directory=EVENTS_DIR, segment_format=EVENTS_FORMAT):
+        if segment_format not in SEGMENT_FORMATS:
+            raise ValueError(f"Unknown event segment format '{segment_format}'; use one of {SEGMENT_FORMATS}.")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_format = segment_format
+        atexit.register(self.close)
+
+    def emit(self, event):
+        """Queues one event. Returns False (and counts a drop) when the buffer is full."""
+        if not self.enabled:
+            return False
+        with self._lock:
+            if len(self._events) >= self.capacity:
+                GAME_EVENTS_DROPPED.inc()
+                return False
+            self._events.append(event)
+            full_batch = len(self._events) >= self.batch_size
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='predinator-game-events', daemon=True)
+                self._thread.start()
+        if full_batch:
+            self._wake.set()
+        return True
+
+    def flush(self):
+        """Writes every buffered event to the current segment. Returns how many were written."""
+        with self._lock:
+            events, self._events = self._events, []
+        if not events or not self.enabled:
+            return 0
+        with self._write_lock:
+            try:
+                if self.segment_format == 'parquet':
+                    self._write_parquet(events)
+                else:
+                    self._write_jsonl(events)
+            except Exception as e:
+                GAME_EVENTS_DROPPED.inc(len(events))
+                logger.error("Dropped %d game events: %s", len(events), e)
+                return 0
+        GAME_EVENTS_WRITTEN.inc(len(events))
+        return len(events)
+
+    def close(self):
+        """Flushes the buffer and completes the open parquet segment, if any."""
+        self.flush()
+        with self._write_lock:
+            self._close_parquet_segment()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+            if self._parquet_writer is not None and time.time() - self._segment_opened_at >= SEGMENT_MAX_SECONDS:
+                with self._write_lock:
+                    self._close_parquet_segment()
+
+    def _new_segment_path(self, suffix):
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{os.getpid()}-{int(time.time() * 1000)}.{suffix}")
+
+    def _write_jsonl(self, events):
+        if self._segment_path is None or os.path.getsize(self._segment_path) >= SEGMENT_MAX_BYTES:
+            self._segment_path = self._new_segment_path('jsonl')
+        lines = ''.join(json.dumps(event, separators=(',', ':')) + '\n' for event in events)
+        with open(self._segment_path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+
+    def _write_parquet(self, events):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = _parquet_schema()
+        rows = [dict(event, path=json.dumps(event.get('path', [])), answer_ms=event.get('answer_ms'))
+                for event in events]
+        table = pa.Table.from_pylist(rows, schema=schema)
+        if self._parquet_writer is None:
+            self._segment_path = self._new_segment_path('parquet')
+            self._parquet_writer = pq.ParquetWriter(self._segment_path + OPEN_SEGMENT_SUFFIX, schema)
+            self._segment_opened_at = time.time()
+        try:
+            self._parquet_writer.write_table(table)
+        except Exception:
+            self._close_parquet_segment() # Keep the row groups already written readable
+            raise
+        if (os.path.getsize(self._segment_path + OPEN_SEGMENT_SUFFIX) >= SEGMENT_MAX_BYTES
+                or time.time() - self._segment_opened_at >= SEGMENT_MAX_SECONDS):
+            self._close_parquet_segment()
+
+    def _close_parquet_segment(self):
+        # Caller holds _write_lock. Renaming only after close means readers never see a segment without its footer.
+        writer, self._parquet_writer = self._parquet_writer, None
+        if writer is None:
+            return
+        try:
+            writer.close()
+            os.replace(self._segment_path + OPEN_SEGMENT_SUFFIX, self._segment_path)
+        except Exception as e:
+            logger.error("Could not complete game event segment %s: %s", self._segment_path, e)
+        self._segment_path = None
+
+    def _reset_after_fork(self):
+        # The writer thread does not survive a fork; the parent's buffered events stay the parent's.
+        self._events = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._segment_path = None
+        self._parquet_writer = None # The parent's open segment is the parent's to complete
+
+
+def _parquet_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ('ts', pa.float64()), ('dataset', pa.string()), ('model_version', pa.string()), ('source', pa.string()),
+        ('outcome', pa.string()), ('path', pa.string()), ('answer_ms', pa.struct([('count', pa.int64()), ('total', pa.int64()), ('max', pa.int64())])),
+        ('duration_ms', pa.int64()), ('guess', pa.string()), ('guesses', pa.int64()), ('actual', pa.string()),
+    ])
+
+
+def segment_files(directory=EVENTS_DIR):
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.startswith(SEGMENT_PREFIX) and name.rsplit('.', 1)[-1] in SEGMENT_FORMATS
+    )
+
+
+def read_events(directory=EVENTS_DIR, since=None):
+    """Yields every event of every segment (optionally only those with ts >= since), in no particular order."""
+    for path in segment_files(directory):
+        if path.endswith('.parquet'):
+            import pyarrow.parquet as pq
+            for event in pq.read_table(path).to_pylist():
+                event['path'] = json.loads(event['path'])
+                if since is None or event['ts'] >= since:
+                    yield event
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue # A line cut short by a crash mid-write
+                if since is None or event['ts'] >= since:
+                    yield event
+
+
+def replay_nodes(compiled, path):
+    """
+    Node ids a recorded path visited on compiled, root first; None if the path does not fit this tree,
+    or left it (beam traversal resumes on another branch after a rejected guess).
+    """
+    node = 0
+    nodes = [node]
+    for attribute_id, answer in path:
+        feature = compiled.feature[node]
+        if feature == LEAF_FEATURE or compiled.feature_columns[feature] != attribute_id:
+            return None
+        # "Don't know" (null) follows the right child, as in GameEngine.process_answer.
+        if answer is not None and answer <= compiled.threshold[node]:
+            node = int(compiled.children_left[node])
+        else:
+            node = int(compiled.children_right[node])
+        nodes.append(node)
+    return nodes
+
+
+def add_answer_time(answer_ms, ms):
+    """
+    The running {"count", "total", "max"} a game keeps while it is played (three numbers,
+    however long the game runs) with one more answer that took ms.
+    """
+    count, total, slowest = _answer_times(answer_ms)
+    return {'count': count + 1, 'total': total + ms, 'max': max(slowest, ms)}
+
+
+def answer_time_summary(answer_ms):
+    """The event's answer_ms field for a game's running value (or an older per-answer list); None before any answer."""
+    count, total, slowest = _answer_times(answer_ms)
+    return {'count': count, 'total': total, 'max': slowest} if count else None
+
+
+def _answer_times(answer_ms):
+    # (answers, total ms, slowest ms); events and sessions from before the summary hold every sample.
+    if not answer_ms:
+        return 0, 0, 0
+    if isinstance(answer_ms, dict):
+        return answer_ms['count'], answer_ms['total'], answer_ms['max']
+    return len(answer_ms), sum(answer_ms), max(answer_ms)
+
+
+def _distribution(values):
+    if not values:
+        return None
+    return {'mean': round(statistics.fmean(values), 2), 'median': statistics.median(values), 'max': max(values)}
+
+
+def aggregate_events(events, compiled=None):
+    """
+    Outcome counts, accuracy, abandonment and game length over events, and how often each
+    character was the one played (for popularity-weighted training).
+
+    With compiled, the events recorded on that model version are replayed through it, giving
+    per node: visits, games that ended there (abandoned, correct, wrong, no_guess).
+    """
+    outcomes = collections.Counter()
+    characters = collections.Counter()
+    finished_questions, durations = [], []
+    answers = answer_total_ms = slowest_answer_ms = 0
+    nodes = collections.defaultdict(collections.Counter)
+    replayed = unmatched = 0
+    for event in events:
+        outcome = event['outcome']
+        outcomes[outcome] += 1
+        if event.get('actual'):
+            characters[event['actual']] += 1
+        if outcome != 'abandoned':
+            finished_questions.append(len(event['path']))
+        count, total, slowest = _answer_times(event.get('answer_ms'))
+        answers, answer_total_ms = answers + count, answer_total_ms + total
+        slowest_answer_ms = max(slowest_answer_ms, slowest)
+        if event.get('duration_ms') is not None:
+            durations.append(event['duration_ms'])
+        if compiled is None or event.get('model_version') != compiled.version:
+            continue
+        visited = replay_nodes(compiled, event['path'])
+        if visited is None:
+            unmatched += 1
+            continue
+        replayed += 1
+        for node in visited:
+            nodes[node]['visits'] += 1
+        nodes[visited[-1]][outcome] += 1
+
+    games = sum(outcomes.values())
+    judged = outcomes['correct'] + outcomes['wrong'] + outcomes['no_guess']
+    report = {
+        'games': games,
+        'outcomes': dict(outcomes),
+        'accuracy': round(outcomes['correct'] / judged, 4) if judged else None,
+        'abandonment_rate': round(outcomes['abandoned'] / games, 4) if games else None,
+        'questions_per_finished_game': _distribution(finished_questions),
+        'answer_ms': {'mean': round(answer_total_ms / answers, 2), 'max': slowest_answer_ms} if answers else None,
+        'duration_ms': _distribution(durations),
+        'characters': dict(characters.most_common()),
+    }
+    if compiled is not None:
+        report['model_version'] = compiled.version
+        report['replayed'] = replayed
+        report['unmatched'] = unmatched
+        report['nodes'] = {node: dict(counts) for node, counts in sorted(nodes.items())}
+    return report
+
+
+game_events = GameEventBuffer()
@@ -0,0 +1,230 @@
+# PREDINATOR/predinator_core/hierarchical_tree.py
+"""
+Two-stage model: a small router over coarse attributes (real/fictional, athlete,
+singer...) sends each game to a category, and a per-category decision tree finishes it.
+
+Subtrees are independent, so they are fitted concurrently in a process pool, and a
+retrain only refits categories whose rows changed; a learn event touches just one.
+The router and subtrees are stitched into a single CompiledModel, so the game engine,
+exports and shared hosting work exactly as they do for the flat tree.
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.tree import DecisionTreeClassifier
+
+from .compiled_model import CompiledModel, LEAF_FEATURE, TOP_CANDIDATES, rank_node_candidates, top_classes_from_tree
+from .tree_builder import AkinatorTree
+from .utils import MODEL_DIR
+
+logger = logging.getLogger(__name__)
+
+ROUTER_ATTRIBUTES = ('is_real_person', 'is_fictional', 'is_athlete', 'is_singer')
+ROUTER_THRESHOLD = 0.5 # Same yes/no split the flat tree learns on 0/1 attributes
+PARALLEL_MIN_ROWS = 5000 # Below this many rows to refit, process start-up costs more than fitting inline
+# Retrains run on a web worker's learning thread, and a fork of a threaded process can inherit held
+# locks; subtree workers therefore come from a fork server (spawn where there is none, e.g. Windows).
+SUBTREE_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+def _fit_subtree(X, y_local, tree_params):
+    """Process-pool task: fits one category and returns its node arrays (class ids local to the category)."""
+    model = DecisionTreeClassifier(criterion='gini', random_state=42, **tree_params)
+    model.fit(X, y_local)
+    tree = model.tree_
+    leaf_classes, leaf_counts = top_classes_from_tree(tree)
+    return {
+        'feature': tree.feature.astype(np.int32),
+        'threshold': tree.threshold.astype(np.float32),
+        'children_left': tree.children_left.astype(np.int32),
+        'children_right': tree.children_right.astype(np.int32),
+        'node_class': model.classes_[np.argmax(tree.value[:, 0, :], axis=1)].astype(np.int32),
+        'node_samples': tree.weighted_n_node_samples.astype(np.float64),
+        'leaf_classes': np.where(leaf_classes >= 0, model.classes_[np.maximum(leaf_classes, 0)], -1).astype(np.int32),
+        'leaf_counts': leaf_counts,
+    }
+
+
+def _single_leaf_subtree():
+    return {
+        'feature': np.array([LEAF_FEATURE], dtype=np.int32),
+        'threshold': np.array([LEAF_FEATURE], dtype=np.float32),
+        'children_left': np.array([-1], dtype=np.int32),
+        'children_right': np.array([-1], dtype=np.int32),
+        'node_class': np.array([0], dtype=np.int32),
+        'node_samples': np.ones(1),
+        'leaf_classes': np.array([[0] + [-1] * (TOP_CANDIDATES - 1)], dtype=np.int32),
+        'leaf_counts': np.array([[1.0] + [0.0] * (TOP_CANDIDATES - 1)]),
+    }
+
+
+def _leaf_distribution(subtree):
+    """(node_samples, leaf_classes, leaf_counts) of a subtree; pickled before they were stored, every leaf counts as one pure row."""
+    if 'leaf_classes' in subtree:
+        return subtree['node_samples'], subtree['leaf_classes'], subtree['leaf_counts']
+    n_nodes = len(subtree['feature'])
+    leaf_classes = np.full((n_nodes, TOP_CANDIDATES), -1, dtype=np.int32)
+    leaf_classes[:, 0] = subtree['node_class']
+    leaf_counts = np.zeros((n_nodes, TOP_CANDIDATES))
+    leaf_counts[:, 0] = 1.0
+    return np.ones(n_nodes), leaf_classes, leaf_counts
+
+
+class HierarchicalModel:
+    """
+    Stored in place of the DecisionTreeClassifier. router is a nested tuple of
+    ('split', feature_index, left, right) and ('leaf', category_index) nodes. Each
+    category keeps its member names, the digest of its training rows and its subtree.
+    """
+    def __init__(self, router, categories):
+        self.router = router
+        self.categories = categories
+
+    def subtrees_by_digest(self):
+        return {category['digest']: category['subtree'] for category in self.categories}
+
+
+class HierarchicalAkinatorTree(AkinatorTree):
+    def __init__(self, ccp_alpha=0.0, max_depth=None, min_samples_leaf=1, min_samples_split=2, model_dir=MODEL_DIR,
+                 router_attributes=ROUTER_ATTRIBUTES, max_workers=None, parallel_min_rows=PARALLEL_MIN_ROWS):
+        super().__init__(ccp_alpha=ccp_alpha, max_depth=max_depth, min_samples_leaf=min_samples_leaf,
+                         min_samples_split=min_samples_split, model_dir=model_dir)
+        # Kept apart from self.model, which holds a HierarchicalModel once trained or loaded.
+        self.tree_params = {
+            'ccp_alpha': ccp_alpha,
+            'max_depth': max_depth,
+            'min_samples_leaf': min_samples_leaf,
+            'min_samples_split': min_samples_split,
+        }
+        self.router_attributes = tuple(router_attributes)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.parallel_min_rows = parallel_min_rows
+
+    def _fit_model(self, X, y, staged_metadata):
+        feature_columns = staged_metadata['feature_columns']
+        class_names = staged_metadata['label_encoder'].classes_
+        X_values = np.asarray(X, dtype=np.float32)
+
+        router_features = [feature_columns.index(a) for a in self.router_attributes if a in feature_columns]
+        category_rows = []
+        router = self._build_router(X_values, np.arange(len(y)), router_features, category_rows)
+
+        previous = self.model.subtrees_by_digest() if isinstance(self.model, HierarchicalModel) else {}
+        categories, jobs = [], []
+        for rows in category_rows:
+            member_labels, y_local = np.unique(y[rows], return_inverse=True)
+            names = [str(class_names[label]) for label in member_labels]
+            X_rows = np.ascontiguousarray(X_values[rows])
+            digest = self._category_digest(feature_columns, X_rows, names, y_local)
+            category = {'names': names, 'digest': digest, 'subtree': previous.get(digest)}
+            if category['subtree'] is None:
+                if len(names) == 1:
+                    category['subtree'] = _single_leaf_subtree()
+                else:
+                    jobs.append((category, X_rows, y_local))
+            categories.append(category)
+
+        refit_rows = sum(len(job[2]) for job in jobs)
+        logger.info("Router split %d rows into %d categories; refitting %d subtrees (%d rows).",
+                    len(y), len(categories), len(jobs), refit_rows)
+        if len(jobs) > 1 and self.max_workers > 1 and refit_rows >= self.parallel_min_rows:
+            with ProcessPoolExecutor(max_workers=min(self.max_workers, len(jobs)),
+                                     mp_context=multiprocessing.get_context(SUBTREE_START_METHOD)) as pool:
+                futures = [pool.submit(_fit_subtree, X_rows, y_local, self.tree_params) for _, X_rows, y_local in jobs]
+                for (category, _, _), future in zip(jobs, futures):
+                    category['subtree'] = future.result()
+        else:
+            for category, X_rows, y_local in jobs:
+                category['subtree'] = _fit_subtree(X_rows, y_local, self.tree_params)
+
+        return HierarchicalModel(router, categories)
+
+    def _build_router(self, X_values, rows, router_features, category_rows):
+        # Splits on the first coarse attribute that actually divides these rows. An attribute that
+        # does not divide them is constant for every subset below too, so it is dropped for good.
+        for position, feature_index in enumerate(router_features):
+            goes_right = X_values[rows, feature_index] > ROUTER_THRESHOLD
+            if goes_right.all() or not goes_right.any():
+                continue
+            remaining = router_features[position + 1:]
+            return ('split', feature_index,
+                    self._build_router(X_values, rows[~goes_right], remaining, category_rows),
+                    self._build_router(X_values, rows[goes_right], remaining, category_rows))
+        category_rows.append(rows)
+        return ('leaf', len(category_rows) - 1)
+
+    def _category_digest(self, feature_columns, X_rows, names, y_local):
+        digest = hashlib.sha256()
+        digest.update(repr((feature_columns, names, sorted(self.tree_params.items()))).encode('utf-8'))
+        digest.update(X_rows.tobytes())
+        digest.update(y_local.astype(np.int64).tobytes())
+        return digest.hexdigest()
+
+    def _compile(self):
+        class_ids = {str(name): index for index, name in enumerate(self.label_encoder.classes_)}
+        arrays = {name: [] for name in ('feature', 'threshold', 'children_left', 'children_right', 'node_class')}
+        distribution = {name: [] for name in ('node_samples', 'leaf_classes', 'leaf_counts')}
+        size = [0]
+
+        def emit(node):
+            node_id = size[0]
+            if node[0] == 'leaf':
+                category = self.model.categories[node[1]]
+                subtree = category['subtree']
+                local_to_global = np.array([class_ids[name] for name in category['names']], dtype=np.int32)
+                for key in ('children_left', 'children_right'):
+                    children = subtree[key]
+                    arrays[key].append(np.where(children >= 0, children + node_id, children))
+                arrays['feature'].append(subtree['feature'])
+                arrays['threshold'].append(subtree['threshold'])
+                arrays['node_class'].append(local_to_global[subtree['node_class']])
+                node_samples, leaf_classes, leaf_counts = _leaf_distribution(subtree)
+                distribution['node_samples'].append(node_samples)
+                distribution['leaf_classes'].append(np.where(leaf_classes >= 0, local_to_global[np.maximum(leaf_classes, 0)], -1))
+                distribution['leaf_counts'].append(leaf_counts)
+                size[0] += len(subtree['feature'])
+                return
+            # Router node: a plain split, placeholders are filled in once the children's ids are known.
+            for key in arrays:
+                arrays[key].append(np.zeros(1, dtype=np.float32 if key == 'threshold' else np.int32))
+            distribution['node_samples'].append(np.zeros(1))
+            distribution['leaf_classes'].append(np.full((1, TOP_CANDIDATES), -1, dtype=np.int32))
+            distribution['leaf_counts'].append(np.zeros((1, TOP_CANDIDATES)))
+            size[0] += 1
+            slot = len(arrays['feature']) - 1
+            left_id = size[0]
+            emit(node[2])
+            right_id = size[0]
+            emit(node[3])
+            arrays['feature'][slot][0] = node[1]
+            arrays['threshold'][slot][0] = ROUTER_THRESHOLD
+            arrays['children_left'][slot][0] = left_id
+            arrays['children_right'][slot][0] = right_id
+            arrays['node_class'][slot][0] = arrays['node_class'][slot + 1][0]
+            router_nodes.append(node_id)
+
+        router_nodes = []
+        emit(self.model.router)
+        nodes = {key: np.concatenate(parts) for key, parts in arrays.items()}
+        node_samples = np.concatenate(distribution['node_samples'])
+        for node_id in router_nodes: # Recorded after their children, so nested router nodes add up bottom-up
+            node_samples[node_id] = (node_samples[nodes['children_left'][node_id]]
+                                     + node_samples[nodes['children_right'][node_id]])
+        candidates, candidate_confidence = rank_node_candidates(
+            nodes['children_left'], nodes['children_right'], node_samples,
+            np.concatenate(distribution['leaf_classes']), np.concatenate(distribution['leaf_counts']))
+        return CompiledModel(
+            class_names=[str(name) for name in self.label_encoder.classes_],
+            feature_columns=self.feature_columns,
+            questions=CompiledModel.questions_from_tree_handler(self),
+            candidates=candidates,
+            candidate_confidence=candidate_confidence,
+            **nodes,
+        )
+
+    def _is_fitted(self, model):
+        return isinstance(model, HierarchicalModel)
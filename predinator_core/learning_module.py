@@ -1,13 +1,17 @@
 # predinator/predinator_core/learning_module.py
 import pandas as pd
 import numpy as np
-import json # For web context
-import time # For logging
+import logging
 from .data_manager import (load_celebrity_data, save_celebrity_data,
                            load_questions, save_questions, Question)
 from .tree_builder import AkinatorTree
+from .question_catalog import question_catalog
+from .metrics import LEARNS
+from .question_selection import select_distinguishing_questions, impute_answers
 from .utils import answer_to_numeric, DONT_KNOW_NUMERIC
 
+logger = logging.getLogger(__name__)
+
 class LearningModule:
     def __init__(self, tree_handler: AkinatorTree):
         self.tree_handler = tree_handler
@@ -15,7 +19,7 @@ class LearningModule:
 
     def _refresh_all_questions_from_file(self):
         """Loads all questions from the questions.txt file."""
-        print(f"[{time.ctime()}] LEARNER: Refreshing all questions from file.")
+        logger.debug("Refreshing all questions from file.")
         self.all_questions_list = load_questions()
 
     def learn_new_celebrity_fully_web(self, actual_celebrity_name, game_path_answers, all_submitted_attributes):
@@ -25,12 +29,12 @@ class LearningModule:
         - game_path_answers: Dict of {attr_id: numeric_answer} from the game path.
         - all_submitted_attributes: Dict of {attr_id: 'yes'/'no'/'dontknow'} from the full learn form.
         """
-        print(f"[{time.ctime()}] LEARNER: learn_new_celebrity_fully_web called for '{actual_celebrity_name}'.")
+        logger.info("learn_new_celebrity_fully_web called for '%s'.", actual_celebrity_name)
         df_celebs = load_celebrity_data()
         self._refresh_all_questions_from_file()
 
         if actual_celebrity_name in df_celebs['CelebrityName'].values:
-            print(f"[{time.ctime()}] LEARNER Warning: '{actual_celebrity_name}' already exists. Aborting learn process.")
+            logger.warning("'%s' already exists. Aborting learn process.", actual_celebrity_name)
             return False # Or handle as an update later
 
         new_celeb_attrs = {'CelebrityName': actual_celebrity_name}
@@ -39,8 +43,17 @@ class LearningModule:
         for attr_id, ans_str in all_submitted_attributes.items():
             new_celeb_attrs[attr_id] = answer_to_numeric(ans_str)
 
-        # Ensure all known attributes are present in the new celebrity's data, defaulting to DONT_KNOW
+        # The form only asks the questions that tell this character apart from its neighbors;
+        # the rest are filled in from the closest known characters where they agree.
         all_known_attr_ids = {q.attribute_id for q in self.all_questions_list}
+        unasked = [attr_id for attr_id in all_known_attr_ids if attr_id not in new_celeb_attrs]
+        submitted = {attr_id: value for attr_id, value in new_celeb_attrs.items() if attr_id != 'CelebrityName'}
+        imputed = impute_answers(df_celebs, submitted, unasked)
+        new_celeb_attrs.update(imputed)
+        logger.info("%d answers submitted, %d of %d unasked attributes imputed from similar characters.",
+                    len(all_submitted_attributes), len(imputed), len(unasked))
+
+        # Ensure all known attributes are present in the new celebrity's data, defaulting to DONT_KNOW
         for attr_id_master in all_known_attr_ids:
             if attr_id_master not in new_celeb_attrs:
                 new_celeb_attrs[attr_id_master] = DONT_KNOW_NUMERIC
@@ -59,33 +72,49 @@ class LearningModule:
                 df_celebs[col] = pd.to_numeric(df_celebs[col], errors='coerce')
         
         save_celebrity_data(df_celebs)
-        print(f"[{time.ctime()}] LEARNER: '{actual_celebrity_name}' saved to dataset. Retraining model...")
+        LEARNS.inc()
+        logger.info("'%s' saved to dataset. Retraining model...", actual_celebrity_name)
 
         if self.tree_handler.train(df_celebs, self.all_questions_list):
-            print(f"[{time.ctime()}] LEARNER: Model retrained successfully.")
+            logger.info("Model retrained successfully.")
             return True
         else:
-            print(f"[{time.ctime()}] LEARNER Error: Failed to retrain model after adding new celebrity.")
+            logger.error("Failed to retrain model after adding new celebrity.")
             return False
 
+    def plan_attribute_questions(self, answers, guessed_celebrity_name=None, df_celebs=None):
+        """
+        Attribute ids the learn form should ask about on top of the already answered ones
+        (answers: {attr_id: 1.0/0.0/None} from the game path): the few questions that separate
+        the new character from the characters nearest to those answers and from the wrong guess.
+        """
+        if df_celebs is None:
+            df_celebs = load_celebrity_data()
+        self._refresh_all_questions_from_file()
+        candidates = [q.attribute_id for q in self.all_questions_list if q.attribute_id not in answers]
+        extra_names = [guessed_celebrity_name] if guessed_celebrity_name else []
+        ask = select_distinguishing_questions(df_celebs, answers, candidates, extra_names=extra_names)
+        logger.info("Learn form will ask %s of %s unanswered questions.", len(ask), len(candidates))
+        return ask
+
     def web_add_question_and_learn_redirect(self, guessed_celebrity_name, actual_celebrity_name, game_path,
                                            new_q_text, new_q_attr_id, ans_for_actual_new_q_str, ans_for_guessed_new_q_str):
         """
         Web-specific function to add a new question and PREPARE for learning the new celebrity.
         This function does not do the final learning but prepares the context for the attribute collection view.
         """
-        print(f"[{time.ctime()}] LEARNER: web_add_question_and_learn_redirect called for '{actual_celebrity_name}' with new question '{new_q_attr_id}'.")
+        logger.info("web_add_question_and_learn_redirect called for '%s' with new question '%s'.", actual_celebrity_name, new_q_attr_id)
         self._refresh_all_questions_from_file()
         existing_attr_ids = {q.attribute_id for q in self.all_questions_list}
         if new_q_attr_id in existing_attr_ids:
-            print(f"[{time.ctime()}] LEARNER Error: Attribute ID '{new_q_attr_id}' already exists.")
+            logger.error("Attribute ID '%s' already exists.", new_q_attr_id)
             return None
 
         # Add new question to master list and save it
         new_question_obj = Question(new_q_attr_id, new_q_text, ['Yes', 'No', 'DontKnow'])
         self.all_questions_list.append(new_question_obj)
         save_questions(self.all_questions_list)
-        print(f"[{time.ctime()}] LEARNER: New question saved to questions.txt.")
+        logger.info("New question saved to questions.txt.")
 
         # Update the DataFrame with the new question column
         df_celebs = load_celebrity_data()
@@ -98,32 +127,25 @@ class LearningModule:
             df_celebs.loc[df_celebs['CelebrityName'] == guessed_celebrity_name, new_q_attr_id] = ans_for_guessed_num
         
         save_celebrity_data(df_celebs)
-        print(f"[{time.ctime()}] LEARNER: Celebrities dataset updated with new attribute column '{new_q_attr_id}'.")
+        logger.info("Celebrities dataset updated with new attribute column '%s'.", new_q_attr_id)
 
-        # Now, prepare the context for the learn_new_celebrity_attributes.html template
+        # Now, prepare the (sparse) context for the attribute form. Only the player's answers are kept;
+        # the question list is rebuilt from the shared question catalog when the form is rendered.
         game_path_answers = {item['attribute_id']: item['answer'] for item in game_path}
         
         # Add the answer for the new question for the NEW celebrity to this dictionary
         game_path_answers[new_q_attr_id] = answer_to_numeric(ans_for_actual_new_q_str)
 
-        questions_to_ask_on_form = []
-        for q_obj in self.all_questions_list: # Use the newly updated list
-            current_answer = game_path_answers.get(q_obj.attribute_id)
-            questions_to_ask_on_form.append({
-                'attribute_id': q_obj.attribute_id,
-                'text': q_obj.text,
-                'current_answer': current_answer,
-                'current_answer_is_nan': pd.isna(current_answer)
-            })
-
+        answers = {attr_id: (None if pd.isna(ans) else float(ans)) for attr_id, ans in game_path_answers.items()}
         context_for_next_step = {
             'celebrity_name': actual_celebrity_name,
-            'questions_to_ask': questions_to_ask_on_form,
-            'game_path_json': json.dumps(game_path_answers), # This now includes the new question's answer
+            'question_set_version': question_catalog.snapshot().version,
+            'answers': answers,
+            'ask': self.plan_attribute_questions(answers, guessed_celebrity_name, df_celebs),
             'form_action': 'submit_new_celebrity_attributes',
-            'new_question_info_json': json.dumps({ # Pass new question info along if needed
+            'new_question_info': { # Pass new question info along if needed
                 'id': new_q_attr_id,
                 'text': new_q_text
-            })
+            }
         }
         return context_for_next_step
\ No newline at end of file
@@ -0,0 +1,101 @@
+# PREDINATOR/predinator_core/logging_setup.py
+"""
+Logging for the predinator_core and game_app packages.
+
+Modules log through logging.getLogger(__name__) with %-style arguments, so a disabled level
+costs one cached level check and the message is never built. Enabled records go onto an
+in-process queue; a listener thread formats them and writes them to stderr, so a request
+never waits on the log stream. Values worth aggregating (durations, sizes, versions) are
+passed as extra= fields and come out as separate keys, in key=value text or JSON lines.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+
+from .utils import LOG_LEVEL, LOG_LEVELS, LOG_FORMAT
+
+LOGGER_NAMESPACES = ('predinator_core', 'game_app')
+
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+_configure_lock = threading.Lock()
+_listener = None
+
+
+class StructuredFormatter(logging.Formatter):
+    """Formats the message plus every extra= field, as key=value text or as one JSON object per line."""
+    def __init__(self, log_format='text'):
+        super().__init__(datefmt='%Y-%m-%dT%H:%M:%S')
+        self.json_output = log_format == 'json'
+
+    def format(self, record):
+        fields = {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+        timestamp = f"{self.formatTime(record, self.datefmt)}.{int(record.msecs):03d}"
+        message = record.getMessage()
+        exc_text = self.formatException(record.exc_info) if record.exc_info else record.exc_text
+        if self.json_output:
+            entry = {'ts': timestamp, 'level': record.levelname, 'logger': record.name, 'message': message}
+            entry.update(fields)
+            if exc_text:
+                entry['exc'] = exc_text
+            return json.dumps(entry, default=str)
+        line = f"{timestamp} {record.levelname} {record.name}: {message}"
+        if fields:
+            line += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        if exc_text:
+            line += '\n' + exc_text
+        return line
+
+
+class _InProcessQueueHandler(logging.handlers.QueueHandler):
+    """
+    Only resolves the message in the calling thread (so later changes to mutable arguments
+    don't show up); timestamps, extra fields and tracebacks are formatted by the listener.
+    """
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def parse_module_levels(spec):
+    """{'game_app.views': 'DEBUG', ...} from 'game_app.views=DEBUG,predinator_core.tree_builder=WARNING'."""
+    levels = {}
+    for item in (spec or '').split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(level=LOG_LEVEL, module_levels=LOG_LEVELS, log_format=LOG_FORMAT, stream=None):
+    """
+    Routes both package loggers through one queue and listener thread. Safe to call more than
+    once: later calls only update the levels. module_levels is a dict or a spec string.
+    """
+    global _listener
+    if isinstance(module_levels, str):
+        module_levels = parse_module_levels(module_levels)
+    with _configure_lock:
+        if _listener is None:
+            log_queue = queue.SimpleQueue()
+            output = logging.StreamHandler(stream or sys.stderr)
+            output.setFormatter(StructuredFormatter(log_format))
+            _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+            _listener.start()
+            atexit.register(_listener.stop)
+            handler = _InProcessQueueHandler(log_queue)
+            for namespace in LOGGER_NAMESPACES:
+                package_logger = logging.getLogger(namespace)
+                package_logger.addHandler(handler)
+                package_logger.propagate = False
+        for namespace in LOGGER_NAMESPACES:
+            logging.getLogger(namespace).setLevel(level.upper())
+        for name, module_level in module_levels.items():
+            logging.getLogger(name).setLevel(module_level)
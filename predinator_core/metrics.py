@@ -0,0 +1,300 @@
+# PREDINATOR/predinator_core/metrics.py
+"""
+In-process metrics (counters and histograms), summed across worker processes and
+rendered in the Prometheus text format.
+
+Every metric is declared below, so the value layout is fixed: each one owns a few
+float64 slots (a counter one, a histogram one per bucket plus its sum). Recording is
+a bisect and a couple of in-place adds, without a lock: losing an update needs a
+thread switch between the read and the write of one slot, which is rare enough for
+monitoring counts and keeps a recording in the low hundreds of nanoseconds.
+
+Until enable_shared_metrics() is called the slots live in process memory. After it,
+they are an mmap'd file of their own under METRICS_DIR (metrics_<pid>.db), so a
+scrape of any worker can add up every worker on the host. The files of workers
+that have exited are folded into one archive file, keeping counters monotonic across
+worker restarts.
+"""
+import bisect
+import functools
+import hashlib
+import logging
+import mmap
+import os
+import threading
+import time
+
+import numpy as np
+
+from .utils import METRICS_DIR
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError: # Windows development machines: no cross-process lock, stale files are not folded.
+    fcntl = None
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 120.0)
+QUESTION_BUCKETS = (1, 2, 3, 5, 8, 10, 12, 15, 20, 25, 30, 40, 50)
+
+FILE_MAGIC = b'PRDMTRC1'
+FILE_PREFIX = 'metrics_'
+ARCHIVE_FILE = 'metrics_archive.db'
+LOCK_FILE = '.metrics.lock'
+HEADER_BYTES = 16 # magic + first 8 bytes of the schema digest
+
+_metrics = []
+_slot_count = 0
+_lock = threading.Lock()
+
+
+class _Storage:
+    """Holds the current slot view; swapped when the process moves its values into a shared file."""
+    def __init__(self, slot_count):
+        self.values = memoryview(bytearray(8 * slot_count)).cast('d')
+        self.directory = None
+        self.path = None
+        self.mapping = None
+
+
+def _allocate(metric, slots):
+    global _slot_count
+    first = _slot_count
+    _slot_count += slots
+    _metrics.append(metric)
+    return first
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=None):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels or {}
+        self.slot = _allocate(self, 1)
+
+    def inc(self, amount=1.0):
+        _storage.values[self.slot] += amount
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(float(bound) for bound in buckets)
+        self.first_slot = _allocate(self, len(self.buckets) + 2) # buckets, +Inf, sum
+        self.sum_slot = self.first_slot + len(self.buckets) + 1
+
+    def observe(self, value):
+        values = _storage.values
+        values[self.first_slot + bisect.bisect_left(self.buckets, value)] += 1.0
+        values[self.sum_slot] += value
+
+    def time(self):
+        """Context manager observing the seconds spent in its block."""
+        return _Timer(self)
+
+    def timed(self, func):
+        """Decorator observing the seconds spent in each call of func."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.observe(time.perf_counter() - started)
+        return wrapper
+
+
+class _Timer:
+    __slots__ = ('histogram', 'started')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+# --- Declared metrics (the declaration order is the file layout) ---
+
+SESSION_LOAD_SECONDS = Histogram('predinator_session_load_seconds', "Loading a Django session from its store.")
+SESSION_SAVE_SECONDS = Histogram('predinator_session_save_seconds', "Saving a Django session to its store.")
+SESSION_GAME_STATE_SECONDS = Histogram('predinator_session_game_state_seconds', "get_session_game_state, session to engine.")
+TREE_TRAVERSAL_SECONDS = Histogram('predinator_tree_traversal_seconds', "One answer applied to the tree by GameEngine.process_answer.")
+TEMPLATE_RENDER_SECONDS = Histogram('predinator_template_render_seconds', "Rendering one Django template.")
+LOAD_CELEBRITY_DATA_SECONDS = Histogram('predinator_load_celebrity_data_seconds', "Reading celebrities.parquet.")
+PARQUET_WRITE_SECONDS = Histogram('predinator_parquet_write_seconds', "Writing celebrities.parquet.")
+TRAIN_SECONDS = Histogram('predinator_train_seconds', "AkinatorTree.train, data preparation to saved artifacts.")
+MODEL_LOAD_SECONDS = Histogram('predinator_model_load_seconds', "Loading or attaching a trained model.")
+QUESTIONS_PER_GAME = Histogram('predinator_questions_per_game', "Questions answered before the final guess.", QUESTION_BUCKETS)
+
+GAMES_STARTED = Counter('predinator_games_started_total', "Games started.")
+GAMES_FINISHED = Counter('predinator_games_finished_total', "Games that reached a guess (or ran out of questions).")
+GUESSES_RIGHT = Counter('predinator_guesses_total', "Guesses confirmed or rejected by the player.", {'outcome': 'right'})
+GUESSES_WRONG = Counter('predinator_guesses_total', "Guesses confirmed or rejected by the player.", {'outcome': 'wrong'})
+LEARNS = Counter('predinator_learns_total', "Characters learned from players.")
+RETRAINS = Counter('predinator_retrains_total', "Model retrains attempted.")
+GAME_EVENTS_WRITTEN = Counter('predinator_game_events_written_total', "Game analytics events written to segments.")
+GAME_EVENTS_DROPPED = Counter('predinator_game_events_dropped_total', "Game analytics events dropped (buffer full or write failed).")
+
+SCHEMA_DIGEST = hashlib.sha1(repr([
+    (m.name, sorted(m.labels.items())) if isinstance(m, Counter) else (m.name, m.buckets) for m in _metrics
+]).encode('utf-8')).digest()[:8]
+_storage = _Storage(_slot_count)
+
+
+# --- Cross-process storage ---
+
+def _pid_from_file_name(file_name):
+    stem = file_name[len(FILE_PREFIX):-len('.db')]
+    return int(stem) if stem.isdigit() else None
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read_values(path):
+    """The slot values stored in a metrics file, or None if it is missing or has another layout."""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_BYTES)
+            values = np.fromfile(f, dtype='<f8', count=_slot_count)
+    except FileNotFoundError:
+        return None
+    if header != FILE_MAGIC + SCHEMA_DIGEST or len(values) != _slot_count:
+        return None
+    return values
+
+
+def _write_values(path, values):
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(FILE_MAGIC + SCHEMA_DIGEST)
+        f.write(np.asarray(values, dtype='<f8').tobytes())
+    os.replace(tmp_path, path)
+
+
+def _fold_exited_workers(directory):
+    """Adds the files of exited processes into the archive file and removes them."""
+    if fcntl is None:
+        return
+    with open(os.path.join(directory, LOCK_FILE), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            archive_path = os.path.join(directory, ARCHIVE_FILE)
+            archived = _read_values(archive_path)
+            total = np.zeros(_slot_count) if archived is None else archived.copy()
+            exited = []
+            for file_name in os.listdir(directory):
+                pid = _pid_from_file_name(file_name) if file_name.startswith(FILE_PREFIX) and file_name.endswith('.db') else None
+                # A file named after this process predates it (a reused pid): fold it like any other.
+                if pid is None or (pid != os.getpid() and _process_alive(pid)):
+                    continue
+                values = _read_values(os.path.join(directory, file_name))
+                if values is not None:
+                    total += values
+                exited.append(file_name)
+            if exited:
+                _write_values(archive_path, total)
+                for file_name in exited:
+                    os.remove(os.path.join(directory, file_name))
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def enable_shared_metrics(directory=METRICS_DIR):
+    """
+    Moves this process's values into its own mmap'd file under directory, so collect() in
+    any process on the host sums every worker. Values recorded so far are carried over.
+    """
+    if _storage.directory == directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    _fold_exited_workers(directory)
+    path = os.path.join(directory, f"{FILE_PREFIX}{os.getpid()}.db")
+    with _lock:
+        _write_values(path, _storage.values)
+        with open(path, 'r+b') as f:
+            mapping = mmap.mmap(f.fileno(), 0)
+        _storage.values = memoryview(mapping)[HEADER_BYTES:].cast('d')
+        _storage.directory, _storage.path, _storage.mapping = directory, path, mapping
+    logger.info("Metrics shared through %s.", path)
+
+
+def _reset_after_fork():
+    # A forked worker starts from zero in its own file; the parent's values stay in the parent's.
+    global _lock, _storage
+    _lock = threading.Lock()
+    directory = _storage.directory
+    _storage = _Storage(_slot_count)
+    if directory:
+        enable_shared_metrics(directory)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def collect():
+    """float64 array of every slot, summed over all workers sharing this process's directory."""
+    directory = _storage.directory
+    with _lock:
+        total = np.array(_storage.values, dtype=np.float64)
+    if directory is None:
+        return total
+    for file_name in os.listdir(directory):
+        path = os.path.join(directory, file_name)
+        if not file_name.startswith(FILE_PREFIX) or not file_name.endswith('.db') or path == _storage.path:
+            continue
+        values = _read_values(path)
+        if values is not None:
+            total += values
+    return total
+
+
+# --- Exposition ---
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render_prometheus(values=None):
+    """The text exposition format (version 0.0.4) of the collected values."""
+    values = collect() if values is None else values
+    lines, described = [], set()
+    for metric in _metrics:
+        if metric.name not in described:
+            described.add(metric.name)
+            kind = 'counter' if isinstance(metric, Counter) else 'histogram'
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {kind}")
+        if isinstance(metric, Counter):
+            lines.append(f"{metric.name}{_format_labels(metric.labels)} {_format_value(values[metric.slot])}")
+            continue
+        cumulative = 0.0
+        for index, bound in enumerate(metric.buckets + (float('inf'),)):
+            cumulative += values[metric.first_slot + index]
+            le = '+Inf' if bound == float('inf') else _format_value(bound)
+            lines.append(f'{metric.name}_bucket{{le="{le}"}} {_format_value(cumulative)}')
+        lines.append(f"{metric.name}_sum {repr(float(values[metric.sum_slot]))}")
+        lines.append(f"{metric.name}_count {_format_value(cumulative)}")
+    return '\n'.join(lines) + '\n'
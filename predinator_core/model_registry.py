@@ -0,0 +1,205 @@
+# PREDINATOR/predinator_core/model_registry.py
+"""
+Registry of per-dataset models for themed games (movies, athletes, locale packs...).
+
+Each dataset is a directory under DATASETS_DIR laid out like DATA_DIR. A model is
+loaded the first time its dataset is asked for and stays resident while it is hot;
+once the estimated size of all resident models exceeds the memory budget, the least
+recently used ones are evicted. A worker therefore only pays for the packs its
+traffic actually touches.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from .compiled_model import CANDIDATE_ARRAYS, NODE_ARRAYS
+from .shared_model import CURRENT_POINTER
+from .utils import DATASETS_DIR, DatasetPaths, read_model_version
+
+logger = logging.getLogger(__name__)
+
+DATASET_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+HOSTING_PRIVATE = 'private'
+HOSTING_SHARED = 'shared'
+
+
+def is_valid_dataset_id(dataset_id):
+    # Dataset ids become directory names, so anything that could traverse paths is rejected.
+    return bool(dataset_id) and bool(DATASET_ID_PATTERN.match(dataset_id))
+
+
+def list_datasets(datasets_dir=DATASETS_DIR):
+    """Dataset ids that have a model directory, sorted."""
+    try:
+        names = os.listdir(datasets_dir)
+    except FileNotFoundError:
+        return []
+    return sorted(
+        name for name in names
+        if is_valid_dataset_id(name) and os.path.isdir(os.path.join(datasets_dir, name, 'model'))
+    )
+
+
+def estimate_model_bytes(tree_handler):
+    """
+    Approximate resident size of a loaded model: the compiled arrays and names, plus the
+    scikit-learn tree arrays when the handler holds a fitted estimator. Memory-mapped
+    shared models are counted too, even though their pages can be shared across workers.
+    """
+    compiled = getattr(tree_handler, 'compiled', None)
+    if compiled is None:
+        return 0
+    total = sum(getattr(compiled, name).nbytes for name in NODE_ARRAYS + CANDIDATE_ARRAYS)
+    names = compiled.class_names
+    if hasattr(names, 'blob'):
+        total += names.blob.nbytes + names.offsets.nbytes
+    else:
+        total += sum(len(name) + 49 for name in names) # str object overhead on CPython
+    total += sum(len(q['text']) + 49 for q in compiled.questions)
+    sk_tree = getattr(getattr(tree_handler, 'model', None), 'tree_', None)
+    if sk_tree is not None:
+        total += sum(getattr(sk_tree, name).nbytes for name in
+                     ('feature', 'threshold', 'children_left', 'children_right', 'value', 'impurity', 'n_node_samples'))
+    return int(total)
+
+
+def load_dataset_tree_handler(dataset_id, hosting=HOSTING_PRIVATE):
+    """Loads one dataset's model. Returns a tree handler, or None if the dataset has no usable model."""
+    paths = DatasetPaths(dataset_id)
+    if hosting == HOSTING_SHARED:
+        from .shared_model import SharedTreeHandler
+        tree_handler = SharedTreeHandler(paths.shared_model_dir, model_dir=paths.model_dir)
+    else:
+        from .tree_builder import create_tree_handler
+        tree_handler = create_tree_handler(model_dir=paths.model_dir)
+    return tree_handler if tree_handler.load_model_and_metadata() else None
+
+
+class _RegistryEntry:
+    def __init__(self, tree_handler, nbytes, version_file, published_version):
+        self.tree_handler = tree_handler
+        self.nbytes = nbytes
+        self.version_file = version_file
+        # What the version file said just before loading. Staleness compares against this rather than
+        # the loaded model's own version, which differs when the file predates a compile format change.
+        self.published_version = published_version
+        self.checked_at = time.monotonic()
+
+
+class ModelRegistry:
+    """
+    Thread-safe LRU of tree handlers keyed by dataset id.
+
+    get() returns the resident handler on a hit. On a miss it loads the model (only one
+    thread per dataset does the loading) and evicts least recently used datasets until
+    the estimated total fits memory_budget_bytes. The model just loaded is never evicted,
+    so one model larger than the budget still serves. Resident models are reloaded when
+    their dataset's VERSION file changes, checked at most every reload_check_interval seconds.
+    """
+    def __init__(self, memory_budget_bytes, loader=load_dataset_tree_handler, hosting=HOSTING_PRIVATE,
+                 reload_check_interval=5.0):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.loader = loader
+        self.hosting = hosting
+        self.reload_check_interval = reload_check_interval
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_failures = 0
+
+    def get(self, dataset_id):
+        if not is_valid_dataset_id(dataset_id):
+            return None
+        with self._lock:
+            entry = self._entries.get(dataset_id)
+            if entry is not None:
+                self._entries.move_to_end(dataset_id)
+                self.hits += 1
+        if entry is not None:
+            if not self._is_stale(entry):
+                return entry.tree_handler
+            logger.info("Dataset '%s' has a new model version; reloading.", dataset_id)
+        elif not os.path.isdir(DatasetPaths(dataset_id).model_dir):
+            with self._lock:
+                self.load_failures += 1
+            return None # Unknown dataset: no load lock is created, so bogus ids cannot grow the registry
+        return self._load(dataset_id, replacing=entry)
+
+    def _is_stale(self, entry):
+        now = time.monotonic()
+        if now - entry.checked_at < self.reload_check_interval:
+            return False
+        entry.checked_at = now
+        published = read_model_version(entry.version_file)
+        return published is not None and published != entry.published_version
+
+    def _load(self, dataset_id, replacing=None):
+        with self._lock:
+            load_lock = self._load_locks.setdefault(dataset_id, threading.Lock())
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(dataset_id)
+                if entry is not None and entry is not replacing:
+                    # Another thread finished loading while this one waited on the lock.
+                    return entry.tree_handler
+                if replacing is None:
+                    self.misses += 1
+
+            paths = DatasetPaths(dataset_id)
+            version_file = (os.path.join(paths.shared_model_dir, CURRENT_POINTER)
+                            if self.hosting == HOSTING_SHARED else paths.version_file)
+            published_version = read_model_version(version_file)
+            started = time.perf_counter()
+            try:
+                tree_handler = self.loader(dataset_id, hosting=self.hosting)
+            except Exception as e:
+                logger.error("Error loading dataset '%s': %s", dataset_id, e)
+                tree_handler = None
+            if tree_handler is None:
+                with self._lock:
+                    self.load_failures += 1
+                # A failed reload keeps serving the model that is already resident.
+                return replacing.tree_handler if replacing else None
+
+            entry = _RegistryEntry(tree_handler, estimate_model_bytes(tree_handler), version_file, published_version)
+            with self._lock:
+                self._entries[dataset_id] = entry
+                self._entries.move_to_end(dataset_id)
+                self._evict_locked(keep=dataset_id)
+            logger.info("Loaded dataset '%s'.", dataset_id, extra={
+                'dataset': dataset_id, 'model_version': tree_handler.model_version,
+                'nbytes': entry.nbytes, 'duration_ms': round((time.perf_counter() - started) * 1000, 1)})
+            return tree_handler
+
+    def _evict_locked(self, keep):
+        resident = sum(entry.nbytes for entry in self._entries.values())
+        for dataset_id in list(self._entries):
+            if resident <= self.memory_budget_bytes:
+                break
+            if dataset_id == keep:
+                continue
+            resident -= self._entries.pop(dataset_id).nbytes
+            self.evictions += 1
+            logger.info("Evicted dataset '%s' to stay within the memory budget.", dataset_id)
+
+    def evict(self, dataset_id):
+        with self._lock:
+            return self._entries.pop(dataset_id, None) is not None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'load_failures': self.load_failures,
+                'resident': list(self._entries),
+                'resident_bytes': sum(entry.nbytes for entry in self._entries.values()),
+                'memory_budget_bytes': self.memory_budget_bytes,
+            }
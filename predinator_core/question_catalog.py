@@ -0,0 +1,61 @@
+# PREDINATOR/predinator_core/question_catalog.py
+import hashlib
+import logging
+import os
+import threading
+
+from .data_manager import load_questions
+from .utils import QUESTIONS_FILE
+
+logger = logging.getLogger(__name__)
+
+
+class QuestionCatalogSnapshot:
+    def __init__(self, version, questions):
+        self.version = version
+        self.questions = tuple(questions) # Shared between requests, never mutated
+        self.by_attribute_id = {q.attribute_id: q for q in self.questions}
+
+
+class QuestionCatalog:
+    """
+    Process-wide, versioned view of questions.txt.
+
+    The file is only re-parsed when its size or mtime changes, so callers can ask for
+    the current snapshot on every request. The version is a hash of the file content,
+    so every worker agrees on it.
+    """
+    def __init__(self, questions_file=QUESTIONS_FILE):
+        self.questions_file = questions_file
+        self._snapshot = None
+        self._file_signature = None
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        try:
+            stat = os.stat(self.questions_file)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            signature = None
+
+        if self._snapshot is not None and signature == self._file_signature:
+            return self._snapshot
+
+        with self._lock:
+            if self._snapshot is None or signature != self._file_signature:
+                self._snapshot = self._load()
+                self._file_signature = signature
+            return self._snapshot
+
+    def _load(self):
+        try:
+            with open(self.questions_file, 'rb') as f:
+                version = hashlib.sha256(f.read()).hexdigest()[:12]
+        except FileNotFoundError:
+            version = None
+        snapshot = QuestionCatalogSnapshot(version, load_questions(self.questions_file))
+        logger.info("Loaded %s questions (version %s).", len(snapshot.questions), version)
+        return snapshot
+
+
+question_catalog = QuestionCatalog()
@@ -0,0 +1,106 @@
+# PREDINATOR/predinator_core/question_selection.py
+"""
+Picks the few questions worth asking when a player teaches a new character, and fills
+in the rest from similar characters.
+
+The player's game path already places the new character in the tree. What remains is
+telling it apart from the characters it landed next to, so only questions that split
+those nearest neighbors are put on the form. Unasked answers are imputed from the
+closest known characters when they agree, and left as "don't know" otherwise.
+"""
+import numpy as np
+import pandas as pd
+
+NEIGHBOR_COUNT = 32 # Characters closest to the player's answers that the asked questions should separate
+QUESTION_BUDGET = 10 # Questions asked on top of the ones already answered during the game
+IMPUTE_NEIGHBORS = 5
+IMPUTE_AGREEMENT = 0.8 # Share of the known neighbor answers that must agree before one is imputed
+IMPUTE_MIN_KNOWN = 3
+
+
+def _answer_values(frame):
+    """float32 matrix of 1.0 / 0.0, with NaN where the answer is unknown."""
+    values = frame.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float32)
+    return np.where(np.isnan(values), np.nan, (values > 0.5).astype(np.float32))
+
+
+def nearest_rows(df_celebs, known_answers, count):
+    """
+    Positional indices of the count rows closest to known_answers ({attr_id: 1.0/0.0/None}).
+    The distance counts mismatched answers; an unknown answer in the data counts as half a mismatch.
+    """
+    columns = [attr_id for attr_id, answer in known_answers.items()
+               if answer is not None and not pd.isna(answer) and attr_id in df_celebs.columns]
+    n_rows = len(df_celebs)
+    if not columns:
+        return np.arange(min(count, n_rows))
+    values = _answer_values(df_celebs[columns])
+    target = np.array([1.0 if known_answers[attr_id] > 0.5 else 0.0 for attr_id in columns], dtype=np.float32)
+    distance = np.where(np.isnan(values), 0.5, values != target).sum(axis=1)
+    if count < n_rows:
+        candidates = np.argpartition(distance, count - 1)[:count]
+        return candidates[np.argsort(distance[candidates], kind='stable')]
+    return np.argsort(distance, kind='stable')
+
+
+def select_distinguishing_questions(df_celebs, answered, candidate_attrs, extra_names=(),
+                                    budget=QUESTION_BUDGET, neighbor_count=NEIGHBOR_COUNT):
+    """
+    Greedily picks up to budget attribute ids from candidate_attrs that split the nearest
+    neighbors of the answered questions (plus the rows named in extra_names, e.g. the wrong
+    guess) into as many distinguishable groups as possible. Each step takes the question
+    that separates the most neighbor pairs still sharing all answers picked so far, so
+    whatever the player answers, the new character can match at most a handful of them.
+    """
+    candidate_attrs = [attr_id for attr_id in candidate_attrs if attr_id in df_celebs.columns]
+    if not candidate_attrs or budget <= 0:
+        return []
+    rows = nearest_rows(df_celebs, answered, neighbor_count)
+    if extra_names:
+        named = np.flatnonzero(df_celebs['CelebrityName'].isin(list(extra_names)).to_numpy())
+        rows = np.union1d(rows, named)
+    if len(rows) < 2:
+        return []
+
+    # The tree reads unknown answers as No, so separation is judged the same way.
+    neighbors = np.nan_to_num(_answer_values(df_celebs.iloc[rows][candidate_attrs]), nan=0.0)
+    groups = np.zeros(len(rows), dtype=np.int64)
+    chosen = []
+    while len(chosen) < budget:
+        _, group_ids = np.unique(groups, return_inverse=True)
+        membership = np.zeros((group_ids.max() + 1, len(rows)), dtype=np.float32)
+        membership[group_ids.ravel(), np.arange(len(rows))] = 1.0
+        yes = membership @ neighbors
+        sizes = membership.sum(axis=1, keepdims=True)
+        separated = (yes * (sizes - yes)).sum(axis=0)
+        separated[chosen] = 0.0
+        best = int(np.argmax(separated))
+        if separated[best] <= 0.0:
+            break # Every neighbor group left has identical answers on every candidate
+        chosen.append(best)
+        groups = group_ids.ravel() * 2 + neighbors[:, best].astype(np.int64)
+    return [candidate_attrs[index] for index in chosen]
+
+
+def impute_answers(df_celebs, known_answers, missing_attrs, neighbor_count=IMPUTE_NEIGHBORS,
+                   agreement=IMPUTE_AGREEMENT, min_known=IMPUTE_MIN_KNOWN):
+    """
+    {attr_id: 1.0/0.0} for the missing_attrs on which the characters closest to known_answers
+    agree. Attributes without enough agreement are left out, so the caller keeps them unknown.
+    """
+    missing_attrs = [attr_id for attr_id in missing_attrs if attr_id in df_celebs.columns]
+    if not missing_attrs or len(df_celebs) == 0:
+        return {}
+    rows = nearest_rows(df_celebs, known_answers, neighbor_count)
+    values = _answer_values(df_celebs.iloc[rows][missing_attrs])
+    known = (~np.isnan(values)).sum(axis=0)
+    yes = np.nansum(values, axis=0)
+    imputed = {}
+    for index, attr_id in enumerate(missing_attrs):
+        if known[index] < min(min_known, len(rows)):
+            continue
+        if yes[index] >= agreement * known[index]:
+            imputed[attr_id] = 1.0
+        elif known[index] - yes[index] >= agreement * known[index]:
+            imputed[attr_id] = 0.0
+    return imputed
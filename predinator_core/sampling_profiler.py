@@ -0,0 +1,151 @@
+# PREDINATOR/predinator_core/sampling_profiler.py
+"""
+Statistical profiler for single requests, writing collapsed stacks ("a;b;c 12" per line,
+the input format of flamegraph.pl and speedscope).
+
+One daemon thread per process wakes every interval while at least one profile is
+running and records the current stack of each profiled thread from sys._current_frames(),
+counting it in every profile running on that thread.
+Nothing is traced, so the profiled code runs at full speed; the cost is the sampler's
+own stack walks (tens of microseconds per sample), and zero while no profile runs.
+"""
+import collections
+import functools
+import os
+import re
+import sys
+import threading
+import time
+
+from .utils import PROFILE_DIR
+
+DEFAULT_INTERVAL = 0.005 # Seconds between samples
+MAX_STACK_DEPTH = 128
+PROFILE_SUFFIX = '.collapsed'
+_UNSAFE_NAME_CHARS = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+@functools.lru_cache(maxsize=None)
+def _frame_label(code):
+    directory, file_name = os.path.split(code.co_filename)
+    return f"{code.co_name} ({os.path.basename(directory)}/{file_name}:{code.co_firstlineno})"
+
+
+def _collapse(frame):
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return ';'.join(labels)
+
+
+class Profile:
+    """The samples taken from one thread between start() and stop()."""
+    def __init__(self, thread_id):
+        self.thread_id = thread_id
+        self.stacks = collections.Counter()
+        self.started = time.perf_counter()
+        self.duration = None
+
+    @property
+    def sample_count(self):
+        return sum(self.stacks.values())
+
+    def collapsed_lines(self):
+        return [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+
+
+class SamplingProfiler:
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        self.interval = interval
+        self._profiles = collections.defaultdict(list) # thread id -> profiles running on that thread
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self, thread_id=None):
+        """Starts sampling a thread (default: the calling one) and returns its Profile."""
+        profile = Profile(threading.get_ident() if thread_id is None else thread_id)
+        with self._lock:
+            self._profiles[profile.thread_id].append(profile)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='predinator-profiler', daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return profile
+
+    def stop(self, profile):
+        with self._lock:
+            running = self._profiles.get(profile.thread_id, [])
+            if profile in running:
+                running.remove(profile)
+                if not running:
+                    del self._profiles[profile.thread_id]
+            if not self._profiles:
+                self._wake.clear()
+        profile.duration = time.perf_counter() - profile.started
+        return profile
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            with self._lock:
+                profiles = {thread_id: list(running) for thread_id, running in self._profiles.items()}
+            if not profiles:
+                continue
+            frames = sys._current_frames()
+            for thread_id, running in profiles.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    # Overlapping profiles of one thread (async requests on the event loop) all get the sample.
+                    stack = _collapse(frame)
+                    for profile in running:
+                        profile.stacks[stack] += 1
+
+
+def profile_file_name(view_name, model_version, when=None):
+    """<ms timestamp>-<pid>-<view>-<model>.collapsed, with the tags reduced to safe characters."""
+    when = time.time() if when is None else when
+    view = _UNSAFE_NAME_CHARS.sub('.', view_name or 'unknown').strip('.') or 'unknown'
+    model = _UNSAFE_NAME_CHARS.sub('', model_version or '') or 'none'
+    return f"{int(when * 1000)}-{os.getpid()}-{view}-{model}{PROFILE_SUFFIX}"
+
+
+def parse_profile_file_name(file_name):
+    """(timestamp_ms, pid, view_name, model_version) from a profile_file_name(), or None."""
+    if not file_name.endswith(PROFILE_SUFFIX):
+        return None
+    parts = file_name[:-len(PROFILE_SUFFIX)].split('-')
+    if len(parts) < 4 or not parts[0].isdigit() or not parts[1].isdigit():
+        return None
+    return int(parts[0]), int(parts[1]), '-'.join(parts[2:-1]), parts[-1]
+
+
+def write_profile(profile, view_name, model_version, profile_dir=PROFILE_DIR):
+    """Writes a finished profile as collapsed stacks and returns the file path (None if it has no samples)."""
+    lines = profile.collapsed_lines()
+    if not lines:
+        return None
+    os.makedirs(profile_dir, exist_ok=True)
+    path = os.path.join(profile_dir, profile_file_name(view_name, model_version))
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_collapsed(path):
+    """Counter of stack -> samples from a collapsed-stack file."""
+    stacks = collections.Counter()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            if stack and count.isdigit():
+                stacks[stack] += int(count)
+    return stacks
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,35 @@
+# PREDINATOR/predinator_core/serving.py
+"""
+Lean serving entry point: plays games from a published compiled model using only
+the standard library and NumPy.
+
+Nothing here imports pandas, scikit-learn, joblib or Django. Those are pulled in
+lazily, and only when a training or learning path is first used (for example
+SharedTreeHandler.train, or the fallback below when no model has been published).
+
+    from predinator_core.serving import load_serving_engine
+    engine = load_serving_engine()
+    engine.start_new_game()
+    question, is_leaf = engine.get_next_question()
+"""
+import logging
+
+from .game_engine import GameEngine
+from .shared_model import SharedTreeHandler, read_shared_version
+from .utils import SHARED_MODEL_DIR
+
+logger = logging.getLogger(__name__)
+
+
+def load_serving_engine(shared_dir=SHARED_MODEL_DIR):
+    """
+    Returns a GameEngine attached to the shared model in `shared_dir`, or None if no
+    model could be loaded. If nothing has been published yet, the private joblib model
+    is loaded and published once, which is the one case that imports scikit-learn.
+    """
+    if read_shared_version(shared_dir) is None:
+        logger.info("No published model in %s; falling back to the training stack to publish one.", shared_dir)
+    tree_handler = SharedTreeHandler(shared_dir)
+    if not tree_handler.load_model_and_metadata():
+        return None
+    return GameEngine(tree_handler=tree_handler)
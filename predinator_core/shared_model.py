@@ -0,0 +1,200 @@
+# PREDINATOR/predinator_core/shared_model.py
+"""
+Shared model hosting: one loader publishes the compiled tree as memory-mappable
+files, and every worker attaches to them read-only.
+
+Layout under SHARED_MODEL_DIR:
+    <version>/        one directory per published model (see save_compiled_model)
+    CURRENT           name of the version workers should attach to
+    .publish.lock     serializes publishers so only one process does the loading
+
+Because the arrays are mmap'd rather than unpickled, N workers cost one copy of the
+tree in the page cache instead of N private heaps, and attaching is nearly free.
+Publishing a retrained model writes a new version directory and swaps CURRENT.
+"""
+import logging
+import os
+import shutil
+from contextlib import contextmanager
+
+from .compiled_model import save_compiled_model, load_compiled_model, export_game_tree
+from .metrics import MODEL_LOAD_SECONDS
+from .utils import SHARED_MODEL_DIR, MODEL_DIR
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError: # Windows development machines: no cross-process lock, a single worker is assumed.
+    fcntl = None
+
+CURRENT_POINTER = 'CURRENT'
+PUBLISH_LOCK = '.publish.lock'
+SHARED_KEEP_VERSIONS = 3
+
+
+@contextmanager
+def _publish_lock(shared_dir):
+    os.makedirs(shared_dir, exist_ok=True)
+    with open(os.path.join(shared_dir, PUBLISH_LOCK), 'w') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_shared_version(shared_dir=SHARED_MODEL_DIR):
+    try:
+        with open(os.path.join(shared_dir, CURRENT_POINTER), 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def publish_shared_model(compiled, shared_dir=SHARED_MODEL_DIR):
+    """Writes a compiled model into its own version directory and points CURRENT at it."""
+    with _publish_lock(shared_dir):
+        return _publish_locked(compiled, shared_dir)
+
+
+def _publish_locked(compiled, shared_dir):
+    version = compiled.version
+    version_dir = os.path.join(shared_dir, version)
+    if not os.path.isdir(version_dir):
+        staging_dir = f"{version_dir}.tmp{os.getpid()}"
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        save_compiled_model(compiled, staging_dir)
+        os.replace(staging_dir, version_dir)
+
+    pointer_path = os.path.join(shared_dir, CURRENT_POINTER)
+    tmp_pointer = f"{pointer_path}.tmp{os.getpid()}"
+    with open(tmp_pointer, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(tmp_pointer, pointer_path)
+    _prune_old_versions(shared_dir, keep_version=version)
+    logger.info("Published model version %s to %s.", version, shared_dir)
+    return version
+
+
+def _prune_old_versions(shared_dir, keep_version):
+    # Workers still mapping a removed version keep their pages until they re-attach (POSIX unlink semantics).
+    version_dirs = []
+    for name in os.listdir(shared_dir):
+        path = os.path.join(shared_dir, name)
+        if os.path.isdir(path) and '.tmp' not in name:
+            version_dirs.append((os.path.getmtime(path), name, path))
+    version_dirs.sort(reverse=True)
+    for _, name, path in version_dirs[SHARED_KEEP_VERSIONS:]:
+        if name != keep_version:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def attach_shared_model(shared_dir=SHARED_MODEL_DIR, loader=None):
+    """
+    Attaches to the CURRENT shared model. If nothing has been published yet, the first
+    process to take the publish lock runs `loader` (which returns a CompiledModel) and
+    publishes it; everyone else waits on the lock and then attaches to that result.
+    """
+    version = read_shared_version(shared_dir)
+    if version is None and loader is not None:
+        with _publish_lock(shared_dir):
+            version = read_shared_version(shared_dir)
+            if version is None:
+                compiled = loader()
+                if compiled is None:
+                    return None
+                version = _publish_locked(compiled, shared_dir)
+    if version is None:
+        return None
+    return load_compiled_model(os.path.join(shared_dir, version))
+
+
+class SharedQuestion:
+    """Same read-only surface as data_manager.Question, built from the shared question texts."""
+    def __init__(self, attribute_id, text, possible_answers):
+        self.attribute_id = attribute_id
+        self.text = text
+        self.possible_answers = list(possible_answers)
+
+    def __repr__(self):
+        return f"Question(id='{self.attribute_id}', text='{self.text}')"
+
+
+class SharedTreeHandler:
+    """
+    Drop-in for AkinatorTree on the serving path, backed by an attached shared model.
+
+    `model` stands in for the scikit-learn estimator: callers only check that it is
+    loaded and use its identity to notice a new model. Training is delegated to a full
+    AkinatorTree created on first use, which publishes its result for every worker.
+    """
+    def __init__(self, shared_dir=SHARED_MODEL_DIR, model_dir=MODEL_DIR):
+        self.shared_dir = shared_dir
+        self.model_dir = model_dir # Where the trainer keeps the private joblib model
+        self.compiled = None
+        self.questions_map = {}
+        self._trainer = None
+
+    @property
+    def model(self):
+        return self.compiled
+
+    @property
+    def model_version(self):
+        return self.compiled.version if self.compiled else None
+
+    @property
+    def feature_columns(self):
+        return self.compiled.feature_columns if self.compiled else []
+
+    @MODEL_LOAD_SECONDS.timed
+    def load_model_and_metadata(self):
+        logger.info("Attaching to shared model in %s...", self.shared_dir)
+        try:
+            compiled = attach_shared_model(self.shared_dir, loader=self._load_private_compiled)
+        except Exception as e:
+            logger.error("Error attaching to shared model: %s", e)
+            return False
+        if compiled is None:
+            logger.warning("No model available to publish. Please run train_model.py.")
+            return False
+        self._adopt(compiled)
+        logger.info("Attached to model version %s.", compiled.version)
+        return True
+
+    def train(self, df_celebs, questions_list):
+        trainer = self._get_trainer()
+        if not trainer.train(df_celebs, questions_list):
+            return False
+        publish_shared_model(trainer.compiled, self.shared_dir)
+        return self.load_model_and_metadata()
+
+    def export_game_tree(self, export_dir=None):
+        if not self.compiled:
+            return None
+        return export_game_tree(self.compiled, export_dir or os.path.join(self.model_dir, 'export'))
+
+    def get_question_by_attribute_id(self, attr_id):
+        return self.questions_map.get(attr_id)
+
+    def _adopt(self, compiled):
+        questions_map = {
+            attr_id: SharedQuestion(attr_id, q['text'], q['possible_answers'])
+            for attr_id, q in zip(compiled.feature_columns, compiled.questions)
+        }
+        # Compiled model is swapped last: it is the single reference the engine reads per step.
+        self.questions_map = questions_map
+        self.compiled = compiled
+
+    def _get_trainer(self):
+        if self._trainer is None:
+            from .tree_builder import create_tree_handler # scikit-learn is only needed once training is requested
+            self._trainer = create_tree_handler(model_dir=self.model_dir)
+        return self._trainer
+
+    def _load_private_compiled(self):
+        trainer = self._get_trainer()
+        return trainer.compiled if trainer.load_model_and_metadata() else None
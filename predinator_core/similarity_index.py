@@ -0,0 +1,142 @@
+# PREDINATOR/predinator_core/similarity_index.py
+"""
+Nearest-known-character search for games that end without a (correct) guess.
+
+The attribute matrix is stored bit-packed per attribute: for every question, one bitset
+over all characters saying who answered Yes, and one saying whose answer is known. A
+query XORs the player's answer into the Yes bitset of each answered question and masks
+it with the known bitset, giving one mismatch bit-plane per question (masked Hamming
+distance: unknown answers on either side never count). The planes are summed with a
+bit-sliced ripple-carry counter, 64 characters per word operation, and only the final
+counter planes are unpacked to per-character counts. A 20-answer query over a million
+characters touches about 2.5 MB per answered question and runs in milliseconds.
+"""
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from .utils import CELEBRITIES_FILE
+
+logger = logging.getLogger(__name__)
+
+ROW_CHUNK = 131072 # Rows converted from the DataFrame at a time; a multiple of 64
+NEAREST_COUNT = 5
+_ALL_ONES = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def _add_plane(counter, plane):
+    """Adds a 0/1 bit-plane into a bit-sliced counter (list of planes, least significant first)."""
+    carry = plane
+    for position, bits in enumerate(counter):
+        counter[position] = bits ^ carry
+        carry = bits & carry
+
+
+def _counter_values(counter, n_rows):
+    values = np.zeros(n_rows, dtype=np.int32)
+    for position, bits in enumerate(counter):
+        values += np.unpackbits(bits.view(np.uint8), bitorder='little')[:n_rows].astype(np.int32) << position
+    return values
+
+
+class CharacterIndex:
+    """Per-attribute Yes / known bitsets over every character of a dataset, plus their names."""
+    def __init__(self, names, feature_columns, yes_bits, known_bits):
+        self.names = names
+        self.feature_columns = list(feature_columns)
+        self.column_index = {attr_id: i for i, attr_id in enumerate(self.feature_columns)}
+        self.yes_bits = yes_bits # n_attributes x ceil(n_rows / 64) uint64
+        self.known_bits = known_bits
+
+    @classmethod
+    def from_dataframe(cls, df_celebs, chunk_rows=ROW_CHUNK):
+        import pandas as pd # Deferred: the index is built once, off the serving hot path
+        feature_columns = [col for col in df_celebs.columns if col != 'CelebrityName']
+        n_rows, n_bytes = len(df_celebs), (len(df_celebs) + 63) // 64 * 8
+        yes_bytes = np.zeros((len(feature_columns), n_bytes), dtype=np.uint8)
+        known_bytes = np.zeros((len(feature_columns), n_bytes), dtype=np.uint8)
+        for start in range(0, n_rows, chunk_rows):
+            chunk = df_celebs[feature_columns].iloc[start:start + chunk_rows]
+            values = chunk.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float32)
+            known = ~np.isnan(values)
+            packed_yes = np.packbits(known & (values > 0.5), axis=0, bitorder='little')
+            packed_known = np.packbits(known, axis=0, bitorder='little')
+            offset = start // 8
+            yes_bytes[:, offset:offset + len(packed_yes)] = packed_yes.T
+            known_bytes[:, offset:offset + len(packed_known)] = packed_known.T
+        names = df_celebs['CelebrityName'].astype(str).to_numpy(dtype=object)
+        return cls(names, feature_columns, yes_bytes.view(np.uint64), known_bytes.view(np.uint64))
+
+    def nearest(self, answers, k=NEAREST_COUNT, exclude=()):
+        """
+        [(name, mismatches, compared), ...] for the k characters closest to answers
+        ({attr_id: 1.0/0.0/None}). Unknown answers on either side are ignored; ties go to
+        the character that shares more known answers with the path.
+        """
+        bits = {}
+        for attr_id, answer in answers.items():
+            column = self.column_index.get(attr_id)
+            if column is not None and answer is not None and answer == answer:
+                bits[column] = answer > 0.5
+        n_rows = len(self.names)
+        if not bits or n_rows == 0:
+            return []
+
+        width = len(bits).bit_length()
+        n_words = self.yes_bits.shape[1]
+        mismatch_counter = [np.zeros(n_words, dtype=np.uint64) for _ in range(width)]
+        compared_counter = [np.zeros(n_words, dtype=np.uint64) for _ in range(width)]
+        for column, is_yes in bits.items():
+            known = self.known_bits[column]
+            differs = self.yes_bits[column] ^ (_ALL_ONES if is_yes else np.uint64(0))
+            _add_plane(mismatch_counter, differs & known)
+            _add_plane(compared_counter, known)
+        mismatches = _counter_values(mismatch_counter, n_rows)
+        compared = _counter_values(compared_counter, n_rows)
+
+        # Lexicographic key: fewest mismatches, then most answers compared. Excluded names are
+        # filtered from a slightly longer shortlist rather than looked up across every row.
+        # Rows sharing no known answer with the path rank last, so they never crowd real
+        # candidates out of the shortlist.
+        score = mismatches.astype(np.int64) * (len(bits) + 1) - compared
+        score[compared == 0] = np.iinfo(np.int64).max
+        exclude = set(exclude)
+        count = min(k + len(exclude), n_rows)
+        top = np.argpartition(score, count - 1)[:count] if count < n_rows else np.arange(n_rows)
+        top = top[np.argsort(score[top], kind='stable')]
+        results = [(str(self.names[i]), int(mismatches[i]), int(compared[i])) for i in top if compared[i] > 0]
+        return [result for result in results if result[0] not in exclude][:k]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_character_index(celebrities_file=CELEBRITIES_FILE):
+    """
+    The CharacterIndex for a dataset file, rebuilt only when the file changes (a learn
+    event rewrites it). Returns None if the file cannot be read.
+    """
+    try:
+        stat = os.stat(celebrities_file)
+    except FileNotFoundError:
+        return None
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _indexes_lock:
+        cached = _indexes.get(celebrities_file)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        from .data_manager import load_celebrity_data
+        started = time.perf_counter()
+        df_celebs = load_celebrity_data(celebrities_file)
+        if df_celebs.empty or 'CelebrityName' not in df_celebs.columns:
+            return None
+        index = CharacterIndex.from_dataframe(df_celebs)
+        _indexes[celebrities_file] = (signature, index)
+        logger.info("Indexed characters for nearest-match search.", extra={
+            'characters': len(index.names), 'attributes': len(index.feature_columns),
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1)})
+        return index
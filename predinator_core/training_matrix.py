@@ -0,0 +1,124 @@
+# PREDINATOR/predinator_core/training_matrix.py
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+GROWTH_FACTOR = 1.5 # Spare row capacity, so appending a learned character rarely reallocates
+
+
+def _to_feature_matrix(frame):
+    """float32 matrix of the given feature columns; unparseable and missing values become 0.0 (No)."""
+    values = frame.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float32)
+    missing = np.isnan(values)
+    if missing.any():
+        counts = missing.sum(axis=0)
+        filled = {col: int(count) for col, count in zip(frame.columns, counts) if count}
+        logger.info("NaN values found. Filling with 0.0 (No). Columns: %s", filled)
+        values[missing] = 0.0
+    return values
+
+
+class PreparedTrainingData:
+    """
+    The training matrix kept between retrains: a contiguous float32 feature matrix, the
+    label array and the sorted class names (the same classes_ a LabelEncoder would fit).
+
+    update() compares the incoming DataFrame with what is already prepared. Rows appended
+    after the prepared ones and feature columns appended after the prepared ones are
+    converted as deltas; anything else (removed or reordered rows or columns) triggers a
+    full rebuild. Rows already prepared are assumed unchanged, which holds for every
+    learning flow: they only append characters or add question columns.
+
+    Snapshots returned by update() are never modified afterwards, so a fit can keep using
+    one while a later update appends rows or remaps labels.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.feature_columns = []
+        self.n_rows = 0
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._row_names = np.empty(0, dtype=object)
+        self._labels = np.empty(0, dtype=np.int64)
+        self.class_names = np.empty(0, dtype=object)
+
+    def update(self, df_celebs, feature_columns):
+        """Returns (X, y, class_names) for df_celebs, preparing only what changed since the last call."""
+        with self._lock:
+            names = df_celebs['CelebrityName'].to_numpy(dtype=object)
+            n_old = self.n_rows
+            reusable = (
+                n_old > 0
+                and len(names) >= n_old
+                and feature_columns[:len(self.feature_columns)] == self.feature_columns
+                and np.array_equal(names[:n_old], self._row_names[:n_old])
+            )
+            if not reusable:
+                self._rebuild(df_celebs, feature_columns, names)
+                mode = 'full'
+            else:
+                new_columns = feature_columns[len(self.feature_columns):]
+                if new_columns:
+                    self._add_columns(df_celebs, new_columns)
+                if len(names) > n_old:
+                    self._append_rows(df_celebs, names[n_old:])
+                mode = 'delta' if new_columns or len(names) > n_old else 'unchanged'
+            logger.info("Training matrix %s (%d rows prepared, %d total).",
+                        mode, self.n_rows - n_old if mode != 'full' else self.n_rows, self.n_rows)
+            return self._matrix[:self.n_rows], self._labels[:self.n_rows], self.class_names
+
+    def _rebuild(self, df_celebs, feature_columns, names):
+        values = _to_feature_matrix(df_celebs[feature_columns])
+        self.class_names, labels = np.unique(names, return_inverse=True)
+        self._matrix = self._grow(values, len(names), len(names))
+        self._row_names = self._grow(names, len(names), len(names))
+        self._labels = self._grow(labels.astype(np.int64), len(names), len(names))
+        self.feature_columns = list(feature_columns)
+        self.n_rows = len(names)
+
+    def _add_columns(self, df_celebs, new_columns):
+        # Row-major layout means a new column reallocates the matrix; questions are added far less often than characters.
+        added = _to_feature_matrix(df_celebs[new_columns].iloc[:self.n_rows])
+        matrix = np.empty((self._matrix.shape[0], len(self.feature_columns) + len(new_columns)), dtype=np.float32)
+        matrix[:self.n_rows, :len(self.feature_columns)] = self._matrix[:self.n_rows]
+        matrix[:self.n_rows, len(self.feature_columns):] = added
+        self._matrix = matrix
+        self.feature_columns = self.feature_columns + list(new_columns)
+
+    def _append_rows(self, df_celebs, new_names):
+        start, end = self.n_rows, self.n_rows + len(new_names)
+        values = _to_feature_matrix(df_celebs[self.feature_columns].iloc[start:])
+
+        # Binary searches against the already sorted class names, instead of re-sorting them all.
+        candidates = np.unique(new_names)
+        positions = np.searchsorted(self.class_names, candidates)
+        known = positions < len(self.class_names)
+        known[known] = self.class_names[positions[known]] == candidates[known]
+        unseen = candidates[~known]
+        labels = self._labels
+        if len(unseen):
+            # Keep class ids in sorted-name order, as LabelEncoder would: every existing id moves
+            # up by the number of new names that sort before it. Done in a fresh array so earlier
+            # snapshots keep their labels.
+            shift = np.searchsorted(unseen, self.class_names)
+            labels = np.empty_like(self._labels)
+            labels[:start] = self._labels[:start] + shift[self._labels[:start]]
+            self.class_names = np.insert(self.class_names, np.searchsorted(self.class_names, unseen), unseen)
+
+        if end > self._matrix.shape[0]:
+            self._matrix = self._grow(self._matrix, start, end)
+            self._row_names = self._grow(self._row_names, start, end)
+            labels = self._grow(labels, start, end)
+        self._matrix[start:end] = values
+        self._row_names[start:end] = new_names
+        labels[start:end] = np.searchsorted(self.class_names, new_names)
+        self._labels = labels
+        self.n_rows = end
+
+    def _grow(self, array, used, needed):
+        grown = np.empty((int(needed * GROWTH_FACTOR) + 1,) + array.shape[1:], dtype=array.dtype)
+        grown[:used] = array[:used]
+        return grown
@@ -1,20 +1,27 @@
 # PREDINATOR/predinator_core/tree_builder.py
-import pandas as pd
 import numpy as np
 from sklearn.tree import DecisionTreeClassifier
 from sklearn.preprocessing import LabelEncoder
 import joblib
-from .utils import MODEL_SAVE_PATH, METADATA_SAVE_PATH
+import os
+from .utils import (MODEL_DIR, MODEL_FILE_NAME, METADATA_FILE_NAME, MODEL_VERSION_FILE_NAME, TREE_MODE,
+                    EARLY_GUESS_CONFIDENCE, write_model_version)
 from .data_manager import load_questions
-import time
+from .compiled_model import CompiledModel, export_game_tree
+from .metrics import MODEL_LOAD_SECONDS, RETRAINS, TRAIN_SECONDS
+from .training_matrix import PreparedTrainingData
+import logging
+
+logger = logging.getLogger(__name__)
 
 class AkinatorTree:
-    def __init__(self, ccp_alpha=0.0, max_depth=None, min_samples_leaf=1, min_samples_split=2):
+    def __init__(self, ccp_alpha=0.0, max_depth=None, min_samples_leaf=1, min_samples_split=2, model_dir=MODEL_DIR):
         """
         Initializes the AkinatorTree handler.
         Note: The DecisionTreeClassifier is instantiated here, but it will be refitted during training.
+        model_dir holds the saved model, its exports and VERSION file (one per dataset).
         """
-        print(f"[{time.ctime()}] TBUILDER: Initializing AkinatorTree instance.")
+        logger.debug("Initializing AkinatorTree instance.")
         self.model = DecisionTreeClassifier(
             criterion='gini',
             random_state=42,
@@ -26,116 +33,198 @@ class AkinatorTree:
         self.label_encoder = LabelEncoder()
         self.feature_columns = []
         self.questions_map = {}
+        self.compiled = None # CompiledModel snapshot of the live model, rebuilt on train/load
+        self._prepared = PreparedTrainingData()
+        self.excluded_features = set() # Questions left out of training, e.g. pruned as redundant by dataset_analysis
+        self.model_dir = model_dir
+        self.model_path = os.path.join(model_dir, MODEL_FILE_NAME)
+        self.metadata_path = os.path.join(model_dir, METADATA_FILE_NAME)
+        self.version_file = os.path.join(model_dir, MODEL_VERSION_FILE_NAME)
+        self.export_dir = os.path.join(model_dir, 'export')
 
     def _prepare_data(self, df_celebs, questions_list):
-        print(f"[{time.ctime()}] TBUILDER: _prepare_data called.")
+        """
+        Builds the training matrix. The label encoder, feature columns and questions map are
+        returned as staged metadata instead of being assigned, so the live model keeps serving
+        consistent metadata until train() swaps everything in at once.
+        The matrix itself is kept between retrains (see PreparedTrainingData), so a retrain
+        after a learn event only converts the rows and columns that were added.
+        """
+        logger.debug("_prepare_data called.")
         if df_celebs.empty or 'CelebrityName' not in df_celebs.columns:
-            print(f"[{time.ctime()}] TBUILDER Error: Celebrity data is empty or missing 'CelebrityName'.")
-            return None, None
+            logger.error("Celebrity data is empty or missing 'CelebrityName'.")
+            return None, None, None
 
-        self.questions_map = {q.attribute_id: q for q in questions_list}
-        self.feature_columns = [q.attribute_id for q in questions_list if q.attribute_id in df_celebs.columns]
+        questions_map = {q.attribute_id: q for q in questions_list}
+        feature_columns = [q.attribute_id for q in questions_list
+                           if q.attribute_id in df_celebs.columns and q.attribute_id not in self.excluded_features]
 
-        if not self.feature_columns:
-            print(f"[{time.ctime()}] TBUILDER Error: No matching feature columns found.")
-            return None, None
+        if not feature_columns:
+            logger.error("No matching feature columns found.")
+            return None, None, None
 
-        X = df_celebs[self.feature_columns].copy()
-        y_raw = df_celebs['CelebrityName']
+        X, y, class_names = self._prepared.update(df_celebs, feature_columns)
 
-        # Ensure all feature columns are numeric, coercing errors
-        for col in X.columns:
-            X[col] = pd.to_numeric(X[col], errors='coerce')
+        if len(class_names) < 2:
+            logger.error("Need at least two unique celebrities to train. Found %s.", len(class_names))
+            return None, None, None
 
-        # Handle potential NaN values that might result from coercion or new questions
-        if X.isnull().values.any():
-            nan_counts = X.isnull().sum()
-            print(f"[{time.ctime()}] TBUILDER Note: NaN values found. Filling with 0.0 (No). Columns:\n{nan_counts[nan_counts > 0]}")
-            X = X.fillna(0.0) # Fill any remaining NaNs with 0.0 for robustness
-
-        if len(y_raw.unique()) < 2:
-            print(f"[{time.ctime()}] TBUILDER Error: Need at least two unique celebrities to train. Found {len(y_raw.unique())}.")
-            return None, None
-            
-        y = self.label_encoder.fit_transform(y_raw)
-        print(f"[{time.ctime()}] TBUILDER: Data prepared. X shape: {X.shape}, y shape: {y.shape}")
-        return X, y
+        label_encoder = LabelEncoder()
+        label_encoder.classes_ = class_names # Maintained incrementally by PreparedTrainingData, same as a fit
+        staged_metadata = {
+            'label_encoder': label_encoder,
+            'feature_columns': feature_columns,
+            'questions_map': questions_map,
+        }
+        logger.info("Data prepared. X shape: %s, y shape: %s", X.shape, y.shape)
+        return X, y, staged_metadata
 
+    @TRAIN_SECONDS.timed
     def train(self, df_celebs, questions_list):
-        print(f"[{time.ctime()}] TBUILDER: train method called.")
-        X, y = self._prepare_data(df_celebs, questions_list)
+        logger.debug("train method called.")
+        RETRAINS.inc()
+        X, y, staged_metadata = self._prepare_data(df_celebs, questions_list)
 
-        if X is None or y is None or X.empty:
-            print(f"[{time.ctime()}] TBUILDER: Training aborted due to data preparation issues.")
+        if X is None or y is None or len(y) == 0:
+            logger.warning("Training aborted due to data preparation issues.")
             return False
         
-        # Create a new, clean model instance for this training session.
-        # This prevents any old state or invalid parameters from causing issues.
-        new_model = DecisionTreeClassifier(
-            criterion='gini',
-            random_state=42,
-            ccp_alpha=self.model.ccp_alpha,
-            max_depth=self.model.max_depth,
-            min_samples_leaf=self.model.min_samples_leaf,
-            min_samples_split=self.model.min_samples_split
-        )
-
-        print(f"[{time.ctime()}] TBUILDER: Attempting to fit new model with {X.shape[0]} samples.")
+        logger.info("Attempting to fit new model with %s samples.", X.shape[0])
         try:
-            new_model.fit(X, y)
-            print(f"[{time.ctime()}] TBUILDER: Model training complete.")
+            new_model = self._fit_model(X, y, staged_metadata)
+            logger.info("Model training complete.")
             
             # --- CRITICAL CHANGE ---
             # Only replace the live model if training was successful.
-            self.model = new_model
+            # Model and metadata are swapped together so concurrent games never see a mix of old and new.
+            self.model, self.label_encoder, self.feature_columns, self.questions_map = (
+                new_model,
+                staged_metadata['label_encoder'],
+                staged_metadata['feature_columns'],
+                staged_metadata['questions_map'],
+            )
+            self.compiled = self._compile()
             
             self.save_model_and_metadata()
+            self.export_game_tree()
             return True
         except Exception as e:
-            print(f"[{time.ctime()}] TBUILDER CRITICAL ERROR during model.fit(): {e}")
-            import traceback
-            traceback.print_exc()
+            logger.critical("Error during model.fit(): %s", e, exc_info=True)
             # --- CRITICAL CHANGE ---
             # DO NOT set self.model to None. Leave the old, working model intact.
-            print(f"[{time.ctime()}] TBUILDER: Training failed. The existing model will be kept active.")
+            logger.warning("Training failed. The existing model will be kept active.")
             return False
 
+    def _fit_model(self, X, y, staged_metadata):
+        # Create a new, clean model instance for this training session.
+        # This prevents any old state or invalid parameters from causing issues.
+        new_model = DecisionTreeClassifier(
+            criterion='gini',
+            random_state=42,
+            ccp_alpha=self.model.ccp_alpha,
+            max_depth=self.model.max_depth,
+            min_samples_leaf=self.model.min_samples_leaf,
+            min_samples_split=self.model.min_samples_split
+        )
+        new_model.fit(X, y)
+        return new_model
+
+    def _compile(self):
+        return CompiledModel.from_tree_handler(self)
+
+    def _is_fitted(self, model):
+        return getattr(model, 'tree_', None) is not None
+
     def save_model_and_metadata(self):
-        print(f"[{time.ctime()}] TBUILDER: Saving model and metadata...")
+        logger.info("Saving model and metadata...")
         try:
-            joblib.dump(self.model, MODEL_SAVE_PATH)
+            os.makedirs(self.model_dir, exist_ok=True)
             metadata = {
                 'label_encoder': self.label_encoder,
                 'feature_columns': self.feature_columns,
-                'questions_map': self.questions_map
+                'questions_map': self.questions_map,
+                'excluded_features': sorted(self.excluded_features),
             }
-            joblib.dump(metadata, METADATA_SAVE_PATH)
-            print(f"[{time.ctime()}] TBUILDER: Model and metadata saved successfully.")
+            # Written to temp files and renamed so other workers reloading never read a half-written file.
+            for obj, path in ((self.model, self.model_path), (metadata, self.metadata_path)):
+                tmp_path = f"{path}.tmp{os.getpid()}"
+                joblib.dump(obj, tmp_path)
+                os.replace(tmp_path, path)
+            # Bumped last: workers watching this file reload once both artifacts are complete.
+            write_model_version(self.model_version, self.version_file)
+            logger.info("Model and metadata saved successfully.")
         except Exception as e:
-            print(f"[{time.ctime()}] TBUILDER Error saving model/metadata: {e}")
+            logger.error("Error saving model/metadata: %s", e)
 
+    @MODEL_LOAD_SECONDS.timed
     def load_model_and_metadata(self):
-        print(f"[{time.ctime()}] TBUILDER: Attempting to load model and metadata...")
+        logger.info("Attempting to load model and metadata...")
         try:
-            loaded_model = joblib.load(MODEL_SAVE_PATH)
-            if not hasattr(loaded_model, 'tree_') or loaded_model.tree_ is None:
-                print(f"[{time.ctime()}] TBUILDER Error: Loaded model file is not a fitted tree.")
+            loaded_model = joblib.load(self.model_path)
+            if not self._is_fitted(loaded_model):
+                logger.error("Loaded model file is not a fitted tree.")
                 return False
             
             self.model = loaded_model
-            metadata = joblib.load(METADATA_SAVE_PATH)
+            metadata = joblib.load(self.metadata_path)
             self.label_encoder = metadata['label_encoder']
             self.feature_columns = metadata['feature_columns']
             self.questions_map = metadata.get('questions_map', {})
+            self.excluded_features = set(metadata.get('excluded_features', []))
+            self.compiled = self._compile()
             
-            print(f"[{time.ctime()}] TBUILDER: Model and metadata loaded successfully.")
+            logger.info("Model and metadata loaded successfully.")
             return True
         except FileNotFoundError:
-            print(f"[{time.ctime()}] TBUILDER: No pre-trained model found. Please run train_model.py.")
+            logger.warning("No pre-trained model found. Please run train_model.py.")
             return False
         except Exception as e:
-            print(f"[{time.ctime()}] TBUILDER: Error loading model or metadata: {e}")
+            logger.error("Error loading model or metadata: %s", e)
             return False
 
+    @property
+    def model_version(self):
+        return self.compiled.version if self.compiled else None
+
+    def export_game_tree(self, export_dir=None):
+        """Post-training step: publishes the static, content-hashed game tree for read-only play."""
+        if not self.compiled:
+            logger.error("No compiled model to export.")
+            return None
+        return export_game_tree(self.compiled, export_dir or self.export_dir)
+
     def get_question_by_attribute_id(self, attr_id):
-        return self.questions_map.get(attr_id)
\ No newline at end of file
+        return self.questions_map.get(attr_id)
+
+    def predict_batch(self, answers, early_guess_confidence=EARLY_GUESS_CONFIDENCE, stop_at_unanswered=False):
+        """
+        Guesses for many answer vectors at once (see CompiledModel.predict_batch).
+        answers is a DataFrame with one column per attribute_id (missing columns count as
+        "don't know") or an array whose columns follow feature_columns. NaN means "don't know".
+        Returns a DataFrame with one row per answer vector.
+        """
+        import pandas as pd
+        if not self.compiled:
+            raise ValueError("No trained model to predict with.")
+        if isinstance(answers, pd.DataFrame):
+            index = answers.index
+            answers = answers.reindex(columns=self.feature_columns).to_numpy(dtype=np.float32, na_value=np.nan)
+        else:
+            index = None
+        result = self.compiled.predict_batch(answers, early_guess_confidence, stop_at_unanswered)
+        return pd.DataFrame({
+            'guess': self.compiled.class_names_for(result['class_index']),
+            'confidence': result['confidence'],
+            'leaf': result['node'],
+            'questions': result['questions'],
+            'unanswered': result['unanswered'],
+            'stopped': result['stopped'],
+        }, index=index)
+
+
+def create_tree_handler(model_dir=MODEL_DIR, tree_mode=TREE_MODE, **tree_params):
+    """Builds the tree handler for the configured PREDINATOR_TREE_MODE."""
+    if tree_mode == 'hierarchical':
+        from .hierarchical_tree import HierarchicalAkinatorTree
+        return HierarchicalAkinatorTree(model_dir=model_dir, **tree_params)
+    return AkinatorTree(model_dir=model_dir, **tree_params)
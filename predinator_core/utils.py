@@ -1,21 +1,106 @@
 # PREDINATOR/predinator_core/utils.py
+import logging
+import math
 import os
 import numpy as np
-import pandas as pd # Keep for numeric_to_answer or other pd uses
-from django.conf import settings as django_settings
 
-BASE_DIR_PROJECT_ROOT = str(django_settings.BASE_DIR)
-DATA_DIR = os.path.join(BASE_DIR_PROJECT_ROOT, 'data')
+logger = logging.getLogger(__name__)
+
+# Same directory as settings.BASE_DIR, resolved without importing Django so the serving
+# path (see serving.py) can start with only the standard library and NumPy.
+BASE_DIR_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.environ.get('PREDINATOR_DATA_DIR') or os.path.join(BASE_DIR_PROJECT_ROOT, 'data')
 MODEL_DIR = os.path.join(DATA_DIR, 'model')
 QUESTIONS_FILE = os.path.join(DATA_DIR, 'questions.txt')
 CELEBRITIES_FILE = os.path.join(DATA_DIR, 'celebrities.parquet')
-MODEL_SAVE_PATH = os.path.join(MODEL_DIR, 'akinator_model.joblib')
-METADATA_SAVE_PATH = os.path.join(MODEL_DIR, 'akinator_metadata.joblib')
+MODEL_FILE_NAME = 'akinator_model.joblib'
+METADATA_FILE_NAME = 'akinator_metadata.joblib'
+MODEL_VERSION_FILE_NAME = 'VERSION'
+MODEL_SAVE_PATH = os.path.join(MODEL_DIR, MODEL_FILE_NAME)
+METADATA_SAVE_PATH = os.path.join(MODEL_DIR, METADATA_FILE_NAME)
+GAME_TREE_EXPORT_DIR = os.path.join(MODEL_DIR, 'export')
+SHARED_MODEL_DIR = os.path.join(MODEL_DIR, 'shared')
+MODEL_VERSION_FILE = os.path.join(MODEL_DIR, MODEL_VERSION_FILE_NAME)
+
+# 'flat' trains one DecisionTreeClassifier over every character; 'hierarchical' trains a small router
+# over coarse attributes plus one subtree per category (see hierarchical_tree.py).
+TREE_MODE = os.environ.get('PREDINATOR_TREE_MODE', 'flat')
+
+# A game stops asking and guesses at an internal node once its best candidate holds at least this
+# share of the node's training rows (see CompiledModel.candidates); above 1.0 disables early guesses.
+EARLY_GUESS_CONFIDENCE = float(os.environ.get('PREDINATOR_EARLY_GUESS_CONFIDENCE', '0.9'))
+
+# 'path' follows one child per answer; 'beam' keeps the best BEAM_WIDTH branches, weighing each answer
+# as wrong with probability ANSWER_ERROR_RATE, and resumes on another branch after a rejected guess
+# (see CompiledModel.beam_search). Both ask the same questions until the first guess.
+TRAVERSAL_MODES = ('path', 'beam')
+TRAVERSAL_MODE = os.environ.get('PREDINATOR_TRAVERSAL', 'path')
+if TRAVERSAL_MODE not in TRAVERSAL_MODES:
+    raise ValueError(f"PREDINATOR_TRAVERSAL must be one of {TRAVERSAL_MODES}, got '{TRAVERSAL_MODE}'.")
+BEAM_WIDTH = max(1, int(os.environ.get('PREDINATOR_BEAM_WIDTH', '8')))
+ANSWER_ERROR_RATE_BOUNDS = (0.001, 0.499) # 0 would make a wrong answer impossible, 0.5 every answer meaningless
+
+
+def clamp_answer_error_rate(rate):
+    low, high = ANSWER_ERROR_RATE_BOUNDS
+    if not low <= rate <= high:
+        logger.warning("Answer error rate %s is outside [%s, %s]; clamping it.", rate, low, high)
+    return min(max(rate, low), high)
+
+
+ANSWER_ERROR_RATE = clamp_answer_error_rate(float(os.environ.get('PREDINATOR_ANSWER_ERROR_RATE', '0.1')))
+
+# Per-worker metric files, summed by the /metrics endpoint (see metrics.py). Must be local to one host.
+METRICS_DIR = os.environ.get('PREDINATOR_METRICS_DIR') or os.path.join(DATA_DIR, 'metrics')
+
+# Collapsed-stack files of profiled requests (see sampling_profiler.py and the aggregate_profiles command).
+PROFILE_DIR = os.environ.get('PREDINATOR_PROFILE_DIR') or os.path.join(DATA_DIR, 'profiles')
+
+# Append-only segments of per-game analytics events (see game_events.py), 'jsonl' or 'parquet'.
+EVENTS_DIR = os.environ.get('PREDINATOR_EVENTS_DIR') or os.path.join(DATA_DIR, 'events')
+EVENTS_FORMAT = os.environ.get('PREDINATOR_EVENTS_FORMAT', 'jsonl')
+
+# Logging for the predinator_core and game_app packages (see logging_setup.py). LOG_LEVELS overrides
+# single modules, e.g. 'game_app.requests=DEBUG,predinator_core.tree_builder=WARNING'.
+LOG_LEVEL = os.environ.get('PREDINATOR_LOG_LEVEL', 'INFO')
+LOG_LEVELS = os.environ.get('PREDINATOR_LOG_LEVELS', '')
+LOG_FORMAT = os.environ.get('PREDINATOR_LOG_FORMAT', 'text') # 'text' or 'json'
+
+# Themed question packs live next to the default dataset, each with the same layout as DATA_DIR:
+# datasets/<dataset_id>/{celebrities.parquet, questions.txt, model/}
+DATASETS_DIR = os.path.join(DATA_DIR, 'datasets')
+DEFAULT_DATASET_ID = 'default'
+
+
+class DatasetPaths:
+    """File locations for one dataset. The default dataset maps onto the constants above."""
+    def __init__(self, dataset_id=DEFAULT_DATASET_ID):
+        self.dataset_id = dataset_id
+        self.data_dir = DATA_DIR if dataset_id == DEFAULT_DATASET_ID else os.path.join(DATASETS_DIR, dataset_id)
+        self.celebrities_file = os.path.join(self.data_dir, 'celebrities.parquet')
+        self.questions_file = os.path.join(self.data_dir, 'questions.txt')
+        self.model_dir = os.path.join(self.data_dir, 'model')
+        self.version_file = os.path.join(self.model_dir, MODEL_VERSION_FILE_NAME)
+        self.shared_model_dir = os.path.join(self.model_dir, 'shared')
 
 try:
     os.makedirs(MODEL_DIR, exist_ok=True)
 except Exception as e:
-    print(f"Warning (predinator_core.utils): Could not create MODEL_DIR {MODEL_DIR} on import: {e}")
+    logger.warning("Could not create MODEL_DIR %s on import: %s", MODEL_DIR, e)
+
+def write_model_version(version, version_file=MODEL_VERSION_FILE):
+    """Publishes the live model version; every worker's ModelWatcher polls this file."""
+    tmp_path = f"{version_file}.tmp{os.getpid()}"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(version or '')
+    os.replace(tmp_path, version_file)
+
+def read_model_version(version_file=MODEL_VERSION_FILE):
+    try:
+        with open(version_file, 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
 
 # These are standard Python floats and np.nan, which are handled correctly by the session logic now.
 YES_NUMERIC = 1.0
@@ -32,8 +117,12 @@ def answer_to_numeric(answer_str):
         return DONT_KNOW_NUMERIC
     return None # Unrecognized format
 
+def is_dont_know(numeric_val):
+    """True for None and NaN, the two ways a "don't know" answer is stored."""
+    return numeric_val is None or (isinstance(numeric_val, (float, np.floating)) and math.isnan(numeric_val))
+
 def numeric_to_answer(numeric_val):
-    if pd.isna(numeric_val): # pd.isna handles None and np.nan
+    if is_dont_know(numeric_val):
         return "Don't Know"
     if numeric_val == YES_NUMERIC:
         return 'Yes'
@@ -6,21 +6,42 @@ import django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'predinator_config.settings')
 django.setup()
 
-from predinator_core.tree_builder import AkinatorTree
+from predinator_core.tree_builder import create_tree_handler
 from predinator_core.data_manager import load_celebrity_data, load_questions
-from predinator_core.utils import CELEBRITIES_FILE, QUESTIONS_FILE
+from predinator_core.shared_model import publish_shared_model
+from predinator_core.model_registry import is_valid_dataset_id
+from predinator_core.dataset_analysis import analyze_training_data
+from predinator_core.utils import DatasetPaths, DEFAULT_DATASET_ID, TREE_MODE
+import argparse
+import json
 import time
 
 def main():
     """
     A dedicated script to train the Akinator model.
     """
-    print(f"[{time.ctime()}] --- Starting Model Training ---")
+    parser = argparse.ArgumentParser(description="Train the Akinator model for one dataset.")
+    parser.add_argument('--dataset', default=DEFAULT_DATASET_ID,
+                        help="Dataset id; anything but 'default' lives under data/datasets/<id>/.")
+    parser.add_argument('--tree-mode', choices=['flat', 'hierarchical'], default=TREE_MODE,
+                        help="Overrides PREDINATOR_TREE_MODE; serving workers must run with the same mode.")
+    parser.add_argument('--analyze', action='store_true',
+                        help="Report duplicate character profiles and redundant questions before training.")
+    parser.add_argument('--report', help="With --analyze, also write the full report to this JSON file.")
+    parser.add_argument('--prune-redundant', action='store_true',
+                        help="Train without the questions the analysis marks as constant or redundant (implies --analyze).")
+    args = parser.parse_args()
+    if not is_valid_dataset_id(args.dataset):
+        print(f"[{time.ctime()}] ERROR: Invalid dataset id '{args.dataset}'.")
+        return
+    paths = DatasetPaths(args.dataset)
+
+    print(f"[{time.ctime()}] --- Starting Model Training ({args.dataset}) ---")
 
     # 1. Load data
-    print(f"[{time.ctime()}] Loading data from {CELEBRITIES_FILE} and {QUESTIONS_FILE}...")
-    celebrities_df = load_celebrity_data()
-    questions_list = load_questions()
+    print(f"[{time.ctime()}] Loading data from {paths.celebrities_file} and {paths.questions_file}...")
+    celebrities_df = load_celebrity_data(paths.celebrities_file)
+    questions_list = load_questions(paths.questions_file)
 
     if celebrities_df.empty or not questions_list:
         print(f"[{time.ctime()}] ERROR: Cannot train. Data is missing or empty. Please run generate_sample_data.py first.")
@@ -28,13 +49,29 @@ def main():
 
     print(f"[{time.ctime()}] Data loaded. Found {len(celebrities_df)} celebrities and {len(questions_list)} questions.")
 
+    excluded_features = set()
+    if args.analyze or args.prune_redundant:
+        report = analyze_training_data(celebrities_df, questions_list)
+        print_analysis_summary(report)
+        if args.report:
+            with open(args.report, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            print(f"[{time.ctime()}] Full analysis report written to {args.report}.")
+        if args.prune_redundant:
+            excluded_features = set(report['dropped_features'])
+            print(f"[{time.ctime()}] Training without {len(excluded_features)} pruned questions.")
+
     # 2. Initialize the tree builder
     # These parameters are good for starting. As your data grows, you might tune ccp_alpha.
-    tree_handler = AkinatorTree(
+    tree_handler = create_tree_handler(
         ccp_alpha=0.0,
         min_samples_leaf=1,
-        min_samples_split=2
+        min_samples_split=2,
+        model_dir=paths.model_dir,
+        tree_mode=args.tree_mode
     )
+    # Saved with the model, so retrains after learn events keep the same pruned question set.
+    tree_handler.excluded_features = excluded_features
 
     # 3. Train the model
     print(f"[{time.ctime()}] Starting training process...")
@@ -42,10 +79,26 @@ def main():
 
     if success:
         print(f"[{time.ctime()}] --- Model Training Successful ---")
-        print("Model and metadata have been saved to the 'data/model' directory.")
+        print(f"Model and metadata have been saved to {paths.model_dir}.")
+        # Workers running with PREDINATOR_MODEL_HOSTING=shared attach to this published copy.
+        publish_shared_model(tree_handler.compiled, paths.shared_model_dir)
     else:
         print(f"[{time.ctime()}] --- Model Training FAILED ---")
         print("Please check the logs above for errors related to data preparation or model fitting.")
 
+def print_analysis_summary(report):
+    timings = report['timings_seconds']
+    print(f"[{time.ctime()}] Analysis of {report['rows']} rows x {report['features']} questions "
+          f"({timings['prepare']}s prepare, {timings['duplicates']}s duplicates, {timings['pairs']}s pairs):")
+    duplicates = report['duplicate_profiles']
+    print(f"  {duplicates['groups']} groups of indistinguishable characters ({duplicates['rows_affected']} rows).")
+    for group in duplicates['largest'][:10]:
+        print(f"    - {', '.join(group)}")
+    print(f"  {len(report['redundant_pairs'])} redundant question pairs:")
+    for pair in report['redundant_pairs'][:10]:
+        print(f"    - {pair['a']} / {pair['b']} (phi {pair['phi']}, normalized MI {pair['normalized_mi']})")
+    for attr_id, reason in report['dropped_features'].items():
+        print(f"  prune {attr_id}: {reason}")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file